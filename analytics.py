@@ -0,0 +1,200 @@
+# analytics.py
+"""
+Dashboard istatistikleri için önceden toplanmış (rollup) sayaçlar.
+
+Her final triage batch'i yazıldıktan sonra TriageWriter, batch'i burada
+(saat/gün × ESI × uzmanlık) ve (gün × red flag) anahtarlarına göre sayıp
+upsert ile rollup tablolarına ekler. Sorgular geçmişin boyutundan bağımsız
+olarak yalnızca birkaç yüz rollup satırını okur.
+
+Rollup güncellemesi kendi transaction'ındadır; başarısız olursa triage satırı
+yine yazılmış olur ve sapma compactor ile düzeltilir:
+
+    python analytics.py rebuild --since 2025-01-01   # aralığı triages'tan yeniden say
+    python analytics.py compact --keep-hours 90      # eski saatlik satırları sil (günlükler kalır)
+"""
+import argparse, logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.engine import Connection, Engine
+
+from models import RedFlagRollup, Triage, TriageRollup
+
+logger = logging.getLogger("analytics")
+
+GRANULARITIES = ("hour", "day")
+MAX_SPECIALTY_LEN = 64
+MAX_FLAG_LEN = 200
+
+
+def bucket(ts: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _specialty(routing) -> str:
+    spec = (routing or {}).get("specialty") if isinstance(routing, dict) else None
+    return (" ".join(str(spec or "").split()).lower() or "-")[:MAX_SPECIALTY_LEN]
+
+
+def _flags(red_flags) -> List[str]:
+    out = []
+    for f in red_flags or []:
+        f = " ".join(str(f).split())[:MAX_FLAG_LEN]
+        if f and f not in out:
+            out.append(f)
+    return out
+
+
+def count_rows(rows: Iterable[Dict], now: Optional[datetime] = None):
+    """Satırları rollup anahtarlarına göre sayar; created_at yoksa now kullanılır."""
+    levels: Counter = Counter()
+    flags: Counter = Counter()
+    for r in rows:
+        ts = r.get("created_at") or now
+        spec = _specialty(r.get("routing"))
+        for g in GRANULARITIES:
+            levels[(g, bucket(ts, g), r["triage_level"], spec)] += 1
+        day = bucket(ts, "day")
+        for f in _flags(r.get("red_flags")):
+            flags[(day, f)] += 1
+    return levels, flags
+
+
+def _upsert(conn: Connection, model, keys: List[str], counts: Counter):
+    if not counts:
+        return
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"rollup upsert: {dialect} desteklenmiyor")
+    values = [dict(zip(keys, k), count=n) for k, n in counts.items()]
+    stmt = insert(model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={"count": model.__table__.c.count + stmt.excluded.count},
+    )
+    conn.execute(stmt, values)
+
+
+def apply_rollups(conn: Connection, rows: Iterable[Dict], now: datetime):
+    levels, flags = count_rows(rows, now)
+    _upsert(conn, TriageRollup, ["granularity", "bucket_start", "triage_level", "specialty"], levels)
+    _upsert(conn, RedFlagRollup, ["bucket_start", "flag"], flags)
+
+
+def ensure_tables(engine: Engine):
+    TriageRollup.__table__.create(bind=engine, checkfirst=True)
+    RedFlagRollup.__table__.create(bind=engine, checkfirst=True)
+
+
+# ---- Compactor ----
+def rebuild(engine: Engine, start: datetime, end: Optional[datetime] = None, chunk_rows: int = 5000) -> int:
+    """[start, end) aralığının rollup'larını triages tablosundan yeniden hesaplar."""
+    start = bucket(start, "day")
+    end = bucket(end, "day") + timedelta(days=1) if end else None
+    t = Triage.__table__
+    stmt = select(t.c.created_at, t.c.triage_level, t.c.routing, t.c.red_flags).where(t.c.created_at >= start)
+    if end is not None:
+        stmt = stmt.where(t.c.created_at < end)
+
+    levels: Counter = Counter()
+    flags: Counter = Counter()
+    n = 0
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=chunk_rows).execute(stmt)
+        for part in result.partitions():
+            lv, fl = count_rows((dict(r._mapping) for r in part))
+            levels.update(lv)
+            flags.update(fl)
+            n += len(part)
+
+    with engine.begin() as conn:
+        for model in (TriageRollup, RedFlagRollup):
+            d = delete(model).where(model.bucket_start >= start)
+            if end is not None:
+                d = d.where(model.bucket_start < end)
+            conn.execute(d)
+        _upsert(conn, TriageRollup, ["granularity", "bucket_start", "triage_level", "specialty"], levels)
+        _upsert(conn, RedFlagRollup, ["bucket_start", "flag"], flags)
+    return n
+
+
+def compact(engine: Engine, keep_hours_days: int = 90) -> int:
+    """keep_hours_days günden eski saatlik rollup satırlarını siler; günlükler korunur."""
+    cutoff = bucket(datetime.now() - timedelta(days=keep_hours_days), "day")
+    with engine.begin() as conn:
+        res = conn.execute(delete(TriageRollup).where(
+            TriageRollup.granularity == "hour", TriageRollup.bucket_start < cutoff))
+    return res.rowcount or 0
+
+
+# ---- Sorgular ----
+def _range(stmt, col, start: Optional[datetime], end: Optional[datetime]):
+    if start is not None:
+        stmt = stmt.where(col >= start)
+    if end is not None:
+        stmt = stmt.where(col < end)
+    return stmt
+
+
+def esi_series(conn: Connection, granularity: str, start=None, end=None,
+               specialty: Optional[str] = None) -> List[Dict]:
+    r = TriageRollup
+    stmt = select(r.bucket_start, r.triage_level, func.sum(r.count)).where(r.granularity == granularity)
+    stmt = _range(stmt, r.bucket_start, start, end)
+    if specialty:
+        stmt = stmt.where(r.specialty == _specialty({"specialty": specialty}))
+    stmt = stmt.group_by(r.bucket_start, r.triage_level).order_by(r.bucket_start, r.triage_level)
+    return [{"bucket": b, "triage_level": lvl, "count": int(c)} for b, lvl, c in conn.execute(stmt)]
+
+
+def summary(conn: Connection, start=None, end=None) -> Dict:
+    r = TriageRollup
+    base = lambda *cols: _range(select(*cols, func.sum(r.count)).where(r.granularity == "day"),
+                                r.bucket_start, start, end)
+    by_level = {lvl: int(c) for lvl, c in conn.execute(base(r.triage_level).group_by(r.triage_level))}
+    by_specialty = {s: int(c) for s, c in conn.execute(base(r.specialty).group_by(r.specialty))}
+    total = sum(by_level.values())
+    critical = by_level.get("ESI-1", 0) + by_level.get("ESI-2", 0)
+    return {"total": total, "critical": critical, "by_level": by_level, "by_specialty": by_specialty}
+
+
+def top_red_flags(conn: Connection, start=None, end=None, limit: int = 20) -> List[Dict]:
+    r = RedFlagRollup
+    total = func.sum(r.count).label("n")
+    stmt = _range(select(r.flag, total), r.bucket_start, start, end)
+    stmt = stmt.group_by(r.flag).order_by(total.desc(), r.flag).limit(limit)
+    return [{"flag": f, "count": int(c)} for f, c in conn.execute(stmt)]
+
+
+def main():
+    from database import engine
+
+    ap = argparse.ArgumentParser(description="Triage rollup compactor")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rb = sub.add_parser("rebuild", help="Aralığı triages tablosundan yeniden say")
+    rb.add_argument("--since", required=True, help="YYYY-MM-DD")
+    rb.add_argument("--until", help="YYYY-MM-DD (dahil)")
+    cp = sub.add_parser("compact", help="Eski saatlik rollup satırlarını sil")
+    cp.add_argument("--keep-hours", type=int, default=90, help="Saatlik satırların tutulacağı gün sayısı")
+    args = ap.parse_args()
+
+    ensure_tables(engine)
+    if args.cmd == "rebuild":
+        since = datetime.strptime(args.since, "%Y-%m-%d")
+        until = datetime.strptime(args.until, "%Y-%m-%d") if args.until else None
+        print(f"{rebuild(engine, since, until)} triage satırı yeniden sayıldı")
+    else:
+        print(f"{compact(engine, args.keep_hours)} saatlik rollup satırı silindi")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+# ann.py
+"""
+Büyük kart korpusları (100k+ vektör) için yaklaşık en yakın komşu indeksleri.
+
+    ivf   NumPy IVF (spherical k-means + inverted list); ek bağımlılık yok
+    hnsw  hnswlib (opsiyonel bağımlılık)
+
+Vektörler L2 normalize gelir; skor iç çarpımdır (= kosinüs). Satır kimliği, kartın
+RetrievalEngine'deki indeksidir. Meta filtreleri (chief/age_group/pregnancy) kart
+başına bool maske olarak verilir: izin verilen küme IVF'in zaten tarayacağı kadar
+küçükse maske üzerinde tam arama yapılır, değilse prob edilen listeler maskeyle süzülür.
+
+İndeksler değişmez gibi kullanılır: IVFIndex.add yeni bir nesne döndürür (taban
+diziler paylaşılır), böylece eski anlık görüntüyü okuyan istekler etkilenmez.
+save/load bir dizine yazar; IVF dizileri np.load(mmap_mode="r") ile açılır.
+"""
+import json, os, shutil, tempfile
+from typing import Optional, Tuple
+
+import numpy as np
+
+META_NAME = "ann.json"
+
+# k-means eğitimi için liste başına örnek sayısı ve iterasyon
+TRAIN_PER_LIST = 64
+TRAIN_ITERS = 12
+# Eklenen satırlar tabanın bu oranını aşınca yeniden kurulum önerilir
+REBUILD_RATIO = 0.2
+ASSIGN_BLOCK = 16384
+
+
+def _topk(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def _exact(index, q: np.ndarray, k: int, ids: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    if ids is None:
+        ids = np.arange(index.ntotal, dtype=np.int64)
+    if not len(ids):
+        return ids, np.empty(0, np.float32)
+    scores = index.vectors(ids) @ q
+    top = _topk(scores, k)
+    return ids[top], scores[top]
+
+
+def _assign(X: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    out = np.empty(X.shape[0], dtype=np.int32)
+    for s in range(0, X.shape[0], ASSIGN_BLOCK):
+        out[s:s + ASSIGN_BLOCK] = np.argmax(np.asarray(X[s:s + ASSIGN_BLOCK]) @ centroids.T, axis=1)
+    return out
+
+
+def spherical_kmeans(X: np.ndarray, nlist: int, iters: int = TRAIN_ITERS, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    n = X.shape[0]
+    sample = X[np.sort(rng.choice(n, size=min(n, nlist * TRAIN_PER_LIST), replace=False))]
+    C = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+    for _ in range(iters):
+        a = _assign(sample, C)
+        sums = np.zeros_like(C)
+        np.add.at(sums, a, sample)
+        counts = np.bincount(a, minlength=nlist)
+        empty = counts == 0
+        if empty.any():  # boş liste → rastgele örnekle yeniden tohumla
+            sums[empty] = sample[rng.choice(sample.shape[0], size=int(empty.sum()))]
+        C = sums / (np.linalg.norm(sums, axis=1, keepdims=True) + 1e-8)
+    return C.astype(np.float32)
+
+
+class IVFIndex:
+    kind = "ivf"
+
+    def __init__(self, centroids: np.ndarray, data: np.ndarray, ids: np.ndarray, offsets: np.ndarray,
+                 nprobe: int = 32, extra_data: Optional[np.ndarray] = None,
+                 extra_ids: Optional[np.ndarray] = None, extra_lists: Optional[np.ndarray] = None):
+        self.centroids = centroids          # (nlist, d)
+        self.data = data                    # (n_base, d), liste sırasına göre dizilmiş
+        self.ids = ids                      # (n_base,) satır kimlikleri
+        self.offsets = offsets              # (nlist + 1,) liste sınırları
+        self.nprobe = min(nprobe, centroids.shape[0])
+        d = centroids.shape[1]
+        self.extra_data = extra_data if extra_data is not None else np.empty((0, d), np.float32)
+        self.extra_ids = extra_ids if extra_ids is not None else np.empty(0, np.int64)
+        self.extra_lists = extra_lists if extra_lists is not None else np.empty(0, np.int32)
+        self.ntotal = len(self.ids) + len(self.extra_ids)
+        # Kimlik → konum (tam skorlama için); ekler n_base'den sonra
+        self._loc = np.empty(self.ntotal, dtype=np.int64)
+        self._loc[self.ids] = np.arange(len(self.ids))
+        self._loc[self.extra_ids] = len(self.ids) + np.arange(len(self.extra_ids))
+
+    @classmethod
+    def build(cls, X: np.ndarray, nlist: Optional[int] = None, nprobe: int = 32, seed: int = 0) -> "IVFIndex":
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n = X.shape[0]
+        nlist = nlist or max(1, min(n, int(4 * np.sqrt(n))))
+        C = spherical_kmeans(X, nlist, seed=seed)
+        return cls._from_assignment(C, X, np.arange(n, dtype=np.int64), _assign(X, C), nprobe)
+
+    @classmethod
+    def _from_assignment(cls, C, X, ids, lists, nprobe) -> "IVFIndex":
+        order = np.argsort(lists, kind="stable")
+        offsets = np.zeros(C.shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(lists, minlength=C.shape[0]), out=offsets[1:])
+        return cls(C, X[order], ids[order], offsets, nprobe)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.centroids.nbytes + self.data.nbytes + self.extra_data.nbytes)
+
+    @property
+    def scan_size(self) -> int:
+        """Bir sorguda taranan ortalama vektör sayısı."""
+        return int(self.ntotal * self.nprobe / self.centroids.shape[0]) + 1
+
+    def needs_rebuild(self) -> bool:
+        return len(self.extra_ids) > REBUILD_RATIO * max(1, len(self.ids))
+
+    def add(self, X: np.ndarray) -> "IVFIndex":
+        """Kimlikleri ntotal'dan başlayan yeni satırlarla yeni indeks (centroid'ler yeniden eğitilmez)."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        new_ids = np.arange(self.ntotal, self.ntotal + X.shape[0], dtype=np.int64)
+        return IVFIndex(
+            self.centroids, self.data, self.ids, self.offsets, self.nprobe,
+            np.concatenate([self.extra_data, X]),
+            np.concatenate([self.extra_ids, new_ids]),
+            np.concatenate([self.extra_lists, _assign(X, self.centroids)]),
+        )
+
+    def vectors(self, ids: np.ndarray) -> np.ndarray:
+        loc = self._loc[ids]
+        nb = len(self.ids)
+        if not len(self.extra_ids):
+            return np.asarray(self.data[loc])
+        out = np.empty((len(ids), self.data.shape[1]), dtype=np.float32)
+        base = loc < nb
+        out[base] = self.data[loc[base]]
+        out[~base] = self.extra_data[loc[~base] - nb]
+        return out
+
+    def search(self, q: np.ndarray, k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(kimlikler, skorlar) skora göre azalan."""
+        if mask is not None:
+            allowed = np.flatnonzero(mask[:self.ntotal])
+            if len(allowed) <= max(k, self.scan_size):
+                return self.exact(q, k, allowed)
+        probes = _topk(self.centroids @ q, self.nprobe)
+        idx = np.concatenate([np.arange(self.offsets[p], self.offsets[p + 1]) for p in probes])
+        cand = self.ids[idx]
+        vecs = self.data
+        if len(self.extra_ids):
+            ex = np.flatnonzero(np.isin(self.extra_lists, probes))
+            cand = np.concatenate([cand, self.extra_ids[ex]])
+            idx = np.concatenate([idx, len(self.ids) + ex])
+            vecs = None
+        if mask is not None:
+            keep = mask[cand]
+            cand, idx = cand[keep], idx[keep]
+        if len(cand) < k:
+            # Prob edilen listelerde yeterli aday yok: izin verilen küme üzerinde tam arama
+            return self.exact(q, k, np.flatnonzero(mask[:self.ntotal]) if mask is not None else None)
+        scores = (np.asarray(vecs[idx]) if vecs is not None else self.vectors(cand)) @ q
+        top = _topk(scores, k)
+        return cand[top], scores[top]
+
+    def exact(self, q: np.ndarray, k: int, ids: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        return _exact(self, q, k, ids)
+
+    # ---- Kalıcılık ----
+    def save(self, path: str):
+        if len(self.extra_ids):
+            # Ekler listelerine yerleştirilerek tek taban halinde yazılır
+            base_lists = np.repeat(np.arange(self.centroids.shape[0], dtype=np.int32), np.diff(self.offsets))
+            merged = IVFIndex._from_assignment(
+                self.centroids, np.concatenate([np.asarray(self.data), self.extra_data]),
+                np.concatenate([self.ids, self.extra_ids]),
+                np.concatenate([base_lists, self.extra_lists]), self.nprobe)
+            return merged.save(path)
+        arrays = {"centroids": self.centroids, "data": self.data, "ids": self.ids, "offsets": self.offsets}
+        _write_dir(path, {"kind": self.kind, "nprobe": self.nprobe, "ntotal": self.ntotal}, arrays)
+
+    @classmethod
+    def load(cls, path: str, meta: dict, mmap: bool = True) -> "IVFIndex":
+        mode = "r" if mmap else None
+        arr = {n: np.load(os.path.join(path, f"{n}.npy"), mmap_mode=mode)
+               for n in ("centroids", "data", "ids", "offsets")}
+        return cls(np.asarray(arr["centroids"]), arr["data"], np.asarray(arr["ids"]),
+                   np.asarray(arr["offsets"]), meta.get("nprobe", 32))
+
+
+class HnswIndex:
+    """hnswlib üzerinde HNSW; filtre hnswlib'in filter callback'i ile uygulanır."""
+    kind = "hnsw"
+
+    def __init__(self, index, vectors: np.ndarray, ef: int = 128):
+        self.index = index
+        self.vectors_ = vectors  # tam skorlama (seçici filtre) için normalize matris
+        self.ef = ef
+        self.index.set_ef(ef)
+        self.ntotal = index.get_current_count()
+
+    @classmethod
+    def build(cls, X: np.ndarray, M: int = 16, ef_construction: int = 200, ef: int = 128) -> "HnswIndex":
+        import hnswlib  # opsiyonel bağımlılık
+
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        index = hnswlib.Index(space="ip", dim=X.shape[1])
+        index.init_index(max_elements=X.shape[0], ef_construction=ef_construction, M=M)
+        index.add_items(X, np.arange(X.shape[0]))
+        return cls(index, X, ef)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.vectors_.nbytes)  # graf hnswlib'in kendi belleğinde
+
+    @property
+    def scan_size(self) -> int:
+        return self.ef * 4
+
+    def needs_rebuild(self) -> bool:
+        # hnswlib grafı yerinde büyür: resize_index/add_items eski görüntünün eşzamanlı knn_query'siyle
+        # güvenli değil ve eski görüntüye yeni kimlikler döndürür. Ekleme yerine her seferinde yeniden kurulur.
+        return True
+
+    def vectors(self, ids: np.ndarray) -> np.ndarray:
+        return np.asarray(self.vectors_[ids])
+
+    def exact(self, q: np.ndarray, k: int, ids: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        return _exact(self, q, k, ids)
+
+    def search(self, q: np.ndarray, k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        n = self.ntotal
+        if mask is not None:
+            allowed = np.flatnonzero(mask[:n])
+            if len(allowed) <= max(k, self.scan_size):
+                return self.exact(q, k, allowed)
+            labels, dist = self.index.knn_query(q, k=k, filter=lambda i: i < n and bool(mask[i]))
+        else:
+            labels, dist = self.index.knn_query(q, k=min(k, n))
+        # space="ip" → mesafe = 1 - iç çarpım
+        return labels[0].astype(np.int64), (1.0 - dist[0]).astype(np.float32)
+
+    def save(self, path: str):
+        def extra(tmp):
+            self.index.save_index(os.path.join(tmp, "hnsw.bin"))
+        _write_dir(path, {"kind": self.kind, "ef": self.ef, "ntotal": self.ntotal},
+                   {"vectors": self.vectors_}, extra)
+
+    @classmethod
+    def load(cls, path: str, meta: dict, mmap: bool = True) -> "HnswIndex":
+        import hnswlib  # opsiyonel bağımlılık
+
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r" if mmap else None)
+        index = hnswlib.Index(space="ip", dim=vectors.shape[1])
+        index.load_index(os.path.join(path, "hnsw.bin"), max_elements=meta["ntotal"])
+        return cls(index, vectors, meta.get("ef", 128))
+
+
+KINDS = {"ivf": IVFIndex, "hnsw": HnswIndex}
+
+
+def build_index(kind: str, X: np.ndarray, nprobe: int = 32):
+    if kind == "ivf":
+        return IVFIndex.build(X, nprobe=nprobe)
+    if kind == "hnsw":
+        return HnswIndex.build(X)
+    raise ValueError(f"Bilinmeyen ANN türü: {kind}")
+
+
+def load_index(path: str, mmap: bool = True):
+    """Dizin yoksa/bozuksa None."""
+    try:
+        with open(os.path.join(path, META_NAME), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return KINDS[meta["kind"]].load(path, meta, mmap=mmap)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_dir(path: str, meta: dict, arrays: dict, extra=None):
+    """Geçici dizine yazıp tek rename ile yerine koyar: okuyucu yarım indeks görmez."""
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent, prefix=".tmp_ann_")
+    try:
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(arr))
+        if extra:
+            extra(tmp)
+        with open(os.path.join(tmp, META_NAME), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.replace(tmp, path)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
@@ -0,0 +1,92 @@
+# bench/bench_ann.py
+"""
+ANN indekslerinin (ann.py) tam aramaya göre recall@k ve sorgu gecikmesi.
+
+Model gerektirmez: kümelenmiş rastgele vektörler ve bench_retrieval'daki sentetik
+kartlar kullanılır. Her boyut için filtresiz ve filtreli (chief maskesi) sorgular,
+IVF nprobe taraması ve hnswlib kuruluysa HNSW ölçülür.
+
+    python -m bench.bench_ann --sizes 20000 100000 --nprobe 8 16 32 64
+"""
+import argparse, time
+
+import numpy as np
+
+from ann import HnswIndex, IVFIndex
+from bench.bench_retrieval import synthetic_cards
+from retrieval import RetrievalEngine, normalize_rows
+
+
+def clustered(n: int, dim: int, n_clusters: int, rng) -> np.ndarray:
+    # Gerçek embedding'ler gibi kümelenmiş veri (düzgün rastgele veri ANN için gerçekçi değil)
+    C = rng.standard_normal((n_clusters, dim), dtype=np.float32)
+    X = C[rng.integers(0, n_clusters, n)] + 0.6 * rng.standard_normal((n, dim), dtype=np.float32)
+    return normalize_rows(X)
+
+
+def measure(search, exact, queries, masks, k):
+    recalls, lat = [], []
+    for q, m in zip(queries, masks):
+        t0 = time.perf_counter()
+        got = search(q, m)
+        lat.append((time.perf_counter() - t0) * 1000)
+        ref = exact(q, m)
+        if len(ref):
+            recalls.append(len(set(got) & set(ref)) / len(ref))
+    return float(np.mean(recalls)), float(np.percentile(lat, 50)), float(np.percentile(lat, 95))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[20000, 100000])
+    ap.add_argument("--dim", type=int, default=1024)
+    ap.add_argument("--k", type=int, default=4)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[8, 16, 32, 64])
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'n':>8} {'yöntem':<16} {'filtre':<8} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8} {'kurulum s':>10}")
+    for n in args.sizes:
+        X = clustered(n, args.dim, max(16, n // 200), rng)
+        Q = normalize_rows(X[rng.integers(0, n, args.queries)]
+                           + 0.3 * rng.standard_normal((args.queries, args.dim), dtype=np.float32))
+        engine = RetrievalEngine(synthetic_cards(n), X)
+        chiefs = ["göğüs ağrısı", "karın ağrısı", "ateş", "baş ağrısı"]
+        filt = [engine.candidate_mask(chiefs[i % len(chiefs)], None, None) for i in range(args.queries)]
+        cases = {"yok": [None] * args.queries, "chief": filt}
+
+        def exact(q, m):
+            s = X @ q
+            if m is not None:
+                s = np.where(m, s, -np.inf)
+            top = np.argsort(-s)[:args.k]
+            return top[np.isfinite(s[top])]
+
+        for fname, masks in cases.items():
+            r, p50, p95 = measure(lambda q, m: exact(q, m), exact, Q, masks, args.k)
+            print(f"{n:>8} {'tam':<16} {fname:<8} {r:>9.3f} {p50:>8.3f} {p95:>8.3f} {'-':>10}")
+
+        t0 = time.perf_counter()
+        ivf = IVFIndex.build(X)
+        build_s = time.perf_counter() - t0
+        for nprobe in args.nprobe:
+            ivf.nprobe = min(nprobe, ivf.centroids.shape[0])
+            for fname, masks in cases.items():
+                r, p50, p95 = measure(lambda q, m: ivf.search(q, args.k, m)[0], exact, Q, masks, args.k)
+                print(f"{n:>8} {f'ivf/{nprobe}':<16} {fname:<8} {r:>9.3f} {p50:>8.3f} {p95:>8.3f} {build_s:>10.1f}")
+
+        try:
+            t0 = time.perf_counter()
+            hnsw = HnswIndex.build(X)
+            build_s = time.perf_counter() - t0
+        except ImportError:
+            print(f"{n:>8} {'hnsw':<16} hnswlib kurulu değil, atlandı")
+            continue
+        for fname, masks in cases.items():
+            r, p50, p95 = measure(lambda q, m: hnsw.search(q, args.k, m)[0], exact, Q, masks, args.k)
+            print(f"{n:>8} {'hnsw':<16} {fname:<8} {r:>9.3f} {p50:>8.3f} {p95:>8.3f} {build_s:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
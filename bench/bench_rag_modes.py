@@ -0,0 +1,113 @@
+# bench/bench_rag_modes.py
+"""
+RAG_MODE=remote (HTTP → rag_memory) ile RAG_MODE=local (süreç içi) karşılaştırması.
+
+Her iki mod da triage_api'nin kullandığı istemci sınıflarıyla (rag_client) ölçülür.
+Remote için rag_memory ayrı bir süreçte başlatılır (veya --url ile çalışan servis
+kullanılır). --retrieval-mode sparse ile model gerekmeden ölçülebilir; bu durumda
+fark yalnızca HTTP/JSON/TCP adımıdır. Dense/hybrid'de encode süresi iki modda ortaktır.
+
+    python -m bench.bench_rag_modes --requests 500 --concurrency 1 8 32
+    python -m bench.bench_rag_modes --retrieval-mode hybrid --url http://localhost:8000/rag/topk
+    python -m bench.bench_rag_modes --query-cache   # tekrarlanan sorgular önbellekten
+"""
+import argparse, asyncio, os, subprocess, sys, time
+
+import httpx
+import numpy as np
+
+QUERIES = [
+    ("Göğüs ağrısı ve terleme, 30 dakikadır", "göğüs ağrısı", "adult", "no"),
+    ("Karın sağ alt kadranda ağrı, ateş", "karın ağrısı", "adult", "no"),
+    ("Nefes darlığı ve hırıltı", "nefes darlığı", "adult", "any"),
+    ("Ani başlayan konuşma bozukluğu", "konuşma bozukluğu", "geriatric", "any"),
+    ("Yüksek ateş ve titreme", "ateş", "pediatric", "any"),
+]
+
+
+def body(i: int) -> dict:
+    text, chief, age_group, pregnancy = QUERIES[i % len(QUERIES)]
+    return {"text": text, "chief": chief, "age_group": age_group, "pregnancy": pregnancy, "k": 4}
+
+
+async def run(client, n: int, concurrency: int):
+    lat = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with sem:
+            t0 = time.perf_counter()
+            await client.topk(body(i))
+            lat.append((time.perf_counter() - t0) * 1000)
+
+    await one(0)  # ısınma
+    lat.clear()
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    wall = time.perf_counter() - t0
+    return np.array(lat), n / wall
+
+
+def start_server(port: int, env: dict) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "rag_memory:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 300
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/rag/index", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("rag_memory başlamadı")
+
+
+async def main_async(args):
+    os.environ["RAG_RETRIEVAL_MODE"] = args.retrieval_mode
+    os.environ["RAG_WATCH_INTERVAL_S"] = "0"
+    # Sorgular 5 metinden oluştuğundan önbellek açıkken neredeyse her istek isabettir
+    os.environ["RAG_QUERY_CACHE_ENABLED"] = "true" if args.query_cache else "false"
+    from rag_client import CircuitBreaker, LocalRagClient, RemoteRagClient
+    from rag_service import RetrievalService
+
+    proc = None
+    url = args.url
+    if not url:
+        proc = start_server(args.port, dict(os.environ))
+        url = f"http://127.0.0.1:{args.port}/rag/topk"
+
+    clients = {
+        "remote": RemoteRagClient(url, 15, 100, 0, CircuitBreaker(10**6)),
+        "local": LocalRagClient(RetrievalService()),
+    }
+    print(f"retrieval={args.retrieval_mode}, query_cache={args.query_cache}, {args.requests} istek")
+    print(f"{'mod':<8} {'eşzaman':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'istek/s':>9}")
+    try:
+        for name, client in clients.items():
+            await client.start()
+            for c in args.concurrency:
+                lat, rps = await run(client, args.requests, c)
+                print(f"{name:<8} {c:>8} {np.percentile(lat, 50):>8.2f} {np.percentile(lat, 95):>8.2f} "
+                      f"{np.percentile(lat, 99):>8.2f} {rps:>9.0f}")
+            await client.close()
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=500)
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    ap.add_argument("--retrieval-mode", default="sparse", choices=["sparse", "dense", "hybrid"])
+    ap.add_argument("--query-cache", action="store_true", help="RetrievalService sorgu önbelleğini aç")
+    ap.add_argument("--url", default=None, help="Çalışan rag_memory /rag/topk adresi (yoksa başlatılır)")
+    ap.add_argument("--port", type=int, default=8765)
+    asyncio.run(main_async(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
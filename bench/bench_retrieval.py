@@ -0,0 +1,98 @@
+# bench/bench_retrieval.py
+"""
+/rag/topk arama yolunun sorgu başına gecikme ölçümü (encode hariç).
+
+Eski yol (Python döngüsünde partial_ratio + her sorguda matris normalizasyonu) ile
+RetrievalEngine karşılaştırılır. Model gerektirmez; rastgele vektörler kullanır.
+
+    python -m bench.bench_retrieval --sizes 30 1000 50000
+"""
+import argparse, random, time
+
+import numpy as np
+from rapidfuzz import fuzz
+
+from cards import load_cards
+from retrieval import RetrievalEngine
+
+DIM = 1024  # multilingual-e5-large
+
+
+def synthetic_cards(n: int, seed: int = 0):
+    """Gerçek kartların meta alanlarını çoğaltarak n kartlık korpus üretir."""
+    base = load_cards()
+    rnd = random.Random(seed)
+    vocab = sorted({x for c in base for x in c["meta"].get("complaints", [])})
+    out = []
+    for i in range(n):
+        src = base[i % len(base)]["meta"]
+        meta = dict(src)
+        meta["id"] = f"{src['id']}_{i}"
+        meta["complaints"] = list(src.get("complaints", [])) + [f"{rnd.choice(vocab)} {i % 97}"]
+        out.append({"id": meta["id"], "meta": meta, "content": src["title"]})
+    return out
+
+
+def legacy_topk(cards, M, qvec, k, chief, age_group, pregnancy):
+    def fuzzy_match(query, choices, threshold=70):
+        if not query or not choices:
+            return False
+        return any(fuzz.partial_ratio(query.lower(), c.lower()) >= threshold for c in choices)
+
+    candidates = [
+        i for i, c in enumerate(cards)
+        if (fuzzy_match(chief, c["meta"].get("complaints", [])) if chief else False)
+        or (fuzzy_match(age_group, c["meta"].get("age_groups", []), 80) if age_group else False)
+        or (fuzzy_match(pregnancy, c["meta"].get("pregnancy", []), 80) if pregnancy else False)
+    ]
+    if not candidates:
+        return []
+    sub = M[candidates]
+    qn = qvec / (np.linalg.norm(qvec) + 1e-8)
+    sims = (sub / (np.linalg.norm(sub, axis=1, keepdims=True) + 1e-8)) @ qn
+    return list(np.array(candidates)[np.argsort(-sims)[:k]])
+
+
+def timeit(fn, reps: int) -> float:
+    fn()  # ısınma
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    return (time.perf_counter() - t0) / reps * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[30, 1000, 50000])
+    ap.add_argument("--k", type=int, default=3)
+    ap.add_argument("--legacy-max", type=int, default=50000,
+                    help="Eski yolun ölçüleceği en büyük korpus")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    queries = [("göğüs ağrısı", "adult", "any"), ("karın ağrısı", "adult", "any"), ("ateş", None, None)]
+
+    print(f"{'kart':>8} {'eski (ms)':>12} {'engine ilk (ms)':>16} {'engine (ms)':>12}")
+    for n in args.sizes:
+        cards = synthetic_cards(n)
+        M = rng.standard_normal((n, DIM), dtype=np.float32)
+        qvec = rng.standard_normal(DIM, dtype=np.float32)
+        reps = max(3, min(200, 200_000 // n))
+
+        legacy_ms = float("nan")
+        if n <= args.legacy_max:
+            legacy_ms = timeit(lambda: [legacy_topk(cards, M, qvec, args.k, *q) for q in queries],
+                               max(1, reps // 20)) / len(queries)
+
+        engine = RetrievalEngine(cards, M)
+        t0 = time.perf_counter()
+        for q in queries:
+            engine.search(qvec, args.k, *q)  # ilk sorgu: cdist ile filtre maskesi
+        first_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+        engine_ms = timeit(lambda: [engine.search(qvec, args.k, *q) for q in queries], reps) / len(queries)
+
+        print(f"{n:>8} {legacy_ms:>12.3f} {first_ms:>16.3f} {engine_ms:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
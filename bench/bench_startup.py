@@ -0,0 +1,135 @@
+# bench/bench_startup.py
+"""
+Soğuk açılış ölçümü: servis süreci başlatılır, /healthz (canlı) ve /readyz (hazır)
+ilk 200'e kadar geçen süreler ölçülür; ardından /metrics'teki startup_seconds
+aşamaları (import, index, model, llm_client, warmup) okunur. Her tur yeni süreçtir.
+
+    python -m bench.bench_startup --app rag_memory --runs 3 --retrieval-mode sparse
+    python -m bench.bench_startup --app triage_api --rag-mode local --preload
+    python -m bench.bench_startup --app triage_api --workers 4 --preload   # gunicorn, master'da preload
+    python -m bench.bench_startup --app triage_api --importtime 15        # en pahalı 15 import
+
+--workers > 1 iken süreç gunicorn ile başlar; "hazır" ardışık 4×workers /readyz
+yanıtının 200 olmasıdır (istekler worker'lara dağıldığından yaklaşık).
+"""
+import argparse, os, re, subprocess, sys, tempfile, time
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+APPS = {"rag_memory": "rag_memory:app", "triage_api": "triage_api:app"}
+
+
+def spawn(app: str, port: int, env: Dict, workers: int, preload: bool) -> subprocess.Popen:
+    if workers > 1:
+        cmd = [sys.executable, "-m", "gunicorn", "-w", str(workers), "-k", "uvicorn.workers.UvicornWorker",
+               "-b", f"127.0.0.1:{port}", APPS[app]] + (["--preload"] if preload else [])
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", APPS[app], "--port", str(port), "--log-level", "warning"]
+    return subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_for(proc: subprocess.Popen, url: str, t0: float, timeout_s: float, streak: int = 1) -> Optional[float]:
+    """url ardışık streak kez 200 döndüğünde başlangıçtan geçen süre (s); süreç ölürse None."""
+    ok = 0
+    deadline = t0 + timeout_s
+    while time.perf_counter() < deadline:
+        if proc.poll() is not None:
+            return None
+        try:
+            ok = ok + 1 if httpx.get(url, timeout=1).status_code == 200 else 0
+        except httpx.HTTPError:
+            ok = 0
+        if ok >= streak:
+            return time.perf_counter() - t0
+        time.sleep(0.02 if ok else 0.05)
+    return None
+
+
+def startup_phases(base_url: str) -> Dict[str, float]:
+    try:
+        text = httpx.get(f"{base_url}/metrics", timeout=5).text
+    except httpx.HTTPError:
+        return {}
+    return {m.group(1): float(m.group(2))
+            for m in re.finditer(r'^startup_seconds\{phase="([^"]+)"\} (\S+)$', text, re.MULTILINE)}
+
+
+def run_once(args, env: Dict) -> Dict:
+    base_url = f"http://127.0.0.1:{args.port}"
+    t0 = time.perf_counter()
+    proc = spawn(args.app, args.port, env, args.workers, args.preload)
+    try:
+        live = wait_for(proc, f"{base_url}/healthz", t0, args.timeout)
+        ready = wait_for(proc, f"{base_url}/readyz", t0, args.timeout, streak=max(1, 4 * args.workers))
+        phases = startup_phases(base_url) if ready is not None else {}
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    if live is None or ready is None:
+        raise RuntimeError(f"{args.app} hazır olmadı (çıkış kodu {proc.returncode})")
+    return {"live": live, "ready": ready, **phases}
+
+
+def import_profile(module: str, top: int, env: Dict):
+    """python -X importtime: uygulama modülünün kümülatif süreye göre en pahalı doğrudan import'ları."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         env=env, capture_output=True, text=True).stderr
+    rows = []
+    for line in out.splitlines():
+        m = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)", line)
+        if m and len(m.group(3)) == 3:  # uygulama modülünün doğrudan import'ları
+            rows.append((int(m.group(2)) / 1000, m.group(4)))
+    print(f"\n{module} import profili (kümülatif ms, ilk {top})")
+    for ms, name in sorted(rows, reverse=True)[:top]:
+        print(f"  {name:<40} {ms:>9.1f}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--app", default="triage_api", choices=sorted(APPS))
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--port", type=int, default=9200)
+    ap.add_argument("--workers", type=int, default=1, help=">1: gunicorn ile")
+    ap.add_argument("--preload", action="store_true", help="PRELOAD=true (+ gunicorn --preload)")
+    ap.add_argument("--preload-model", action="store_true", help="PRELOAD_MODEL=true")
+    ap.add_argument("--rag-mode", default=None, choices=["remote", "local"], help="triage_api RAG_MODE")
+    ap.add_argument("--retrieval-mode", default=None, choices=["sparse", "dense", "hybrid"])
+    ap.add_argument("--timeout", type=float, default=300.0)
+    ap.add_argument("--importtime", type=int, default=0, help="En pahalı N import'u yazdır")
+    args = ap.parse_args()
+
+    tmp = tempfile.TemporaryDirectory(prefix="triage-startup-")
+    env = dict(os.environ, DATABASE_URL=os.getenv("DATABASE_URL", f"sqlite:///{tmp.name}/startup.db"),
+               LOG_LEVEL="WARNING", PRELOAD="true" if args.preload else "false",
+               PRELOAD_MODEL="true" if args.preload_model else "false")
+    env.setdefault("OPENAI_API_KEY", "fake")
+    if args.rag_mode:
+        env["RAG_MODE"] = args.rag_mode
+    if args.retrieval_mode:
+        env["RAG_RETRIEVAL_MODE"] = args.retrieval_mode
+
+    try:
+        results: List[Dict] = []
+        for i in range(args.runs):
+            r = run_once(args, env)
+            results.append(r)
+            print(f"tur {i + 1}: canlı {r['live'] * 1000:8.0f} ms   hazır {r['ready'] * 1000:8.0f} ms")
+        print(f"\n{args.app} workers={args.workers} preload={args.preload} ({args.runs} tur, medyan)")
+        keys = ["live", "ready"] + sorted({k for r in results for k in r} - {"live", "ready"})
+        for k in keys:
+            vals = [r[k] for r in results if k in r]
+            label = k if k in ("live", "ready") else f"startup_seconds[{k}]"
+            print(f"  {label:<30} {np.median(vals) * 1000:>9.1f} ms")
+        if args.importtime:
+            import_profile(args.app, args.importtime, env)
+    finally:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
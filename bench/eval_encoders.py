@@ -0,0 +1,125 @@
+# bench/eval_encoders.py
+"""
+Encoder / matris tipi seçeneklerinin fp32 referansa göre çevrimdışı değerlendirmesi.
+
+Referans: SentenceTransformer + float32 matris (bugünkü üretim yolu). Her aday için
+aynı sorgular üzerinde top-1 uyumu, top-k örtüşmesi (|A∩B|/k), sorgu encode gecikmesi
+ve skorlama matrisinin boyutu raporlanır. Sorgular kartlardan türetilir (başlık,
+şikayetler, sorular) veya --queries ile JSONL olarak verilir
+({"text": ..., "chief": ..., "age_group": ..., "pregnancy": ...}).
+
+    python -m bench.eval_encoders
+    python -m bench.eval_encoders --candidates onnx:models/e5-large-onnx st:intfloat/multilingual-e5-small \\
+        --dtypes float32 float16 int8 --k 4
+"""
+import argparse, json, os, re, time
+from typing import Dict, List
+
+import numpy as np
+
+from cards import load_cards
+from config import settings
+from embedding_cache import EmbeddingCache
+from encoders import Encoder, make_encoder
+from retrieval import RetrievalEngine
+
+
+def card_queries(cards: List[Dict], per_card: int = 3) -> List[Dict]:
+    out = []
+    for c in cards:
+        meta = c["meta"]
+        chief = (meta.get("complaints") or [None])[0]
+        texts = [meta["title"]] + list(meta.get("complaints", []))[1:] + list(meta.get("questions_to_ask_next", []))
+        for t in texts[:per_card]:
+            out.append({"text": t, "chief": chief, "age_group": None, "pregnancy": None})
+    return out
+
+
+def load_queries(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def card_matrix(encoder: Encoder, cards: List[Dict], cache_root: str) -> np.ndarray:
+    # Her encoder kendi alt dizininde: üretim önbelleğinin manifest'i ezilmez
+    cache_dir = os.path.join(cache_root, re.sub(r"[^A-Za-z0-9_.@-]+", "_", encoder.name))
+    return EmbeddingCache(cache_dir, encoder.name).embeddings_for(
+        [c["content"] for c in cards], encoder.encode_passages)
+
+
+def run(encoder: Encoder, matrix: np.ndarray, cards: List[Dict], queries: List[Dict],
+        k: int, dtype: str, rescore_factor: int):
+    engine = RetrievalEngine(cards, matrix, matrix_dtype=dtype, rescore_factor=rescore_factor)
+    encoder.encode_queries([queries[0]["text"]])  # ısınma (model yükleme hariç tutulur)
+    enc_ms, search_ms, hits = [], [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        vec = encoder.encode_queries([q["text"]])[0]
+        t1 = time.perf_counter()
+        res = engine.search(vec, k, chief=q.get("chief"), age_group=q.get("age_group"),
+                            pregnancy=q.get("pregnancy"))
+        t2 = time.perf_counter()
+        enc_ms.append((t1 - t0) * 1000)
+        search_ms.append((t2 - t1) * 1000)
+        hits.append([cards[h[0]]["id"] for h in res])
+    return hits, np.array(enc_ms), np.array(search_ms), engine.nbytes
+
+
+def agreement(ref: List[List[str]], cand: List[List[str]], k: int):
+    top1 = np.mean([bool(a) and bool(b) and a[0] == b[0] for a, b in zip(ref, cand) if a])
+    overlap = np.mean([len(set(a) & set(b)) / min(k, len(a)) for a, b in zip(ref, cand) if a])
+    return float(top1), float(overlap)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Encoder/matris tipi adaylarını fp32 referansa göre değerlendirir")
+    ap.add_argument("--corpus", default=settings.CORPUS_GLOB)
+    ap.add_argument("--queries", default=None, help="JSONL sorgu dosyası (yoksa kartlardan türetilir)")
+    ap.add_argument("--baseline", default=f"st:{settings.EMBED_MODEL}")
+    ap.add_argument("--candidates", nargs="*", default=[f"onnx:{settings.EMBED_ONNX_DIR}"],
+                    help="backend:model (st:model adı, onnx:model dizini)")
+    ap.add_argument("--dtypes", nargs="+", default=["float32", "float16", "int8"])
+    ap.add_argument("--k", type=int, default=4)
+    ap.add_argument("--rescore-factor", type=int, default=settings.RAG_RESCORE_FACTOR)
+    ap.add_argument("--cache-dir", default=".cache/eval_encoders")
+    args = ap.parse_args()
+
+    cards = load_cards(args.corpus)
+    queries = load_queries(args.queries) if args.queries else card_queries(cards)
+    print(f"{len(cards)} kart, {len(queries)} sorgu, k={args.k}")
+
+    def encoder_for(spec: str) -> Encoder:
+        backend, _, model = spec.partition(":")
+        return make_encoder(backend, model or None)
+
+    base_enc = encoder_for(args.baseline)
+    base_matrix = card_matrix(base_enc, cards, args.cache_dir)
+    ref, ref_enc, ref_search, ref_bytes = run(base_enc, base_matrix, cards, queries, args.k, "float32", 1)
+
+    print(f"{'aday':<44} {'dtype':>8} {'top1':>6} {'top-k':>6} {'enc p50':>8} {'enc p95':>8} "
+          f"{'ara p50':>8} {'matris MB':>10}")
+
+    def row(name, dtype, hits, enc_ms, search_ms, nbytes):
+        top1, overlap = agreement(ref, hits, args.k)
+        print(f"{name[:44]:<44} {dtype:>8} {top1:>6.3f} {overlap:>6.3f} "
+              f"{np.percentile(enc_ms, 50):>8.2f} {np.percentile(enc_ms, 95):>8.2f} "
+              f"{np.percentile(search_ms, 50):>8.3f} {nbytes / 2**20:>10.2f}")
+
+    row(base_enc.name + " (ref)", "float32", ref, ref_enc, ref_search, ref_bytes)
+    for dtype in args.dtypes:
+        if dtype != "float32":
+            row(base_enc.name, dtype, *run(base_enc, base_matrix, cards, queries, args.k, dtype, args.rescore_factor))
+
+    for spec in args.candidates:
+        try:
+            enc = encoder_for(spec)
+            matrix = card_matrix(enc, cards, args.cache_dir)
+        except Exception as e:
+            print(f"{spec}: atlandı ({e})")
+            continue
+        for dtype in args.dtypes:
+            row(enc.name, dtype, *run(enc, matrix, cards, queries, args.k, dtype, args.rescore_factor))
+
+
+if __name__ == "__main__":
+    main()
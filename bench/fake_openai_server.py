@@ -0,0 +1,182 @@
+# bench/fake_openai_server.py
+"""
+Yerel, OpenAI uyumlu sahte /v1/chat/completions sunucusu (stream destekli).
+
+    uvicorn bench.fake_openai_server:app --port 8100
+    OPENAI_BASE_URL=http://localhost:8100/v1 OPENAI_API_KEY=fake uvicorn triage_api:app --port 9000
+
+Son kullanıcı mesajında "DONE=True" varsa final triage JSON'ı, yoksa yeni bir
+next_question döner (bağlamdaki kartların sorularından, yoksa numaralı sahte soru).
+Gecikme ve hata davranışı ortam değişkenleriyle ayarlanır:
+    FAKE_LLM_LATENCY_MS   ilk token'a kadar bekleme (varsayılan 0)
+    FAKE_LLM_JITTER_MS    bekleme üzerine eklenen düzgün rastgele süre [0, jitter) (varsayılan 0)
+    FAKE_LLM_CHUNK_MS     stream'de parçalar arası bekleme (varsayılan 0)
+    FAKE_LLM_CHUNK_CHARS  parça başına karakter (varsayılan 8)
+    FAKE_LLM_ERROR_RATE   isteklerin bu oranı FAKE_LLM_ERROR_STATUS ile döner (varsayılan 0)
+    FAKE_LLM_ERROR_STATUS hata durum kodu (varsayılan 429; 500 de denenebilir)
+    FAKE_LLM_SCRIPT       yanıt betiği (JSONL), aşağıya bakın
+
+Betik satırları sırayla denenir, ilk eşleşen kullanılır; hiçbiri eşleşmezse varsayılan yanıt:
+    {"done": false, "match": "göğüs", "reply": {"next_question": "Ağrı kola yayılıyor mu?", "finished": false}}
+    {"done": true, "raw": "{bozuk json"}                       # ayrıştırma hatası yolunu dener
+    {"latency_ms": 3000, "reply": {...}}                       # yavaş yanıt
+"match" tüm mesajlarda aranan düzenli ifadedir; "done" verilmişse DONE bayrağıyla eşleşmelidir.
+"""
+import asyncio, itertools, json, os, random, re, time, uuid
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="Fake OpenAI")
+
+LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+JITTER_MS = float(os.getenv("FAKE_LLM_JITTER_MS", "0"))
+CHUNK_MS = float(os.getenv("FAKE_LLM_CHUNK_MS", "0"))
+CHUNK_CHARS = int(os.getenv("FAKE_LLM_CHUNK_CHARS", "8"))
+ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+ERROR_STATUS = int(os.getenv("FAKE_LLM_ERROR_STATUS", "429"))
+
+_counter = itertools.count(1)
+_QUESTION_RE = re.compile(r"^- (.+\?)\s*$", re.MULTILINE)
+_stats = {"requests": 0, "errors": 0, "stream": 0}
+
+
+def load_script(path: Optional[str]) -> List[Dict]:
+    if not path:
+        return []
+    rules = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                rule = json.loads(line)
+                if "match" in rule:
+                    rule["_re"] = re.compile(rule["match"], re.IGNORECASE)
+                rules.append(rule)
+    return rules
+
+
+SCRIPT = load_script(os.getenv("FAKE_LLM_SCRIPT"))
+
+
+def _last_user_text(messages) -> str:
+    for m in reversed(messages):
+        if m.get("role") == "user":
+            return m.get("content") or ""
+    return ""
+
+
+def _all_text(messages) -> str:
+    return "\n".join(m.get("content") or "" for m in messages)
+
+
+def _match_rule(messages, done: bool) -> Optional[Dict]:
+    text = None
+    for rule in SCRIPT:
+        if "done" in rule and bool(rule["done"]) != done:
+            continue
+        if "_re" in rule:
+            text = text if text is not None else _all_text(messages)
+            if not rule["_re"].search(text):
+                continue
+        return rule
+    return None
+
+
+def scripted_reply(messages, rule: Optional[Dict] = None) -> str:
+    done = "DONE=True" in _last_user_text(messages)
+    if rule is not None:
+        return rule["raw"] if "raw" in rule else json.dumps(rule.get("reply", {}), ensure_ascii=False)
+    if done:
+        ids = re.findall(r"\[id: ([^\]]+)\]", _all_text(messages))
+        return json.dumps({
+            "triage": {
+                "triage_level": "ESI-3",
+                "red_flags": [],
+                "immediate_actions": ["Vital takibi"],
+                "questions_to_ask_next": [],
+                "routing": {"specialty": "acil", "priority": "medium"},
+                "rationale_brief": "Sahte sunucu yanıtı.",
+                "evidence_ids": ids[:1],
+            },
+            "finished": True,
+        }, ensure_ascii=False)
+    # Kart sorularından henüz sorulmamış olanı (gerçek modele benzer soru metni/uzunluğu)
+    asked = set(re.findall(r"- Soru: (.+)", _last_user_text(messages)))
+    for q in _QUESTION_RE.findall(_all_text(messages[:-1])):  # son mesaj: önceki soru-cevaplar
+        if q not in asked:
+            return json.dumps({"next_question": q, "finished": False}, ensure_ascii=False)
+    return json.dumps({"next_question": f"Sahte soru #{next(_counter)}?", "finished": False}, ensure_ascii=False)
+
+
+def _usage(messages, content: str) -> dict:
+    prompt = sum(len(m.get("content") or "") for m in messages) // 4
+    completion = len(content) // 4
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+
+@app.get("/v1/stats")
+def stats():
+    return _stats
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages = body.get("messages", [])
+    model = body.get("model", "fake")
+    _stats["requests"] += 1
+    rule = _match_rule(messages, "DONE=True" in _last_user_text(messages))
+    content = scripted_reply(messages, rule)
+    cid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+
+    latency_ms = float(rule.get("latency_ms", LATENCY_MS)) if rule else LATENCY_MS
+    if JITTER_MS:
+        latency_ms += random.uniform(0, JITTER_MS)
+    if latency_ms:
+        await asyncio.sleep(latency_ms / 1000)
+
+    if ERROR_RATE and random.random() < ERROR_RATE:
+        _stats["errors"] += 1
+        return JSONResponse({"error": {"message": "fake error", "type": "fake", "code": ERROR_STATUS}},
+                            status_code=ERROR_STATUS)
+
+    if not body.get("stream"):
+        return JSONResponse({
+            "id": cid,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": _usage(messages, content),
+        })
+
+    _stats["stream"] += 1
+    include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+    async def events():
+        def chunk(delta, finish=None, usage=None):
+            data = {
+                "id": cid,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}] if usage is None else [],
+            }
+            if usage is not None:
+                data["usage"] = usage
+            return "data: " + json.dumps(data, ensure_ascii=False) + "\n\n"
+
+        yield chunk({"role": "assistant", "content": ""})
+        for i in range(0, len(content), CHUNK_CHARS):
+            if CHUNK_MS:
+                await asyncio.sleep(CHUNK_MS / 1000)
+            yield chunk({"content": content[i:i + CHUNK_CHARS]})
+        yield chunk({}, finish="stop")
+        if include_usage:
+            yield chunk({}, usage=_usage(messages, content))
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
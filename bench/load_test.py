@@ -0,0 +1,260 @@
+# bench/load_test.py
+"""
+Uçtan uca yük testi: sahte LLM + sahte RAG ile triage_api üzerinde çok adımlı vakalar.
+
+Varsayılan olarak iki süreç başlatılır (OpenAI anahtarı, model veya veritabanı sunucusu
+gerekmez):
+    bench.fake_openai_server   OpenAI uyumlu sahte LLM (gecikme/hata/betik ayarlı)
+    bench.triage_app           triage_api + süreç içi sahte RAG, geçici SQLite
+
+Senaryolar (bench.scenarios) korpus kartlarından üretilir: start → cevaplar → final.
+Her eşzamanlılık düzeyi için uç bazında p50/p95/p99, istek/s, hata sayısı, vaka/s ve
+vaka başına LLM çağrısı (/metrics llm_calls_total farkı, önbellek isabetleri hariç) raporlanır; sonunda triage_api /metrics'ten aşama ortalamaları yazdırılır. Başlatılan
+triage_app'in soğuk açılış süresi (spawn → /readyz 200) de yazdırılır.
+
+    python -m bench.load_test --cases 200 --concurrency 1 8 32 --llm-latency-ms 400 --llm-jitter-ms 300
+    python -m bench.load_test --stream                # SSE uçları; ilk soruya kadar geçen süre ayrıca
+    python -m bench.load_test --url http://localhost:9000 --scenarios scenarios.jsonl
+    python -m bench.load_test --question-policy fixed      # soru politikası öncesi/sonrası karşılaştırma
+"""
+import argparse, asyncio, json, os, subprocess, sys, tempfile, time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from bench import scenarios as scen
+
+MAX_STEPS = 10  # sonsuz döngü koruması (POLICY_MAX_QA'dan büyük)
+
+
+class Recorder:
+    def __init__(self):
+        self.lat: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def add(self, endpoint: str, ms: float, ok: bool = True):
+        if ok:
+            self.lat[endpoint].append(ms)
+        else:
+            self.errors[endpoint] += 1
+
+
+async def _sse(http: httpx.AsyncClient, method: str, url: str, body: Dict, rec: Recorder, name: str) -> Dict:
+    """SSE ucunu okur; ilk next_question olayına kadar geçen süre <name>_first olarak kaydedilir."""
+    t0 = time.perf_counter()
+    event, step = None, None
+    async with http.stream(method, url, json=body) as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line[5:])
+                if event == "next_question":
+                    rec.add(f"{name}_first", (time.perf_counter() - t0) * 1000)
+                elif event == "step":
+                    step = data
+                elif event == "error":
+                    raise RuntimeError(data.get("detail"))
+    if step is None:
+        raise RuntimeError("step olayı gelmedi")
+    return step
+
+
+async def run_case(http: httpx.AsyncClient, s: Dict, rec: Recorder, stream: bool) -> bool:
+    suffix = "/stream" if stream else ""
+    t_case = time.perf_counter()
+    name = "start"
+    try:
+        t0 = time.perf_counter()
+        if stream:
+            step = await _sse(http, "POST", f"/triage/start{suffix}", s["input"], rec, name)
+        else:
+            r = await http.post("/triage/start", json=s["input"])
+            r.raise_for_status()
+            step = r.json()
+        rec.add(name, (time.perf_counter() - t0) * 1000)
+
+        answers = iter(s.get("answers") or [])
+        for _ in range(MAX_STEPS):
+            if step.get("finished"):
+                break
+            body = {"answers": {step["next_question"]: next(answers, "Hayır")}}
+            url = f"/triage/{step['case_id']}/answer{suffix}"
+            name = "answer"
+            t0 = time.perf_counter()
+            if stream:
+                step = await _sse(http, "PATCH", url, body, rec, name)
+            else:
+                r = await http.patch(url, json=body)
+                r.raise_for_status()
+                step = r.json()
+            # Finali döndüren cevap ayrı raporlanır (final LLM çağrısı + DB yazımı)
+            name = "final" if step.get("finished") else "answer"
+            rec.add(name, (time.perf_counter() - t0) * 1000)
+        else:
+            raise RuntimeError("vaka bitmedi")
+    except Exception:
+        rec.add(name, 0, ok=False)
+        rec.add("case", 0, ok=False)
+        return False
+    rec.add("case", (time.perf_counter() - t_case) * 1000)
+    return True
+
+
+async def llm_calls(http: httpx.AsyncClient) -> Optional[float]:
+    """triage_api /metrics'ten önbellek dışı LLM çağrı denemelerinin toplamı (tek worker)."""
+    try:
+        text = (await http.get("/metrics")).text
+    except httpx.HTTPError:
+        return None
+    return sum(float(line.rsplit(" ", 1)[1]) for line in text.splitlines()
+               if line.startswith("llm_calls_total{") and 'outcome="cache_hit"' not in line)
+
+
+async def run_level(base_url: str, cases: List[Dict], concurrency: int, stream: bool, timeout_s: float):
+    rec = Recorder()
+    sem = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout_s, limits=limits) as http:
+        await run_case(http, cases[0], Recorder(), stream)  # ısınma
+
+        async def one(s):
+            async with sem:
+                await run_case(http, s, rec, stream)
+
+        calls0 = await llm_calls(http)
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(s) for s in cases))
+        wall = time.perf_counter() - t0
+        calls1 = await llm_calls(http)
+    calls = calls1 - calls0 if calls0 is not None and calls1 is not None else None
+    return rec, wall, calls
+
+
+def report(rec: Recorder, wall: float, concurrency: int):
+    order = ["start", "start_first", "answer", "answer_first", "final", "case"]
+    for name in sorted(set(rec.lat) | set(rec.errors), key=lambda n: order.index(n) if n in order else 99):
+        lat = np.array(rec.lat.get(name) or [np.nan])
+        n = len(rec.lat.get(name, []))
+        print(f"{concurrency:>7} {name:<13} {n:>6} {rec.errors.get(name, 0):>5} {np.nanpercentile(lat, 50):>9.1f} "
+              f"{np.nanpercentile(lat, 95):>9.1f} {np.nanpercentile(lat, 99):>9.1f} {n / wall:>9.1f}")
+
+
+def stage_summary(base_url: str):
+    """triage_api /metrics'ten aşama başına ortalama süre ve sayaçlar."""
+    try:
+        text = httpx.get(f"{base_url}/metrics", timeout=5).text
+    except httpx.HTTPError:
+        return
+    sums, counts, counters = {}, {}, []
+    for line in text.splitlines():
+        if line.startswith("triage_stage_seconds_sum"):
+            sums[line.split('"')[1]] = float(line.rsplit(" ", 1)[1])
+        elif line.startswith("triage_stage_seconds_count"):
+            counts[line.split('"')[1]] = int(float(line.rsplit(" ", 1)[1]))
+        elif line.startswith(("llm_calls_total", "llm_retries_total", "llm_tokens_total",
+                              "triage_policy_decisions_total", "triage_question_repeats_total")):
+            counters.append(line)
+    print("\naşama (tüm düzeyler)     adet   ort. ms")
+    for stage in sorted(counts):
+        print(f"  {stage:<20} {counts[stage]:>7} {sums[stage] / max(counts[stage], 1) * 1000:>9.2f}")
+    for line in counters:
+        print(f"  {line}")
+
+
+def start_process(module: str, port: int, env: Dict, probe: str) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", module, "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{module} başlamadı (çıkış kodu {proc.returncode})")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}{probe}", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{module} başlamadı")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cases", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    ap.add_argument("--scenarios", default=None, help="bench.scenarios JSONL dosyası (yoksa üretilir)")
+    ap.add_argument("--repeat", type=float, default=0.0, help="Üretilen vakalarda tekrar oranı")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--stream", action="store_true", help="SSE uçlarını kullan")
+    ap.add_argument("--timeout", type=float, default=60.0)
+    ap.add_argument("--url", default=None, help="Çalışan triage_api adresi (yoksa bench.triage_app başlatılır)")
+    ap.add_argument("--port", type=int, default=9100)
+    ap.add_argument("--llm-url", default=None, help="Çalışan OpenAI uyumlu sunucu (yoksa sahte sunucu)")
+    ap.add_argument("--llm-port", type=int, default=8100)
+    ap.add_argument("--llm-latency-ms", type=float, default=0.0)
+    ap.add_argument("--llm-jitter-ms", type=float, default=0.0)
+    ap.add_argument("--llm-chunk-ms", type=float, default=0.0)
+    ap.add_argument("--llm-error-rate", type=float, default=0.0)
+    ap.add_argument("--llm-script", default=None, help="Sahte sunucu yanıt betiği (JSONL)")
+    ap.add_argument("--rag", default="stub", choices=["stub", "app"], help="app: RAG_MODE ayarındaki istemci")
+    ap.add_argument("--rag-latency-ms", type=float, default=0.0)
+    ap.add_argument("--llm-cache", action="store_true", help="LLM yanıt önbelleğini açık bırak")
+    ap.add_argument("--question-policy", default=None, choices=["adaptive", "fixed"], help="QUESTION_POLICY")
+    ap.add_argument("--question-source", default=None, choices=["auto", "card", "llm"], help="QUESTION_SOURCE")
+    args = ap.parse_args()
+
+    cases = scen.load(args.scenarios) if args.scenarios else scen.generate(args.cases, args.seed, repeat=args.repeat)
+    cases = cases[:args.cases]
+    procs: List[subprocess.Popen] = []
+    tmp = tempfile.TemporaryDirectory(prefix="triage-bench-")
+    try:
+        base_url = args.url
+        if not base_url:
+            llm_url = args.llm_url
+            if not llm_url:
+                llm_env = dict(os.environ, FAKE_LLM_LATENCY_MS=str(args.llm_latency_ms),
+                               FAKE_LLM_JITTER_MS=str(args.llm_jitter_ms), FAKE_LLM_CHUNK_MS=str(args.llm_chunk_ms),
+                               FAKE_LLM_ERROR_RATE=str(args.llm_error_rate), FAKE_LLM_SCRIPT=args.llm_script or "")
+                procs.append(start_process("bench.fake_openai_server:app", args.llm_port, llm_env, "/v1/stats"))
+                llm_url = f"http://127.0.0.1:{args.llm_port}/v1"
+            app_env = dict(
+                os.environ,
+                OPENAI_BASE_URL=llm_url, OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "fake"),
+                DATABASE_URL=f"sqlite:///{tmp.name}/bench.db", CASE_STORE="memory", ARCHIVE_ENABLED="false",
+                LLM_CACHE_ENABLED="true" if args.llm_cache else "false", LOG_LEVEL="WARNING",
+                BENCH_RAG=args.rag, BENCH_RAG_LATENCY_MS=str(args.rag_latency_ms), RAG_WATCH_INTERVAL_S="0",
+            )
+            if args.question_policy:
+                app_env["QUESTION_POLICY"] = args.question_policy
+            if args.question_source:
+                app_env["QUESTION_SOURCE"] = args.question_source
+            t0 = time.perf_counter()
+            procs.append(start_process("bench.triage_app:app", args.port, app_env, "/readyz"))
+            print(f"triage_app soğuk açılış (spawn → /readyz): {(time.perf_counter() - t0) * 1000:.0f} ms")
+            base_url = f"http://127.0.0.1:{args.port}"
+
+        print(f"{len(cases)} vaka, stream={args.stream}, llm={args.llm_latency_ms:.0f}+{args.llm_jitter_ms:.0f} ms, "
+              f"rag={args.rag}, policy={args.question_policy or 'app'}/{args.question_source or 'app'}")
+        print(f"{'eşzaman':>7} {'uç':<13} {'adet':>6} {'hata':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'istek/s':>9}")
+        for c in args.concurrency:
+            rec, wall, calls = asyncio.run(run_level(base_url, cases, c, args.stream, args.timeout))
+            report(rec, wall, c)
+            done = len(rec.lat.get("case", []))
+            print(f"{c:>7} {'vaka/s':<13} {done / wall:>6.1f}")
+            if calls is not None:
+                print(f"{c:>7} {'LLM/vaka':<13} {calls / max(len(cases), 1):>6.2f}")
+        stage_summary(base_url)
+    finally:
+        for p in procs:
+            p.terminate()
+            p.wait(timeout=10)
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
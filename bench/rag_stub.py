@@ -0,0 +1,58 @@
+# bench/rag_stub.py
+"""
+Süreç içi sahte RAG istemcisi (rag_client istemcileriyle aynı arayüz).
+
+Model, embedding önbelleği veya rag_memory gerekmez: kartlar chief ile şikayet
+listesinin kelime örtüşmesine göre sıralanır, yanıt /rag/topk biçimindedir. Yük
+testinde RAG'i sabit maliyetli (latency_ms) bir adıma indirip triage_api + LLM
+yolunu ayrı ölçmek için kullanılır.
+
+    triage_api.rag_client = StubRagClient("corpus/triage/*.json", latency_ms=2)
+"""
+import asyncio
+from typing import Dict, List
+
+from cards import load_cards
+
+
+def _words(text: str) -> set:
+    return set((text or "").lower().split())
+
+
+class StubRagClient:
+    mode = "stub"
+
+    def __init__(self, pattern: str = "corpus/triage/*.json", latency_ms: float = 0.0):
+        self.cards = load_cards(pattern)
+        self.latency_ms = latency_ms
+        self._vocab = [set().union(*(_words(x) for x in c["meta"].get("complaints", [])), _words(c["meta"]["title"]))
+                       for c in self.cards]
+        self.calls = 0
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def rank(self, body: Dict) -> List[Dict]:
+        query = _words(body.get("chief")) | _words(body.get("text"))
+        scored = sorted(((len(query & v), i) for i, v in enumerate(self._vocab)), key=lambda x: (-x[0], x[1]))
+        out = []
+        for score, i in scored[:body.get("k", 4)]:
+            c = self.cards[i]
+            out.append({"id": c["id"], "title": c["meta"]["title"], "content": c["content"], "score": float(score),
+                        "evidence": c["meta"].get("evidence", []), "corpus": "stub"})
+        return out
+
+    async def topk(self, body: Dict) -> List[Dict]:
+        self.calls += 1
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return self.rank(body)
+
+    def stats(self) -> Dict:
+        return {"client": self.mode, "cards": len(self.cards), "calls": self.calls}
+
+    def readiness(self) -> Dict:
+        return {"client": self.mode, "ready": True}
@@ -0,0 +1,90 @@
+# bench/scenarios.py
+"""
+Korpus kartlarından gerçekçi, çok adımlı triyaj vakaları üretir (yük testi girdisi).
+
+Her senaryo: /triage/start gövdesi + sırayla verilecek cevaplar (start → 3 cevap → final).
+Şikayet metni kartın şikayetlerinden, yaş kartın yaş grubundan, gebelik kartın
+gebelik alanından seçilir; vakaların küçük bir kısmı kritik vital taşır (kural
+fast path'i). Aynı tohum aynı vakaları üretir; --repeat ile aynı başvuruların
+tekrarı (önbellek isabeti) ayarlanır.
+
+    python -m bench.scenarios --n 200 --out scenarios.jsonl
+"""
+import argparse, json, random
+from typing import Dict, List, Optional
+
+from cards import load_cards
+
+AGE_RANGES = {"pediatric": (1, 17), "adult": (18, 64), "geriatric": (65, 92)}
+DURATIONS = ["yarım saattir", "2 saattir", "dünden beri", "3 gündür", "bir haftadır"]
+EXTRAS = ["", "", "ve bulantı", "ve terleme", "ve halsizlik", "giderek artıyor"]
+ANSWERS = ["Evet", "Hayır", "Hayır", "Bilmiyorum", "Biraz", "Dün akşam başladı", "Evet, çok şiddetli"]
+
+
+def _vitals(rnd: random.Random, critical: bool) -> Dict:
+    if critical:
+        return {"hr": rnd.randint(135, 170), "sbp": rnd.randint(70, 85), "spo2": rnd.randint(82, 89),
+                "rr": rnd.randint(28, 36), "temp": round(rnd.uniform(36.0, 40.0), 1)}
+    return {"hr": rnd.randint(62, 105), "sbp": rnd.randint(105, 145), "spo2": rnd.randint(95, 100),
+            "rr": rnd.randint(12, 20), "temp": round(rnd.uniform(36.2, 38.2), 1)}
+
+
+def make_scenario(card: Dict, rnd: random.Random, n_answers: int = 3, critical_rate: float = 0.05) -> Dict:
+    meta = card["meta"]
+    complaint = rnd.choice(meta.get("complaints") or [meta["title"]])
+    groups = [g for g in meta.get("age_groups", []) if g in AGE_RANGES] or ["adult"]
+    age = rnd.randint(*AGE_RANGES[rnd.choice(groups)])
+    sex = rnd.choice(["F", "M"])
+    # Ön yüzdeki seçenekler: any | positive | negative
+    if "pregnant" in meta.get("pregnancy", []):
+        sex, pregnancy = "F", "positive"
+    else:
+        pregnancy = rnd.choice(["any", "negative"]) if sex == "F" and 15 <= age <= 50 else "any"
+    text = " ".join(x for x in (complaint.capitalize(), rnd.choice(DURATIONS), rnd.choice(EXTRAS)) if x)
+    return {
+        "card": card["id"],
+        "input": {"age": age, "sex": sex, "complaint_text": text, "chief": complaint,
+                  "pregnancy": pregnancy, "vitals": _vitals(rnd, rnd.random() < critical_rate), "k": 3},
+        "answers": [rnd.choice(ANSWERS) for _ in range(n_answers)],
+    }
+
+
+def generate(n: int, seed: int = 0, pattern: str = "corpus/triage/*.json", repeat: float = 0.0,
+             critical_rate: float = 0.05, cards: Optional[List[Dict]] = None) -> List[Dict]:
+    """repeat: önceki bir senaryonun aynen tekrarlanma olasılığı (sık başvurular)."""
+    rnd = random.Random(seed)
+    cards = cards or load_cards(pattern)
+    out: List[Dict] = []
+    for _ in range(n):
+        if out and rnd.random() < repeat:
+            out.append(rnd.choice(out))
+        else:
+            out.append(make_scenario(rnd.choice(cards), rnd, critical_rate=critical_rate))
+    return out
+
+
+def load(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--corpus", default="corpus/triage/*.json")
+    ap.add_argument("--repeat", type=float, default=0.0, help="Önceki bir vakanın tekrar oranı")
+    ap.add_argument("--critical-rate", type=float, default=0.05)
+    ap.add_argument("--out", default="-")
+    args = ap.parse_args()
+    rows = generate(args.n, args.seed, args.corpus, args.repeat, args.critical_rate)
+    lines = "\n".join(json.dumps(r, ensure_ascii=False) for r in rows) + "\n"
+    if args.out == "-":
+        print(lines, end="")
+    else:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(lines)
+
+
+if __name__ == "__main__":
+    main()
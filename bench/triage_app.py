@@ -0,0 +1,25 @@
+# bench/triage_app.py
+"""
+Yük testi için triage_api: RAG sahte istemciyle (bench.rag_stub) değiştirilir, tablolar
+oluşturulur. bench.load_test bu modülü uvicorn ile ayrı süreçte başlatır; ortam
+(OPENAI_BASE_URL, DATABASE_URL, CASE_STORE ...) başlatan tarafından verilir.
+
+    BENCH_RAG=stub|app       stub: sahte RAG (varsayılan), app: RAG_MODE ayarındaki istemci
+    BENCH_RAG_LATENCY_MS     sahte RAG'in sabit gecikmesi (varsayılan 0)
+
+    OPENAI_BASE_URL=http://localhost:8100/v1 OPENAI_API_KEY=fake uvicorn bench.triage_app:app --port 9100
+"""
+import os
+
+import triage_api
+from database import Base, engine
+from triage_api import app  # noqa: F401  (uvicorn bench.triage_app:app)
+
+Base.metadata.create_all(bind=engine)
+
+if os.getenv("BENCH_RAG", "stub") == "stub":
+    from bench.rag_stub import StubRagClient
+    from config import settings
+
+    # lifespan ve _create_case modül değişkenini kullanır
+    triage_api.rag_client = StubRagClient(settings.CORPUS_GLOB, float(os.getenv("BENCH_RAG_LATENCY_MS", "0")))
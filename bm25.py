@@ -0,0 +1,66 @@
+# bm25.py
+"""
+Önceden hesaplanmış BM25 ters indeksi (NumPy, ek bağımlılık yok).
+
+Her terim için (satır, ağırlık) posting'leri terim sırasına göre tek dizide tutulur;
+ağırlıklar (idf * tf doygunluğu) kurulumda hesaplandığından sorgu maliyeti, sorgu
+terimlerinin posting'leri üzerinde tek bir np.bincount'tur. Model gerektirmediği için
+encoder erişilemezken düşük gecikmeli yedek olarak da kullanılır.
+
+Türkçe için ayrıca kök bulucu kullanılmaz: kelimenin ilk 5 harfi (F5) eklemeli dilde
+basit ve etkili bir kök yaklaşımıdır ("kusma", "kusması", "kusmaya" → "kusma").
+"""
+import re
+from collections import Counter
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from query_cache import fold_case
+
+PREFIX_LEN = 5
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    text = fold_case(text)
+    return [t[:PREFIX_LEN] for t in _TOKEN_RE.findall(text) if len(t) > 1]
+
+
+class BM25Index:
+    def __init__(self, texts: Sequence[str], k1: float = 1.2, b: float = 0.75):
+        self.n = len(texts)
+        vocab: Dict[str, int] = {}
+        rows: List[int] = []
+        cols: List[int] = []
+        tfs: List[int] = []
+        lengths = np.zeros(self.n, dtype=np.float32)
+        for i, text in enumerate(texts):
+            toks = tokenize(text)
+            lengths[i] = len(toks)
+            for t, c in Counter(toks).items():
+                cols.append(vocab.setdefault(t, len(vocab)))
+                rows.append(i)
+                tfs.append(c)
+        self.vocab = vocab
+        rows_a = np.asarray(rows, dtype=np.int32)
+        cols_a = np.asarray(cols, dtype=np.int64)
+        tf = np.asarray(tfs, dtype=np.float32)
+        df = np.bincount(cols_a, minlength=len(vocab)).astype(np.float32)
+        idf = np.log1p((self.n - df + 0.5) / (df + 0.5))
+        avgdl = float(lengths.mean()) if self.n and lengths.mean() > 0 else 1.0
+        w = idf[cols_a] * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths[rows_a] / avgdl))
+
+        order = np.argsort(cols_a, kind="stable")
+        self.post_rows = rows_a[order]
+        self.post_w = w[order].astype(np.float32)
+        self.offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df.astype(np.int64), out=self.offsets[1:])
+
+    def scores(self, query: str) -> np.ndarray:
+        """Satır başına BM25 skoru (eşleşmeyen satırlar 0)."""
+        terms = [self.vocab[t] for t in set(tokenize(query)) if t in self.vocab]
+        if not terms:
+            return np.zeros(self.n, dtype=np.float32)
+        idx = np.concatenate([np.arange(self.offsets[j], self.offsets[j + 1]) for j in terms])
+        return np.bincount(self.post_rows[idx], weights=self.post_w[idx], minlength=self.n).astype(np.float32)
@@ -0,0 +1,50 @@
+# cards.py
+import glob, json
+from typing import Dict, List, Tuple
+
+
+def render_card(c: dict) -> str:
+    """Kartı embedding'e girecek düz metne çevirir."""
+    rf  = "\n- " + "\n- ".join(c.get("red_flags", [])) if c.get("red_flags") else ""
+    acts= "\n- " + "\n- ".join(c.get("immediate_actions", [])) if c.get("immediate_actions") else ""
+    nxt = "\n- " + "\n- ".join(c.get("questions_to_ask_next", [])) if c.get("questions_to_ask_next") else ""
+    return f"""{c['title']}
+ESI ipucu: {c.get('esi_hint','-')}
+Red flags:{rf}
+İlk eylemler:{acts}
+Sorulacak ek sorular:{nxt}"""
+
+
+def load_cards(pattern: str = "corpus/triage/*.json") -> List[Dict]:
+    """Glob ile eşleşen kart dosyalarını {id, meta, content} listesi olarak yükler."""
+    cards = []
+    for p in sorted(glob.glob(pattern)):
+        with open(p, "r", encoding="utf-8") as f:
+            c = json.load(f)
+        cards.append({"id": c["id"], "meta": c, "content": render_card(c)})
+    return cards
+
+
+CHUNK_FIELDS = (
+    ("red_flags", "Red flags"),
+    ("immediate_actions", "İlk eylemler"),
+    ("questions_to_ask_next", "Sorulacak ek sorular"),
+)
+
+
+def chunk_card(c: dict) -> List[Tuple[str, str]]:
+    """
+    Kartı alan bazlı (alan, metin) parçalarına böler; uzun kartlarda tek vektörün
+    seyrelmesini önler. Her parça başlığı taşır, özet parçası şikayetleri de içerir.
+    """
+    title = c["title"]
+    summary = title
+    if c.get("complaints"):
+        summary += "\nŞikayetler: " + ", ".join(c["complaints"])
+    summary += f"\nESI ipucu: {c.get('esi_hint', '-')}"
+    chunks = [("summary", summary)]
+    for field, label in CHUNK_FIELDS:
+        items = c.get(field) or []
+        if items:
+            chunks.append((field, f"{title}\n{label}:\n- " + "\n- ".join(items)))
+    return chunks
@@ -0,0 +1,162 @@
+# case_store.py
+"""
+Devam eden triyaj vakalarının (CaseState) deposu.
+
+gunicorn birden fazla worker ile çalıştığında /triage/start ve /triage/{id}/answer
+farklı worker'lara düşebilir; bu yüzden durum worker dışında tutulabilmelidir.
+
+Backend'ler (CASE_STORE ayarı):
+- memory: süreç içi LRU + TTL (tek worker / geliştirme)
+- sql:    database.py üzerinden SQLAlchemy tablosu (case_states)
+- redis:  Redis protokolü; fakeredis gibi uyumlu bir istemci de verilebilir
+
+Biten vakalar CASE_FINISHED_TTL_SECONDS, yarıda kalanlar CASE_TTL_SECONDS sonra silinir.
+"""
+import time, zlib
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from config import settings
+from schemas import CaseState
+from ttl_cache import TTLCache
+
+
+def dump_case(cs: CaseState) -> bytes:
+    # Varsayılan alanlar yazılmaz; rag_cards içeriği nedeniyle zlib belirgin kazanç sağlar
+    return zlib.compress(cs.model_dump_json(exclude_defaults=True).encode("utf-8"), 3)
+
+
+def load_case(data: bytes) -> CaseState:
+    return CaseState.model_validate_json(zlib.decompress(data))
+
+
+class CaseStore(ABC):
+    def __init__(self, ttl: float, finished_ttl: float):
+        self.ttl = ttl
+        self.finished_ttl = finished_ttl
+
+    def ttl_for(self, cs: CaseState) -> float:
+        return self.finished_ttl if cs.finished else self.ttl
+
+    @abstractmethod
+    def get(self, case_id: str) -> Optional[CaseState]:
+        ...
+
+    @abstractmethod
+    def put(self, cs: CaseState) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, case_id: str) -> None:
+        ...
+
+    def purge_expired(self) -> int:
+        """Süresi dolmuş kayıtları siler; kendiliğinden süre aşımı yapan backend'lerde no-op."""
+        return 0
+
+
+class MemoryCaseStore(CaseStore):
+    def __init__(self, ttl: float, finished_ttl: float, max_items: int = 10000):
+        super().__init__(ttl, finished_ttl)
+        self._cache = TTLCache(maxsize=max_items)
+
+    def get(self, case_id: str) -> Optional[CaseState]:
+        data = self._cache.get(case_id)
+        return load_case(data) if data is not None else None
+
+    def put(self, cs: CaseState) -> None:
+        self._cache.set(cs.case_id, dump_case(cs), ttl=self.ttl_for(cs))
+
+    def delete(self, case_id: str) -> None:
+        self._cache.pop(case_id)
+
+
+class SqlCaseStore(CaseStore):
+    # Her N yazmada bir süresi dolmuş satırlar temizlenir
+    PURGE_EVERY = 200
+
+    def __init__(self, ttl: float, finished_ttl: float, session_factory=None):
+        super().__init__(ttl, finished_ttl)
+        from database import SessionLocal, engine
+        from models import CaseRecord
+
+        self._Record = CaseRecord
+        self._session_factory = session_factory or SessionLocal
+        CaseRecord.__table__.create(bind=engine, checkfirst=True)
+        self._writes = 0
+
+    def get(self, case_id: str) -> Optional[CaseState]:
+        db = self._session_factory()
+        try:
+            row = db.get(self._Record, case_id)
+            if row is None or row.expires_at <= time.time():
+                return None
+            return load_case(row.data)
+        finally:
+            db.close()
+
+    def put(self, cs: CaseState) -> None:
+        db = self._session_factory()
+        try:
+            db.merge(self._Record(
+                case_id=cs.case_id,
+                data=dump_case(cs),
+                expires_at=time.time() + self.ttl_for(cs),
+            ))
+            db.commit()
+        finally:
+            db.close()
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self.purge_expired()
+
+    def delete(self, case_id: str) -> None:
+        db = self._session_factory()
+        try:
+            db.query(self._Record).filter(self._Record.case_id == case_id).delete()
+            db.commit()
+        finally:
+            db.close()
+
+    def purge_expired(self) -> int:
+        db = self._session_factory()
+        try:
+            n = db.query(self._Record).filter(self._Record.expires_at <= time.time()).delete()
+            db.commit()
+            return n
+        finally:
+            db.close()
+
+
+class RedisCaseStore(CaseStore):
+    KEY_PREFIX = "triage:case:"
+
+    def __init__(self, ttl: float, finished_ttl: float, client=None, url: Optional[str] = None):
+        super().__init__(ttl, finished_ttl)
+        if client is None:
+            import redis  # opsiyonel bağımlılık
+            client = redis.Redis.from_url(url or settings.CASE_STORE_URL)
+        self._r = client
+
+    def get(self, case_id: str) -> Optional[CaseState]:
+        data = self._r.get(self.KEY_PREFIX + case_id)
+        return load_case(data) if data is not None else None
+
+    def put(self, cs: CaseState) -> None:
+        # Süre aşımını Redis yönetir (EXPIRE)
+        self._r.set(self.KEY_PREFIX + cs.case_id, dump_case(cs), ex=max(1, int(self.ttl_for(cs))))
+
+    def delete(self, case_id: str) -> None:
+        self._r.delete(self.KEY_PREFIX + case_id)
+
+
+def make_case_store(kind: Optional[str] = None) -> CaseStore:
+    kind = (kind or settings.CASE_STORE).lower()
+    ttl, finished_ttl = settings.CASE_TTL_SECONDS, settings.CASE_FINISHED_TTL_SECONDS
+    if kind == "memory":
+        return MemoryCaseStore(ttl, finished_ttl, max_items=settings.CASE_STORE_MAX_ITEMS)
+    if kind == "sql":
+        return SqlCaseStore(ttl, finished_ttl)
+    if kind == "redis":
+        return RedisCaseStore(ttl, finished_ttl, url=settings.CASE_STORE_URL)
+    raise ValueError(f"Bilinmeyen CASE_STORE: {kind}")
@@ -1,6 +1,10 @@
 import os
+from dotenv import load_dotenv
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+# .env tek yerde, ilk import'ta yüklenir (os.getenv varsayılanları ve OPENAI_API_KEY için)
+load_dotenv()
+
 class Settings(BaseSettings):
     # Pydantic Settings config
     model_config = SettingsConfigDict(
@@ -17,12 +21,136 @@ class Settings(BaseSettings):
         "sqlite:///./triage.db"
     )
     
+    # Engine / bağlantı havuzu (database.make_engine)
+    DB_ECHO: bool = os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_RECYCLE_S: int = int(os.getenv("DB_POOL_RECYCLE_S", "1800"))
+
+    # Final triage write-behind (kuyruk + batch insert)
+    TRIAGE_WRITE_BATCH_SIZE: int = int(os.getenv("TRIAGE_WRITE_BATCH_SIZE", "100"))
+    TRIAGE_WRITE_WINDOW_MS: float = float(os.getenv("TRIAGE_WRITE_WINDOW_MS", "50"))
+    TRIAGE_WRITE_QUEUE_MAX: int = int(os.getenv("TRIAGE_WRITE_QUEUE_MAX", "10000"))
+    # true: istek group commit'i bekler; false: kuyruğa bırakılınca döner
+    TRIAGE_WRITE_WAIT_COMMIT: bool = os.getenv("TRIAGE_WRITE_WAIT_COMMIT", "false").lower() in ("1", "true", "yes")
+    TRIAGE_WRITE_SPILL_PATH: str = os.getenv("TRIAGE_WRITE_SPILL_PATH", "triage_spill.jsonl")
+
+    # Analytics rollup'ları (final triage yazılırken artımlı güncellenir)
+    ANALYTICS_ROLLUPS: bool = os.getenv("ANALYTICS_ROLLUPS", "true").lower() in ("1", "true", "yes")
+
+    # Dosya arşivi (utils_output.ArchiveWriter): segmentli NDJSON + offset indeksi
+    ARCHIVE_ENABLED: bool = os.getenv("ARCHIVE_ENABLED", "false").lower() in ("1", "true", "yes")
+    ARCHIVE_DIR: str = os.getenv("OUTPUT_DIR", "output")
+    ARCHIVE_SEGMENT_MB: int = int(os.getenv("ARCHIVE_SEGMENT_MB", "64"))
+    ARCHIVE_ROTATE_S: float = float(os.getenv("ARCHIVE_ROTATE_S", "3600"))
+    ARCHIVE_COMPRESS: str = os.getenv("ARCHIVE_COMPRESS", "gzip")  # gzip | zstd | none
+
+    # Case State Store (memory | sql | redis)
+    # Çok worker'lı dağıtımda sql veya redis kullanılmalı.
+    CASE_STORE: str = os.getenv("CASE_STORE", "memory")
+    CASE_STORE_URL: str = os.getenv("CASE_STORE_URL", "redis://localhost:6379/0")
+    CASE_TTL_SECONDS: int = int(os.getenv("CASE_TTL_SECONDS", "3600"))
+    CASE_FINISHED_TTL_SECONDS: int = int(os.getenv("CASE_FINISHED_TTL_SECONDS", "300"))
+    CASE_STORE_MAX_ITEMS: int = int(os.getenv("CASE_STORE_MAX_ITEMS", "10000"))
+
     # RAG Service Configs
     RAG_URL: str = os.getenv(
         "RAG_URL", 
         "http://localhost:8000/rag/topk"
     )
     
+    # RAG Embedding Configs
+    EMBED_MODEL: str = os.getenv("EMBED_MODEL", "intfloat/multilingual-e5-large")
+    EMBED_CACHE_DIR: str = os.getenv("EMBED_CACHE_DIR", ".cache/embeddings")
+    CORPUS_GLOB: str = os.getenv("CORPUS_GLOB", "corpus/triage/*.json")
+    # RAG'in yüklediği adlandırılmış korpuslar (sıra önceliktir: aynı id'de ilk korpus geçerli)
+    RAG_CORPORA: str = os.getenv("RAG_CORPORA", f"triage={CORPUS_GLOB},samples=samples/*.json,sides=sides/*.json")
+    # Kartları alan bazlı parçalara böl (özet, red flags, ilk eylemler, sorular)
+    RAG_CHUNKING: bool = os.getenv("RAG_CHUNKING", "true").lower() in ("1", "true", "yes")
+    # dense | sparse (BM25, model yüklenmez) | hybrid (RRF)
+    RAG_RETRIEVAL_MODE: str = os.getenv("RAG_RETRIEVAL_MODE", "hybrid")
+    RAG_RRF_K: int = int(os.getenv("RAG_RRF_K", "60"))
+    RAG_RRF_DEPTH: int = int(os.getenv("RAG_RRF_DEPTH", "50"))
+
+    # Encoder backend: st (SentenceTransformer, fp32) | onnx (ONNX Runtime, encoders.py export)
+    EMBED_BACKEND: str = os.getenv("EMBED_BACKEND", "st")
+    EMBED_ONNX_DIR: str = os.getenv("EMBED_ONNX_DIR", "models/e5-large-onnx")
+    EMBED_ONNX_INT8: bool = os.getenv("EMBED_ONNX_INT8", "true").lower() in ("1", "true", "yes")
+    EMBED_THREADS: int = int(os.getenv("EMBED_THREADS", "0"))  # 0 → runtime varsayılanı
+
+    # Kart matrisinin bellekteki tipi: float32 | float16 | int8 (satır başı ölçekli).
+    # float32 dışında ilk k*RAG_RESCORE_FACTOR aday önbellekteki fp32 satırlarla yeniden skorlanır.
+    RAG_MATRIX_DTYPE: str = os.getenv("RAG_MATRIX_DTYPE", "float32")
+    RAG_RESCORE_FACTOR: int = int(os.getenv("RAG_RESCORE_FACTOR", "4"))
+
+    # ANN indeksi: ivf (NumPy) | hnsw (hnswlib) | none; yalnızca RAG_ANN_MIN_CARDS ve üstünde
+    RAG_ANN: str = os.getenv("RAG_ANN", "ivf")
+    RAG_ANN_MIN_CARDS: int = int(os.getenv("RAG_ANN_MIN_CARDS", "20000"))
+    RAG_ANN_NPROBE: int = int(os.getenv("RAG_ANN_NPROBE", "32"))
+    RAG_ANN_DIR: str = os.getenv("RAG_ANN_DIR", ".cache/ann")
+
+    # Korpus izleme (değişen kartlar yeniden başlatmadan devreye alınır; 0 → kapalı)
+    RAG_WATCH_INTERVAL_S: float = float(os.getenv("RAG_WATCH_INTERVAL_S", "5"))
+    # /rag/reload için X-Admin-Token (boşsa kontrol yok)
+    RAG_ADMIN_TOKEN: str = os.getenv("RAG_ADMIN_TOKEN", "")
+
+    # RAG Query Micro-batching
+    # Pencere büyüdükçe throughput artar, tekil sorgunun gecikmesi de artar.
+    RAG_MICROBATCH_ENABLED: bool = os.getenv("RAG_MICROBATCH_ENABLED", "true").lower() in ("1", "true", "yes")
+    RAG_MICROBATCH_WINDOW_MS: float = float(os.getenv("RAG_MICROBATCH_WINDOW_MS", "5"))
+    RAG_MICROBATCH_MAX_SIZE: int = int(os.getenv("RAG_MICROBATCH_MAX_SIZE", "32"))
+    RAG_BATCH_MAX_QUERIES: int = int(os.getenv("RAG_BATCH_MAX_QUERIES", "256"))
+
+    # Sorgu önbelleği (query_cache): metin → embedding ve (metin, filtreler, k, indeks sürümü) → top-k
+    RAG_QUERY_CACHE_ENABLED: bool = os.getenv("RAG_QUERY_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    RAG_VECTOR_CACHE_MAX_ITEMS: int = int(os.getenv("RAG_VECTOR_CACHE_MAX_ITEMS", "8192"))
+    RAG_VECTOR_CACHE_TTL_S: float = float(os.getenv("RAG_VECTOR_CACHE_TTL_S", "86400"))
+    RAG_RESULT_CACHE_MAX_ITEMS: int = int(os.getenv("RAG_RESULT_CACHE_MAX_ITEMS", "8192"))
+    RAG_RESULT_CACHE_TTL_S: float = float(os.getenv("RAG_RESULT_CACHE_TTL_S", "3600"))
+
+    # triage_api kart getirme: remote (rag_memory HTTP) | local (süreç içi RetrievalService)
+    RAG_MODE: str = os.getenv("RAG_MODE", "remote")
+
+    # RAG HTTP client (triage_api → rag_memory)
+    RAG_TIMEOUT_S: float = float(os.getenv("RAG_TIMEOUT_S", "15"))
+    RAG_MAX_RETRIES: int = int(os.getenv("RAG_MAX_RETRIES", "2"))
+    RAG_POOL_SIZE: int = int(os.getenv("RAG_POOL_SIZE", "100"))
+    # Art arda bu kadar başarısız istekten sonra RAG_CIRCUIT_RESET_S boyunca istekler hemen reddedilir
+    RAG_CIRCUIT_FAILURES: int = int(os.getenv("RAG_CIRCUIT_FAILURES", "5"))
+    RAG_CIRCUIT_RESET_S: float = float(os.getenv("RAG_CIRCUIT_RESET_S", "10"))
+
+    # LLM Response Cache (birebir eşleşen adımlar LLM'e gitmez)
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    LLM_CACHE_MAX_ITEMS: int = int(os.getenv("LLM_CACHE_MAX_ITEMS", "4096"))
+    LLM_CACHE_TTL_S: float = float(os.getenv("LLM_CACHE_TTL_S", "86400"))
+
+    # Speculative final triage (son soru sorulurken finali arka planda hesapla)
+    SPECULATIVE_FINAL: bool = os.getenv("SPECULATIVE_FINAL", "false").lower() in ("1", "true", "yes")
+    SPECULATIVE_ASSUMED_ANSWER: str = os.getenv("SPECULATIVE_ASSUMED_ANSWER", "Hayır")
+
+    # Deterministic fast path (vital tabanlı red flag kuralları)
+    RULES_FAST_PATH: bool = os.getenv("RULES_FAST_PATH", "true").lower() in ("1", "true", "yes")
+
+    # Soru politikası (question_policy): adaptive → vaka başına erken bitiş / kart sorusu kararı,
+    # fixed → her vakada POLICY_MAX_QA soru, hepsi LLM'den (eski davranış)
+    QUESTION_POLICY: str = os.getenv("QUESTION_POLICY", "adaptive")
+    # Soru kaynağı: llm | auto (şikayet kartla örtüşüyorsa kart sorusu, değilse LLM) | card
+    # auto/card soruları LLM'siz kart listesinden verir; dağıtım başına bilinçli açılır
+    QUESTION_SOURCE: str = os.getenv("QUESTION_SOURCE", "llm")
+    POLICY_MIN_QA: int = int(os.getenv("POLICY_MIN_QA", "1"))
+    POLICY_MAX_QA: int = int(os.getenv("POLICY_MAX_QA", "3"))
+    # Vitallerden kart red flag'i tespit edildiyse soru tavanı (final gecikmesin)
+    POLICY_MAX_QA_ELEVATED: int = int(os.getenv("POLICY_MAX_QA_ELEVATED", "1"))
+    # >0: kart sorusu için RAG top-1/top-2 göreli skor farkı en az bu kadar olmalı
+    POLICY_CARD_MIN_MARGIN: float = float(os.getenv("POLICY_CARD_MIN_MARGIN", "0"))
+
+    # Tekrar eden soru tespiti (question_dedup): RapidFuzz eşiği (0-100) ve opsiyonel embedding
+    # benzerliği (local RAG'de aynı encoder + sorgu vektör önbelleği, remote'ta EMBED_MODEL yüklenir)
+    DEDUP_FUZZY_THRESHOLD: float = float(os.getenv("DEDUP_FUZZY_THRESHOLD", "85"))
+    DEDUP_EMBEDDINGS: bool = os.getenv("DEDUP_EMBEDDINGS", "false").lower() in ("1", "true", "yes")
+    DEDUP_EMBED_THRESHOLD: float = float(os.getenv("DEDUP_EMBED_THRESHOLD", "0.93"))
+    DEDUP_CACHE_MAX_ITEMS: int = int(os.getenv("DEDUP_CACHE_MAX_ITEMS", "4096"))
+
     # CORS Settings
     ALLOWED_ORIGINS: list = os.getenv(
         "ALLOWED_ORIGINS", 
@@ -31,5 +159,18 @@ class Settings(BaseSettings):
     
     # Environment
     ENV: str = os.getenv("ENV", "development")
+
+    # Açılış: PRELOAD=true iken ağır bileşenler (RAG indeksi, OpenAI SDK; PRELOAD_MODEL ile encoder
+    # modeli de) import sırasında kurulur. gunicorn --preload ile bu master süreçte bir kez olur ve
+    # worker'lar copy-on-write paylaşır. false iken her süreç lifespan'de arka planda ısınır;
+    # /readyz hazır olana kadar 503 döner.
+    PRELOAD: bool = os.getenv("PRELOAD", "false").lower() in ("1", "true", "yes")
+    PRELOAD_MODEL: bool = os.getenv(
+        "PRELOAD_MODEL", os.getenv("RAG_LOCAL_PRELOAD_MODEL", "false")
+    ).lower() in ("1", "true", "yes")
+
+    # Loglama (metrics.configure_logging): seviye ve biçim (text | json)
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text")
     
 settings = Settings()
\ No newline at end of file
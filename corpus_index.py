@@ -0,0 +1,317 @@
+# corpus_index.py
+"""
+Yeniden başlatmadan güncellenebilen kart indeksi.
+
+IndexManager, korpusun değişmez bir anlık görüntüsünü (IndexSnapshot: kartlar +
+RetrievalEngine) tutar. reload() değişen kartları doğrular, EmbeddingCache
+üzerinden yalnızca yeni/değişen içerikleri encode eder ve yeni görüntüyü tek bir
+referans atamasıyla devreye alır. İstekler o anki görüntüyü bir kez okuyup
+onunla çalışır; reload sırasında hiçbir istek beklemez.
+
+Değişiklikler periyodik olarak (dosya yolu, mtime, boyut) imzasıyla tespit edilir;
+inotify gerektirmez ve her platformda çalışır.
+
+Birden çok adlandırılmış korpus ("triage=corpus/triage/*.json,samples=samples/*.json")
+sırayla yüklenir; aynı id birden çok korpusta varsa ilk korpustaki geçerlidir (gölgelenen
+kopyalar hata sayılmaz, stats()'ta raporlanır). chunking açıkken kartlar alan bazlı
+parçalara bölünür (cards.chunk_card); embedding ve BM25 satırları parçalardır.
+
+Vektör sayısı ann_opts["min_cards"]'ı aşınca arama ANN indeksi (ann.py) üzerinden
+yapılır. İndeks ann_opts["dir"]/<version> altına yazılıp mmap ile açılır; yeniden
+başlatmada aynı korpus için yeniden kurulmaz. Yalnızca kart eklenen reload'larda
+mevcut indekse ekleme yapılır (kartların sırası korunur, yeniler sona eklenir).
+"""
+import glob, hashlib, json, logging, os, shutil, threading, time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from ann import build_index, load_index
+from cards import chunk_card, render_card
+from embedding_cache import EmbeddingCache
+from retrieval import RetrievalEngine, normalize_rows, row_texts
+
+logger = logging.getLogger("corpus_index")
+
+EncodeFn = Callable[[List[str]], np.ndarray]
+
+LIST_FIELDS = ("red_flags", "immediate_actions", "questions_to_ask_next")
+
+
+def validate_card(c) -> List[str]:
+    """Kart şemasını kontrol eder; hata mesajları listesi (boşsa geçerli)."""
+    if not isinstance(c, dict):
+        return ["kart bir JSON nesnesi olmalı"]
+    errors = []
+    if not isinstance(c.get("id"), str) or not c["id"].strip():
+        errors.append("id boş olmayan bir string olmalı")
+    if not isinstance(c.get("title"), str) or not c["title"].strip():
+        errors.append("title boş olmayan bir string olmalı")
+    for name in LIST_FIELDS:
+        v = c.get(name, [])
+        if not isinstance(v, list) or not all(isinstance(x, str) for x in v):
+            errors.append(f"{name} string listesi olmalı")
+    filt = c.get("filters", {})
+    if not isinstance(filt, dict):
+        errors.append("filters bir nesne olmalı")
+    return errors
+
+
+Corpora = List[Tuple[str, str]]
+
+
+def parse_corpora(spec: Union[str, Sequence[Tuple[str, str]]]) -> Corpora:
+    """"ad=glob,ad=glob" → [(ad, glob)]; adsız glob'un adı üst dizinidir (corpus/triage/*.json → triage)."""
+    if not isinstance(spec, str):
+        return list(spec)
+    out = []
+    for part in filter(None, (x.strip() for x in spec.split(","))):
+        name, sep, pattern = part.partition("=")
+        if not sep:
+            pattern, name = part, os.path.basename(os.path.dirname(part)) or "default"
+        out.append((name.strip(), pattern.strip()))
+    return out
+
+
+def read_corpora(corpora: Union[str, Corpora], prev_cards: Sequence[Dict] = (), chunking: bool = True
+                 ) -> Tuple[List[Dict], Dict[str, List[str]], Dict[str, str]]:
+    """
+    Korpusları sırayla okur → (kartlar, dosya → doğrulama hataları, gölgelenen dosya → geçerli dosya).
+    Aynı id'de ilk korpustaki kart geçerlidir; bozuk dosyada prev_cards'taki önceki sürüm kalır.
+    RAG indeksi ve triage_api'nin kural/politika kartları aynı kart kümesini buradan alır.
+    """
+    prev_by_path = {c.get("path"): c for c in prev_cards}
+    cards: List[Dict] = []
+    errors: Dict[str, List[str]] = {}
+    seen_ids: Dict[str, Tuple[str, str]] = {}  # id → (korpus, dosya)
+    shadowed: Dict[str, str] = {}
+    for name, pattern in parse_corpora(corpora):
+        for p in sorted(glob.glob(pattern)):
+            try:
+                with open(p, "r", encoding="utf-8") as f:
+                    c = json.load(f)
+                errs = validate_card(c)
+            except (OSError, ValueError) as e:
+                c, errs = None, [f"okunamadı: {e}"]
+            if not errs and c["id"] in seen_ids:
+                first_corpus, first_path = seen_ids[c["id"]]
+                if first_corpus != name:
+                    shadowed[p] = first_path  # önceki korpustaki kart geçerli
+                    continue
+                errs = [f"id tekrarı: {c['id']} ({first_path})"]
+            if errs:
+                errors[p] = errs
+                # Bozuk düzenleme canlı kartı silmez: önceki geçerli sürüm kalır
+                prev = prev_by_path.get(p)
+                if prev is not None and prev["id"] not in seen_ids:
+                    seen_ids[prev["id"]] = (name, p)
+                    cards.append(prev)
+                continue
+            seen_ids[c["id"]] = (name, p)
+            cards.append({
+                "id": c["id"], "meta": c, "content": render_card(c), "path": p, "corpus": name,
+                "chunks": chunk_card(c) if chunking else None,
+            })
+    return cards, errors, shadowed
+
+
+def corpus_signature(patterns: Union[str, Sequence[str]]) -> Tuple:
+    sig = []
+    for p in sorted({p for pat in ([patterns] if isinstance(patterns, str) else patterns)
+                     for p in glob.glob(pat)}):
+        try:
+            st = os.stat(p)
+        except OSError:
+            continue
+        sig.append((p, st.st_mtime_ns, st.st_size))
+    return tuple(sig)
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    version: str                     # içerik parmak izi (model + kart id/içerik)
+    seq: int                         # bu process'teki yükleme sırası
+    cards: List[Dict]
+    engine: RetrievalEngine
+    loaded_at: float
+    errors: Dict[str, List[str]] = field(default_factory=dict)  # dosya → doğrulama hataları
+
+
+def _card_text(c: Dict) -> str:
+    # İndekslenen her şey: parçalar içerikte olmayan alanları (şikayetler) da taşır
+    return c["content"] + "\0" + "\0".join(row_texts(c))
+
+
+def _fingerprint(model_name: str, cards: List[Dict]) -> str:
+    h = hashlib.sha256(model_name.encode("utf-8"))
+    for c in cards:
+        h.update(b"\0" + c["id"].encode("utf-8") + b"\0" + _card_text(c).encode("utf-8"))
+    return h.hexdigest()[:12]
+
+
+class IndexManager:
+    def __init__(self, corpora: Union[str, Corpora], emb_cache: EmbeddingCache, encode: Optional[EncodeFn],
+                 engine_opts: Optional[Dict] = None, ann_opts: Optional[Dict] = None, chunking: bool = True):
+        self.corpora = parse_corpora(corpora)
+        self.emb_cache = emb_cache
+        self.encode = encode  # None → yalnızca BM25 (model yüklenmez)
+        self.chunking = chunking
+        self.shadowed: Dict[str, str] = {}
+        self.engine_opts = engine_opts or {}  # RetrievalEngine(matrix_dtype=..., rescore_factor=...)
+        self.ann_opts = ann_opts or {}        # {"kind", "min_cards", "nprobe", "dir"}
+        self._snapshot: Optional[IndexSnapshot] = None
+        self._signature: Tuple = ()
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self.reloads = 0
+        self.last_reload_ms = 0.0
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def current(self) -> IndexSnapshot:
+        snap = self._snapshot
+        if snap is None:
+            self.reload()
+            snap = self._snapshot
+        return snap
+
+    # ---- Yükleme ----
+    def _read_cards(self) -> Tuple[List[Dict], Dict[str, List[str]]]:
+        prev = self._snapshot.cards if self._snapshot else ()
+        cards, errors, self.shadowed = read_corpora(self.corpora, prev, self.chunking)
+        return cards, errors
+
+    def reload(self, force: bool = False) -> Dict:
+        """Korpusu yeniden okur; değişiklik varsa yeni görüntüyü devreye alır."""
+        with self._reload_lock:
+            t0 = time.perf_counter()
+            signature = corpus_signature([pat for _, pat in self.corpora])
+            old = self._snapshot
+            if old is not None and not force and signature == self._signature:
+                return {"changed": False, "version": old.version}
+
+            cards, errors = self._read_cards()
+            for p, errs in errors.items():
+                logger.warning("Geçersiz kart %s: %s", p, "; ".join(errs))
+            if not cards and old is not None:
+                logger.error("Korpus boş/geçersiz; mevcut indeks korunuyor (%s)", old.version)
+                self._signature = signature
+                return {"changed": False, "version": old.version, "errors": errors}
+
+            version = _fingerprint(self.emb_cache.model_name, cards)
+            old_ids = {c["id"]: _card_text(c) for c in (old.cards if old else [])}
+            new_ids = {c["id"]: _card_text(c) for c in cards}
+            delta = {
+                "added": sorted(set(new_ids) - set(old_ids)),
+                "removed": sorted(set(old_ids) - set(new_ids)),
+                "updated": sorted(i for i in set(new_ids) & set(old_ids) if new_ids[i] != old_ids[i]),
+            }
+            self._signature = signature
+            if old is not None and version == old.version:
+                return {"changed": False, "version": version, "errors": errors}
+
+            # Yalnızca ekleme: eski kartlar aynı konumda kalır, ANN indeksine ekleme yapılır
+            append_only = (old is not None and old.engine.ann is not None and delta["added"]
+                           and not delta["removed"] and not delta["updated"])
+            if append_only:
+                by_id = {c["id"]: c for c in cards}
+                added = set(delta["added"])
+                cards = [by_id[c["id"]] for c in old.cards] + [c for c in cards if c["id"] in added]
+                version = _fingerprint(self.emb_cache.model_name, cards)
+
+            matrix, encoded = None, 0
+            if self.encode is not None:
+                known = set(self.emb_cache.keys)
+                matrix = self.emb_cache.embeddings_for([t for c in cards for t in row_texts(c)], self.encode)
+                encoded = sum(1 for k in self.emb_cache.keys if k not in known)
+            ann = self._ann_for(matrix, version, old if append_only else None)
+            snap = IndexSnapshot(
+                version=version,
+                seq=(old.seq + 1) if old else 1,
+                cards=cards,
+                engine=RetrievalEngine(cards, matrix, ann=ann, **self.engine_opts),
+                loaded_at=time.time(),
+                errors=errors,
+            )
+            self._snapshot = snap  # tek atama: okuyucular ya eskiyi ya yeniyi görür
+            self.reloads += 1
+            self.last_reload_ms = (time.perf_counter() - t0) * 1000
+            if old is not None:
+                logger.info("İndeks güncellendi %s → %s (+%d -%d ~%d, %d encode, %.0f ms)",
+                            old.version, version, len(delta["added"]), len(delta["removed"]),
+                            len(delta["updated"]), encoded, self.last_reload_ms)
+            return {"changed": True, "version": version, "cards": len(cards),
+                    "encoded": encoded, "ms": self.last_reload_ms, "errors": errors, **delta}
+
+    def _ann_for(self, matrix: Optional[np.ndarray], version: str, append_to: Optional[IndexSnapshot]):
+        kind = self.ann_opts.get("kind", "none")
+        if kind == "none" or matrix is None or matrix.shape[0] < self.ann_opts.get("min_cards", 20000):
+            return None
+        if append_to is not None:
+            prev = append_to.engine.ann
+            if prev.kind == kind and not prev.needs_rebuild():
+                return prev.add(normalize_rows(matrix[prev.ntotal:]))
+        root = self.ann_opts.get("dir")
+        path = os.path.join(root, version) if root else None
+        if path:
+            ann = load_index(path)
+            if ann is not None and ann.kind == kind and ann.ntotal == matrix.shape[0]:
+                return ann
+        t0 = time.perf_counter()
+        ann = build_index(kind, normalize_rows(matrix), nprobe=self.ann_opts.get("nprobe", 32))
+        logger.info("ANN indeksi kuruldu (%s, %d vektör, %.1f s)", kind, ann.ntotal, time.perf_counter() - t0)
+        if path:
+            ann.save(path)
+            for name in os.listdir(root):  # eski sürümlerin indeksleri
+                if name != version and not name.startswith("."):
+                    shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+            ann = load_index(path) or ann  # mmap'li kopyaya geç: bellek sayfa önbelleğine kalır
+        return ann
+
+    # ---- İzleyici ----
+    def start_watcher(self, interval_s: float):
+        if self._watcher is not None or interval_s <= 0:
+            return
+        t = threading.Thread(target=self._watch, args=(interval_s,), name="corpus-watcher", daemon=True)
+        t.start()
+        self._watcher = t
+
+    def stop_watcher(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def _watch(self, interval_s: float):
+        while not self._stop.wait(interval_s):
+            try:
+                if corpus_signature([pat for _, pat in self.corpora]) != self._signature:
+                    self.reload()
+            except Exception:
+                logger.exception("Korpus yeniden yüklenemedi; mevcut indeks korunuyor")
+
+    def stats(self) -> Dict:
+        snap = self._snapshot
+        return {
+            "version": snap.version if snap else None,
+            "seq": snap.seq if snap else 0,
+            "cards": len(snap.cards) if snap else 0,
+            "rows": int(snap.engine.row_counts.sum()) if snap else 0,
+            "corpora": {name: sum(1 for c in snap.cards if c.get("corpus") == name)
+                        for name, _ in self.corpora} if snap else {},
+            "shadowed": len(self.shadowed),
+            "mode": snap.engine.mode if snap else None,
+            "matrix_dtype": snap.engine.matrix_dtype if snap else None,
+            "ann": snap.engine.ann.kind if snap and snap.engine.ann is not None else None,
+            "matrix_bytes": snap.engine.nbytes if snap else 0,
+            "loaded_at": snap.loaded_at if snap else None,
+            "invalid_files": snap.errors if snap else {},
+            "reloads": self.reloads,
+            "last_reload_ms": self.last_reload_ms,
+            "watching": self._watcher is not None,
+        }
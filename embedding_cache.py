@@ -0,0 +1,152 @@
+# embedding_cache.py
+"""
+Kart embedding'leri için içerik adresli disk önbelleği.
+
+Her satırın anahtarı sha256(model adı + kart içeriği)'dir; matris .npy olarak
+yazılır ve mmap ile açılır. Sadece yeni/değişen kartlar tek batch'te encode edilir.
+
+Deploy sırasında önceden doldurmak için:
+    python embedding_cache.py --corpus "corpus/triage/*.json"
+"""
+import argparse, hashlib, json, os, tempfile, time
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+MANIFEST_NAME = "manifest.json"
+
+EncodeFn = Callable[[List[str]], np.ndarray]
+
+
+def content_key(model_name: str, content: str) -> str:
+    h = hashlib.sha256()
+    h.update(model_name.encode("utf-8"))
+    h.update(b"\0")
+    h.update(content.encode("utf-8"))
+    return h.hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, cache_dir: str, model_name: str):
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.manifest_path = os.path.join(cache_dir, MANIFEST_NAME)
+        self.keys: List[str] = []
+        self.matrix: Optional[np.ndarray] = None
+        self._load()
+
+    # ---- Okuma ----
+    def _load(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("model") != self.model_name:
+                return
+            matrix = np.load(os.path.join(self.cache_dir, manifest["matrix"]), mmap_mode="r")
+            if matrix.shape[0] != len(manifest["keys"]):
+                return
+        except (OSError, ValueError, KeyError):
+            # Bozuk/eksik önbellek → sıfırdan oluşturulur
+            return
+        self.keys = manifest["keys"]
+        self.matrix = matrix
+
+    # ---- Yazma ----
+    def _save(self, keys: List[str], matrix: np.ndarray):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        digest = hashlib.sha256("".join(keys).encode("utf-8")).hexdigest()[:16]
+        matrix_name = f"embeddings-{digest}.npy"
+        matrix_path = os.path.join(self.cache_dir, matrix_name)
+
+        # Önce matris, sonra manifest: okuyucu hiçbir zaman yarım dosya görmez
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp_", suffix=".npy")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+            os.replace(tmp, matrix_path)
+        finally:
+            try: os.remove(tmp)
+            except OSError: pass
+
+        manifest = {
+            "model": self.model_name,
+            "dim": int(matrix.shape[1]),
+            "matrix": matrix_name,
+            "keys": keys,
+            "updated_at": int(time.time()),
+        }
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp_", suffix=".json")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            os.replace(tmp, self.manifest_path)
+        finally:
+            try: os.remove(tmp)
+            except OSError: pass
+
+        # Artık referans verilmeyen eski matrisleri temizle
+        for name in os.listdir(self.cache_dir):
+            if name.startswith("embeddings-") and name.endswith(".npy") and name != matrix_name:
+                try: os.remove(os.path.join(self.cache_dir, name))
+                except OSError: pass
+
+        self.keys = keys
+        self.matrix = np.load(matrix_path, mmap_mode="r")
+
+    # ---- Ana API ----
+    def embeddings_for(self, contents: Sequence[str], encode: EncodeFn) -> np.ndarray:
+        """
+        contents sırasıyla hizalı embedding matrisini döndürür.
+        Önbellekte olmayan içerikler tek bir encode çağrısında hesaplanır.
+        """
+        keys = [content_key(self.model_name, c) for c in contents]
+        if self.matrix is not None and keys == self.keys:
+            return self.matrix  # değişiklik yok → doğrudan mmap
+
+        index: Dict[str, int] = {k: i for i, k in enumerate(self.keys)}
+        missing = [i for i, k in enumerate(keys) if k not in index]
+        new_vecs = None
+        if missing:
+            new_vecs = np.asarray(encode([contents[i] for i in missing]), dtype=np.float32)
+
+        if self.matrix is not None:
+            dim = self.matrix.shape[1]
+        elif new_vecs is not None:
+            dim = new_vecs.shape[1]
+        else:
+            dim = 0
+        out = np.empty((len(keys), dim), dtype=np.float32)
+        pos = {i: j for j, i in enumerate(missing)}
+        for i, k in enumerate(keys):
+            out[i] = new_vecs[pos[i]] if i in pos else self.matrix[index[k]]
+
+        self._save(keys, out)
+        return self.matrix
+
+    def stats(self) -> Dict:
+        return {"model": self.model_name, "rows": len(self.keys), "cache_dir": self.cache_dir}
+
+
+def main():
+    from config import settings
+    from corpus_index import IndexManager
+    from encoders import make_encoder
+
+    ap = argparse.ArgumentParser(description="Kart embedding önbelleğini önceden oluşturur.")
+    ap.add_argument("--corpus", default=settings.RAG_CORPORA, help='"ad=glob,ad=glob" veya tek glob')
+    ap.add_argument("--cache-dir", default=settings.EMBED_CACHE_DIR)
+    ap.add_argument("--backend", default=settings.EMBED_BACKEND, choices=["st", "onnx"])
+    ap.add_argument("--model", default=None, help="st: model adı, onnx: model dizini")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    encoder = make_encoder(args.backend, args.model)  # model yalnızca encode gerekirse yüklenir
+    cache = EmbeddingCache(args.cache_dir, encoder.name)
+    # Servisle aynı satırlar (parçalar) üretilsin diye indeks yöneticisi üzerinden
+    result = IndexManager(args.corpus, cache, encoder.encode_passages, chunking=settings.RAG_CHUNKING).reload()
+    print(f"{result.get('cards', 0)} kart, {len(cache.keys)} satır, {result.get('encoded', 0)} yeniden encode edildi, "
+          f"{time.perf_counter() - t0:.1f}s → {args.cache_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# encoders.py
+"""
+Takılabilir metin encoder'ları.
+
+    st    SentenceTransformer (varsayılan; fp32, PyTorch)
+    onnx  ONNX Runtime; dinamik int8 quantize edilmiş model, ayarlanabilir thread sayısı
+
+Daha küçük/distile bir model için EMBED_MODEL değiştirilir (örn.
+intfloat/multilingual-e5-small veya e5-base); her iki backend ile çalışır.
+
+Encoder.name, embedding önbelleğinin anahtarına girer: backend veya model
+değişince kart embedding'leri otomatik olarak yeniden hesaplanır.
+
+ONNX modeli bir kez dışa aktarılır:
+    python encoders.py export --model intfloat/multilingual-e5-large --out models/e5-large-onnx --int8
+"""
+import argparse, os
+from functools import lru_cache
+from typing import List, Optional
+
+import numpy as np
+
+
+class Encoder:
+    name: str = ""
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    # Sorgu ve kartlar aynı uzayda; ayrım ileride prefix'li modeller için korunur
+    def encode_queries(self, texts: List[str]) -> np.ndarray:
+        return self.encode(texts)
+
+    def encode_passages(self, texts: List[str]) -> np.ndarray:
+        return self.encode(texts)
+
+
+class SentenceTransformerEncoder(Encoder):
+    def __init__(self, model_name: str, batch_size: int = 32):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.name = model_name  # mevcut önbellek anahtarlarıyla uyumlu
+
+    @property
+    def model(self):
+        return _load_sentence_transformer(self.model_name)
+
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self._encode(texts, self.batch_size)
+
+    def encode_queries(self, texts: List[str]) -> np.ndarray:
+        # Sorgular (micro-batch dahil) tek forward pass'te
+        return self._encode(texts, max(1, len(texts)))
+
+
+@lru_cache(maxsize=4)
+def _load_sentence_transformer(model_name: str):
+    # Model ilk ihtiyaçta yüklenir; önbellek sıcaksa açılışta hiç yüklenmez
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+class OnnxEncoder(Encoder):
+    """
+    export_onnx ile üretilmiş dizinden (model.onnx / model.int8.onnx + tokenizer) çalışır.
+    Çıkış: attention mask'e göre mean pooling (e5 ve sentence-transformers ile aynı).
+    """
+
+    def __init__(self, model_dir: str, int8: bool = True, threads: int = 0, max_length: int = 512):
+        # threads=0 → ONNX Runtime varsayılanı (fiziksel çekirdek sayısı)
+        self.model_dir = model_dir
+        self.int8 = int8
+        self.threads = threads
+        self.max_length = max_length
+        self.name = f"{os.path.basename(os.path.normpath(model_dir))}@onnx{'-int8' if int8 else ''}"
+        self._session = None
+        self._tokenizer = None
+
+    def _load(self):
+        if self._session is not None:
+            return
+        import onnxruntime as ort  # opsiyonel bağımlılık
+        from transformers import AutoTokenizer
+
+        opts = ort.SessionOptions()
+        if self.threads:
+            opts.intra_op_num_threads = self.threads
+            opts.inter_op_num_threads = 1
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        fname = "model.int8.onnx" if self.int8 else "model.onnx"
+        self._session = ort.InferenceSession(os.path.join(self.model_dir, fname), opts,
+                                             providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self._session.get_inputs()}
+        self._tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        self._load()
+        if len(texts) > batch_size:
+            return np.concatenate([self._run(texts[i:i + batch_size])
+                                   for i in range(0, len(texts), batch_size)])
+        return self._run(texts)
+
+    def encode_queries(self, texts: List[str]) -> np.ndarray:
+        return self.encode(texts, batch_size=max(1, len(texts)))
+
+    def _run(self, texts: List[str]) -> np.ndarray:
+        enc = self._tokenizer(texts, padding=True, truncation=True, max_length=self.max_length,
+                              return_tensors="np")
+        feeds = {k: v.astype(np.int64) for k, v in enc.items() if k in self._inputs}
+        hidden = self._session.run(None, feeds)[0]                      # (B, T, D)
+        mask = enc["attention_mask"][..., None].astype(np.float32)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+
+def export_onnx(model_name: str, out_dir: str, int8: bool = True, opset: int = 17) -> str:
+    """HF modelini ONNX'e aktarır; int8 ise dinamik quantize edilmiş kopyayı da yazar."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(out_dir, exist_ok=True)
+    tok = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    sample = tok(["query: örnek"], return_tensors="pt")
+    names = ["input_ids", "attention_mask"]
+    dyn = {n: {0: "batch", 1: "seq"} for n in names}
+    dyn["last_hidden_state"] = {0: "batch", 1: "seq"}
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model, (sample["input_ids"], sample["attention_mask"]), fp32_path,
+            input_names=names, output_names=["last_hidden_state"],
+            dynamic_axes=dyn, opset_version=opset,
+        )
+    tok.save_pretrained(out_dir)
+    if int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic  # opsiyonel bağımlılık
+        quantize_dynamic(fp32_path, os.path.join(out_dir, "model.int8.onnx"), weight_type=QuantType.QInt8)
+    return out_dir
+
+
+def make_encoder(backend: Optional[str] = None, model: Optional[str] = None) -> Encoder:
+    """backend/model verilmezse EMBED_BACKEND / EMBED_MODEL (onnx için EMBED_ONNX_DIR)."""
+    from config import settings
+
+    backend = (backend or settings.EMBED_BACKEND).lower()
+    if backend == "st":
+        return SentenceTransformerEncoder(model or settings.EMBED_MODEL)
+    if backend == "onnx":
+        return OnnxEncoder(model or settings.EMBED_ONNX_DIR, int8=settings.EMBED_ONNX_INT8,
+                           threads=settings.EMBED_THREADS)
+    raise ValueError(f"Bilinmeyen EMBED_BACKEND: {backend}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Encoder araçları")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export", help="HF modelini ONNX'e aktar (opsiyonel int8)")
+    ex.add_argument("--model", required=True)
+    ex.add_argument("--out", required=True)
+    ex.add_argument("--int8", action="store_true")
+    args = ap.parse_args()
+    print(export_onnx(args.model, args.out, int8=args.int8))
+
+
+if __name__ == "__main__":
+    main()
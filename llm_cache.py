@@ -0,0 +1,78 @@
+# llm_cache.py
+"""
+call_llm_step için yerel, birebir eşleşmeli yanıt önbelleği.
+
+Anahtar; normalize edilmiş yaş, cinsiyet, şikâyet, vitaller, kart id/içerik özeti,
+Q&A geçmişi, vital red flag'leri, DONE bayrağı, model ve prompt sürümünün sha256 özetidir. Aynı girdilerle
+tekrar edilen (veya yeniden oynatılan) bir adım LLM'e hiç gitmez.
+"""
+import copy, hashlib, json
+from typing import Dict, List, Optional
+
+from config import settings
+from ttl_cache import TTLCache
+
+
+def _norm(text) -> str:
+    return " ".join(str(text or "").split()).lower()
+
+
+def step_cache_key(
+    *,
+    model: str,
+    prompt_version: str,
+    age: int,
+    sex: str,
+    complaint_text: str,
+    vitals: Optional[Dict],
+    cards: List[Dict],
+    qa_list: Optional[List[Dict[str, str]]],
+    done: bool,
+    detected_flags: Optional[List[str]] = None,
+) -> str:
+    payload = {
+        "m": model,
+        "p": prompt_version,
+        "age": int(age),
+        "sex": _norm(sex),
+        "c": _norm(complaint_text),
+        "v": {str(k).lower(): _norm(v) for k, v in (vitals or {}).items()},
+        # Kart içeriği değişirse (corpus güncellemesi) aynı id farklı anahtar üretir
+        "cards": [[c.get("id"), hashlib.sha1(str(c.get("content", "")).encode("utf-8")).hexdigest()[:12]]
+                  for c in cards],
+        "qa": [[_norm(x.get("q")), _norm(x.get("a"))] for x in (qa_list or [])],
+        "done": bool(done),
+        "flags": list(detected_flags or []),
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, maxsize: int, ttl: float, enabled: bool = True):
+        self.enabled = enabled
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, key: str) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        hit = self._cache.get(key)
+        # Çağıranlar sonucu değiştirebilir; önbellekteki kopya korunur
+        return copy.deepcopy(hit) if hit is not None else None
+
+    def set(self, key: str, value: Dict):
+        if self.enabled:
+            self._cache.set(key, copy.deepcopy(value))
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> Dict:
+        return {"enabled": self.enabled, **self._cache.stats()}
+
+
+response_cache = ResponseCache(
+    maxsize=settings.LLM_CACHE_MAX_ITEMS,
+    ttl=settings.LLM_CACHE_TTL_S,
+    enabled=settings.LLM_CACHE_ENABLED,
+)
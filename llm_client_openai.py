@@ -1,15 +1,57 @@
 # llm_client_openai.py
-import os, json, time
-from typing import List, Dict, Optional, Union
-from dotenv import load_dotenv
-from openai import OpenAI, RateLimitError
+import os, json, time, random, asyncio, hashlib
+from typing import TYPE_CHECKING, AsyncIterator, List, Dict, Optional, Tuple, Union
 from schemas import TriageOutput
+from partial_json import StringFieldWatcher
+from llm_cache import response_cache, step_cache_key
+from metrics import LLM_CALLS, LLM_RETRIES, STARTUP_SECONDS, observe_stage, record_usage, timed
 
-# .env dosyasını yükle
-load_dotenv()
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
 
 GPT_MODEL = os.getenv("GPT_MODEL", "gpt-4.1-mini")
-client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+
+# İstemciler (ve ~0.7 s süren SDK importu) ilk çağrıda veya warmup()'ta kurulur: modül anahtar
+# olmadan da import edilebilir (bench, önbellek/şema araçları). OPENAI_BASE_URL ile sahte sunucuya
+# yönlendirilebilir. SDK'nın kendi tekrar denemesi kapalı: tek politika aşağıdaki döngülerdir.
+_client: Optional["OpenAI"] = None
+_async_client: Optional["AsyncOpenAI"] = None
+
+
+def _api_key() -> str:
+    key = os.getenv("OPENAI_API_KEY")
+    if not key:
+        raise RuntimeError("OPENAI_API_KEY tanımlı değil")
+    return key
+
+
+def get_client() -> "OpenAI":
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(api_key=_api_key(), max_retries=0)
+    return _client
+
+
+def get_async_client() -> "AsyncOpenAI":
+    """Async istemci: tek httpx havuzu üzerinden keep-alive bağlantılar."""
+    global _async_client
+    if _async_client is None:
+        from openai import AsyncOpenAI
+        _async_client = AsyncOpenAI(api_key=_api_key(), max_retries=0)
+    return _async_client
+
+
+def warmup(create_client: bool = True):
+    """
+    SDK'yı import eder; create_client ile async istemciyi de kurar.
+    gunicorn --preload master'ında yalnızca import (bağlantı havuzu fork'tan önce açılmaz).
+    """
+    t0 = time.perf_counter()
+    import openai  # noqa: F401
+    if create_client and os.getenv("OPENAI_API_KEY"):
+        get_async_client()
+    STARTUP_SECONDS.set(time.perf_counter() - t0, phase="llm_client")
 
 SYSTEM_PROMPT = """Sen bir acil servis e-triyaj asistanısın.
 - Tanı koymazsın, tedavi önermezsin.
@@ -66,16 +108,10 @@ KURALLAR:
 
 
 
-USER_TEMPLATE = """HASTA BİLGİSİ:
-- Yaş: {age}
-- Cinsiyet: {sex}
-- Şikâyet metni: {complaint}
-- Vitaller: {vitals}
-
-ÖNCEKİ TAKİP SORULARI VE CEVAPLAR:
-{followups}
-
-GÖREV:
+# Mesaj düzeni sağlayıcı tarafı prefix cache için sabit → değişken sıralanır:
+#   system (tüm vakalarda aynı) → CASE_TEMPLATE (vaka boyunca aynı) → STEP_TEMPLATE (yalnızca sona eklenir)
+# Böylece aynı vakanın sonraki adımlarında prompt'un neredeyse tamamı önbellekten okunur.
+CASE_TEMPLATE = """GÖREV:
 - DONE=false ise: SADECE şu JSON'ı döndür: {{"next_question": "yeni benzersiz soru", "finished": false}}
 - DONE=true ise: SADECE şu JSON'ı döndür: {{"triage": {{...}}, "finished": true}}
 - next_question daha önce sorulmuş sorularla aynı olmamalı.
@@ -84,107 +120,328 @@ GÖREV:
 
 CONTEXT_SNIPPETS:
 {snippets}
+
+HASTA BİLGİSİ:
+- Yaş: {age}
+- Cinsiyet: {sex}
+- Şikâyet metni: {complaint}
+- Vitaller: {vitals}
+- Vitallerden tespit edilen red flag'ler: {detected_flags}
 """
 
+STEP_TEMPLATE = """ÖNCEKİ TAKİP SORULARI VE CEVAPLAR:
+{followups}
+
+DONE={done}"""
 
 
+
+# Prompt metinleri değişince eski önbellek kayıtları kendiliğinden geçersizleşir
+PROMPT_VERSION = hashlib.sha256(
+    (SYSTEM_PROMPT + CASE_TEMPLATE + STEP_TEMPLATE).encode("utf-8")
+).hexdigest()[:12]
+
 def render_followups(qa_list: Optional[List[Dict[str, str]]]) -> str:
     if not qa_list:
         return "YOK"
     return "\n".join([f"- Soru: {x['q']}\n  Cevap: {x['a']}" for x in qa_list])
 
-def call_llm_step(
+def backoff_delay(attempt: int, base: float, cap: float = 8.0) -> float:
+    """Üstel geri çekilme + full jitter (aynı anda düşen istekler senkron tekrar denemesin)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+def build_messages(
     age: int,
     sex: str,
     complaint_text: str,
     vitals: Optional[Dict],
     cards: List[Dict],
-    qa_list: Optional[List[Dict[str, str]]] = None,
-    done: bool = False,
-    max_retries: int = 2
-) -> Dict:
+    qa_list: Optional[List[Dict[str, str]]],
+    done: bool,
+    detected_flags: Optional[List[str]] = None,
+) -> List[Dict[str, str]]:
     snippets = "\n\n---\n\n".join(
         f"[id: {c['id']}]\n{c['content']}" for c in cards
     )
 
-    followup_text = render_followups(qa_list or [])
-    user_prompt = USER_TEMPLATE.format(
+    case_prompt = CASE_TEMPLATE.format(
         age=age,
         sex=sex,
         complaint=complaint_text,
         vitals=vitals or {},
         snippets=snippets,
-        followups=followup_text,
+        detected_flags="; ".join(detected_flags) if detected_flags else "YOK",
+    )
+    step_prompt = STEP_TEMPLATE.format(
+        followups=render_followups(qa_list or []),
+        done=done,
+    )
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": case_prompt},
+        {"role": "user", "content": step_prompt},
+    ]
+
+def _cache_key(age, sex, complaint_text, vitals, cards, qa_list, done, detected_flags=None) -> str:
+    return step_cache_key(
+        model=GPT_MODEL, prompt_version=PROMPT_VERSION,
+        age=age, sex=sex, complaint_text=complaint_text, vitals=vitals,
+        cards=cards, qa_list=qa_list, done=done, detected_flags=detected_flags,
     )
 
+def _usage_dict(resp) -> Dict[str, int]:
+    u = getattr(resp, "usage", None)
+    if u is None:
+        return {}
+    return {
+        "prompt_tokens": getattr(u, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(u, "completion_tokens", 0) or 0,
+        "total_tokens": getattr(u, "total_tokens", 0) or 0,
+    }
+
+def parse_step_output(raw: Optional[str], done: bool) -> Dict:
+    """LLM ham çıktısını sıkı şemaya göre doğrular/normalize eder."""
+    data = json.loads(raw or "{}")
+
+    # ---- Sıkı Şema Uygulaması ----
+    out: Dict = {"next_question": None, "finished": False, "triage": None}
+    if not done:
+        # DONE=false iken yalnızca next_question ve finished beklenir
+        out["next_question"] = (data.get("next_question") or "").strip() or None
+        out["finished"] = bool(data.get("finished", False))
+        out["triage"] = None
+        if out["next_question"] is None:
+            # Geçersiz çıktı → güvenli varsayılan soru
+            out["next_question"] = "Şikâyetinizle ilgili ek bir ayrıntı paylaşır mısınız?"
+            out["finished"] = False
+    else:
+        # DONE=true iken triage zorunlu
+        triage_obj = data.get("triage") or {}
+        if not isinstance(triage_obj, dict) or not triage_obj.get("triage_level"):
+            raise ValueError("Final triage eksik veya hatalı")
+
+        # Normalize triage_level
+        valid_levels = {"1": "ESI-1", "2": "ESI-2", "3": "ESI-3", "4": "ESI-4", "5": "ESI-5"}
+        priority_mapping = {
+            "critical": "ESI-1", "high": "ESI-2", "urgent": "ESI-2",
+            "medium": "ESI-3", "moderate": "ESI-3", "standard": "ESI-3",
+            "low": "ESI-4", "routine": "ESI-4", "non-urgent": "ESI-5",
+        }
+        if "triage_level" in triage_obj:
+            lvl_raw = str(triage_obj["triage_level"]).lower().strip()
+            lvl_num = lvl_raw.upper().replace("LEVEL_", "").replace("ESI-", "").replace("ESI", "").strip()
+            if lvl_num in valid_levels:
+                triage_obj["triage_level"] = valid_levels[lvl_num]
+            elif lvl_raw in priority_mapping:
+                triage_obj["triage_level"] = priority_mapping[lvl_raw]
+            else:
+                triage_obj["triage_level"] = "ESI-3"  # default
+
+        # questions_to_ask_next boş listeye zorla
+        triage_obj.setdefault("questions_to_ask_next", [])
+        # evidence_ids string listeye zorla
+        if "evidence_ids" in triage_obj:
+            triage_obj["evidence_ids"] = [str(x) for x in triage_obj["evidence_ids"]]
+        else:
+            triage_obj["evidence_ids"] = []
+        out["triage"] = triage_obj
+        out["finished"] = True
+        out["next_question"] = None
+
+    return out
+
+def call_llm_step(
+    age: int,
+    sex: str,
+    complaint_text: str,
+    vitals: Optional[Dict],
+    cards: List[Dict],
+    qa_list: Optional[List[Dict[str, str]]] = None,
+    done: bool = False,
+    max_retries: int = 2,
+    detected_flags: Optional[List[str]] = None,
+) -> Dict:
+    key = _cache_key(age, sex, complaint_text, vitals, cards, qa_list, done, detected_flags)
+    cached = response_cache.get(key)
+    if cached is not None:
+        LLM_CALLS.inc(outcome="cache_hit")
+        return cached
+    messages = build_messages(age, sex, complaint_text, vitals, cards, qa_list, done, detected_flags)
+    client = get_client()
+    from openai import RateLimitError
+
     last_err = None
-    for _ in range(max_retries + 1):
+    for attempt in range(max_retries + 1):
+        if attempt:
+            LLM_RETRIES.inc()
         try:
-            resp = client.chat.completions.create(
+            with timed("llm_call"):
+                resp = client.chat.completions.create(
+                    model=GPT_MODEL,
+                    messages=messages,
+                    response_format={"type": "json_object"},
+                    max_tokens=700,
+                    temperature=0.2,
+                )
+            record_usage(_usage_dict(resp))
+            with timed("llm_parse"):
+                out = parse_step_output(resp.choices[0].message.content, done)
+            LLM_CALLS.inc(outcome="ok")
+            response_cache.set(key, out)
+            return out
+
+        except RateLimitError as e:
+            LLM_CALLS.inc(outcome="rate_limited")
+            last_err = e
+            time.sleep(backoff_delay(attempt, 0.8))
+        except Exception as e:
+            LLM_CALLS.inc(outcome="error")
+            last_err = e
+            time.sleep(backoff_delay(attempt, 0.3))
+
+    raise last_err
+
+async def acall_llm_step(
+    age: int,
+    sex: str,
+    complaint_text: str,
+    vitals: Optional[Dict],
+    cards: List[Dict],
+    qa_list: Optional[List[Dict[str, str]]] = None,
+    done: bool = False,
+    max_retries: int = 2,
+    detected_flags: Optional[List[str]] = None,
+) -> Dict:
+    """call_llm_step'in async karşılığı; beklerken event loop'u bloklamaz."""
+    key = _cache_key(age, sex, complaint_text, vitals, cards, qa_list, done, detected_flags)
+    cached = response_cache.get(key)
+    if cached is not None:
+        LLM_CALLS.inc(outcome="cache_hit")
+        return cached
+    messages = build_messages(age, sex, complaint_text, vitals, cards, qa_list, done, detected_flags)
+    async_client = get_async_client()
+    from openai import RateLimitError
+
+    last_err = None
+    for attempt in range(max_retries + 1):
+        if attempt:
+            LLM_RETRIES.inc()
+        try:
+            with timed("llm_call"):
+                resp = await async_client.chat.completions.create(
+                    model=GPT_MODEL,
+                    messages=messages,
+                    response_format={"type": "json_object"},
+                    max_tokens=700,
+                    temperature=0.2,
+                )
+            usage = _usage_dict(resp)
+            record_usage(usage)
+            with timed("llm_parse"):
+                out = parse_step_output(resp.choices[0].message.content, done)
+            LLM_CALLS.inc(outcome="ok")
+            response_cache.set(key, out)
+            # Token kullanımı önbelleğe yazılmaz: önbellekten dönen adım 0 token harcar
+            out["usage"] = usage
+            return out
+
+        except RateLimitError as e:
+            LLM_CALLS.inc(outcome="rate_limited")
+            last_err = e
+            await asyncio.sleep(backoff_delay(attempt, 0.8))
+        except Exception as e:
+            LLM_CALLS.inc(outcome="error")
+            last_err = e
+            await asyncio.sleep(backoff_delay(attempt, 0.3))
+
+    raise last_err
+
+async def astream_llm_step(
+    age: int,
+    sex: str,
+    complaint_text: str,
+    vitals: Optional[Dict],
+    cards: List[Dict],
+    qa_list: Optional[List[Dict[str, str]]] = None,
+    done: bool = False,
+    max_retries: int = 2,
+    detected_flags: Optional[List[str]] = None,
+) -> AsyncIterator[Tuple[str, Union[str, Dict]]]:
+    """
+    LLM çıktısını akış halinde okur.
+    - ("next_question", str): DONE=false iken alan tamamlanır tamamlanmaz (bir kez)
+    - ("step", dict): akış bitince, call_llm_step ile aynı sıkı şemadan geçmiş sonuç
+    Henüz hiçbir olay gönderilmeden oluşan hatalar tekrar denenir.
+    """
+    key = _cache_key(age, sex, complaint_text, vitals, cards, qa_list, done, detected_flags)
+    cached = response_cache.get(key)
+    if cached is not None:
+        LLM_CALLS.inc(outcome="cache_hit")
+        if cached.get("next_question"):
+            yield "next_question", cached["next_question"]
+        yield "step", cached
+        return
+    messages = build_messages(age, sex, complaint_text, vitals, cards, qa_list, done, detected_flags)
+    async_client = get_async_client()
+    from openai import RateLimitError
+
+    last_err = None
+    for attempt in range(max_retries + 1):
+        if attempt:
+            LLM_RETRIES.inc()
+        watcher = StringFieldWatcher("next_question")
+        parts: List[str] = []
+        # Akışta yield'ler arasında tüketici bekleyebilir; süre context manager ile değil elle ölçülür
+        t0 = time.perf_counter()
+        try:
+            stream = await async_client.chat.completions.create(
                 model=GPT_MODEL,
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": user_prompt + f"\nDONE={done}"},
-                ],
+                messages=messages,
                 response_format={"type": "json_object"},
                 max_tokens=700,
                 temperature=0.2,
+                stream=True,
             )
-            raw = resp.choices[0].message.content or "{}"
-            data = json.loads(raw)
-
-            # ---- Sıkı Şema Uygulaması ----
-            out: Dict = {"next_question": None, "finished": False, "triage": None}
-            if not done:
-                # DONE=false iken yalnızca next_question ve finished beklenir
-                out["next_question"] = (data.get("next_question") or "").strip() or None
-                out["finished"] = bool(data.get("finished", False))
-                out["triage"] = None
-                if out["next_question"] is None:
-                    # Geçersiz çıktı → güvenli varsayılan soru
-                    out["next_question"] = "Şikâyetinizle ilgili ek bir ayrıntı paylaşır mısınız?"
-                    out["finished"] = False
-            else:
-                # DONE=true iken triage zorunlu
-                triage_obj = data.get("triage") or {}
-                if not isinstance(triage_obj, dict) or not triage_obj.get("triage_level"):
-                    raise ValueError("Final triage eksik veya hatalı")
-                
-                # Normalize triage_level
-                valid_levels = {"1": "ESI-1", "2": "ESI-2", "3": "ESI-3", "4": "ESI-4", "5": "ESI-5"}
-                priority_mapping = {
-                    "critical": "ESI-1", "high": "ESI-2", "urgent": "ESI-2",
-                    "medium": "ESI-3", "moderate": "ESI-3", "standard": "ESI-3",
-                    "low": "ESI-4", "routine": "ESI-4", "non-urgent": "ESI-5",
-                }
-                if "triage_level" in triage_obj:
-                    lvl_raw = str(triage_obj["triage_level"]).lower().strip()
-                    lvl_num = lvl_raw.upper().replace("LEVEL_", "").replace("ESI-", "").replace("ESI", "").strip()
-                    if lvl_num in valid_levels:
-                        triage_obj["triage_level"] = valid_levels[lvl_num]
-                    elif lvl_raw in priority_mapping:
-                        triage_obj["triage_level"] = priority_mapping[lvl_raw]
-                    else:
-                        triage_obj["triage_level"] = "ESI-3"  # default
-                
-                # questions_to_ask_next boş listeye zorla
-                triage_obj.setdefault("questions_to_ask_next", [])
-                # evidence_ids string listeye zorla
-                if "evidence_ids" in triage_obj:
-                    triage_obj["evidence_ids"] = [str(x) for x in triage_obj["evidence_ids"]]
-                else:
-                    triage_obj["evidence_ids"] = []
-                out["triage"] = triage_obj
-                out["finished"] = True
-                out["next_question"] = None
+            async for chunk in stream:
+                # Sağlayıcı akışın sonunda usage gönderirse (choices boş chunk) sayılır
+                record_usage(_usage_dict(chunk))
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content or ""
+                if not delta:
+                    continue
+                parts.append(delta)
+                if not done and not watcher.done:
+                    q = watcher.feed(delta)
+                    if q is not None and q.strip():
+                        observe_stage("llm_first_question", time.perf_counter() - t0)
+                        yield "next_question", q.strip()
+            observe_stage("llm_call", time.perf_counter() - t0)
 
-            return out
+            try:
+                with timed("llm_parse"):
+                    out = parse_step_output("".join(parts), done)
+                response_cache.set(key, out)
+            except ValueError:
+                if watcher.value is None or not watcher.value.strip():
+                    raise
+                # Soru zaten gönderildi; gövdenin geri kalanı bozuk olsa da ona sadık kal
+                out = {"next_question": watcher.value.strip(), "finished": False, "triage": None}
+            LLM_CALLS.inc(outcome="ok")
+            yield "step", out
+            return
 
         except RateLimitError as e:
+            LLM_CALLS.inc(outcome="rate_limited")
+            if watcher.done:
+                raise
             last_err = e
-            time.sleep(0.8)
+            await asyncio.sleep(backoff_delay(attempt, 0.8))
         except Exception as e:
+            LLM_CALLS.inc(outcome="error")
+            if watcher.done:
+                raise
             last_err = e
-            time.sleep(0.3)
+            await asyncio.sleep(backoff_delay(attempt, 0.3))
 
     raise last_err
@@ -0,0 +1,216 @@
+# metrics.py
+"""
+Aşama süreleri, sayaçlar ve Prometheus metin çıktısı (ek bağımlılık yok).
+
+    with timed("rag_http"):                  # triage_stage_seconds{stage="rag_http"}
+        ...
+    LLM_TOKENS.inc(812, kind="prompt")
+
+Metrikler süreç (worker) başınadır; /metrics her worker'ın kendi sayaçlarını
+döndürür. Histogramlar sabit kovalıdır: gözlem bir ikili arama + sayaç artışıdır.
+
+log_event() seviye kapalıyken alanları hiç biçimlendirmez; LOG_FORMAT=json ile
+satırlar tek satır JSON olarak yazılır (configure_logging).
+"""
+import bisect, json, logging, threading, time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+# Saniye: mikro saniyelik önbellek isabetinden çok saniyelik LLM çağrısına kadar
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry: List["_Metric"] = []
+_registry_lock = threading.Lock()
+
+
+def _fmt_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_value(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        super().__init__(name, doc, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labels, k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], list] = {}  # key → [kova sayaçları..., toplam, adet]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            v = self._values.get(key)
+            if v is None:
+                v = self._values[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                v[i] += 1
+            v[-2] += value
+            v[-1] += 1
+
+    def count(self, **labels) -> int:
+        v = self._values.get(self._key(labels))
+        return v[-1] if v else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        out = []
+        for key, v in items:
+            cum = 0
+            for b, c in zip(self.buckets, v):
+                cum += c
+                le = 'le="%s"' % b
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {cum}")
+            inf = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, inf)} {v[-1]}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {_fmt_value(v[-2])}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {v[-1]}")
+        return out
+
+
+def render() -> str:
+    """Kayıtlı tüm metrikler, Prometheus metin biçiminde (0.0.4)."""
+    with _registry_lock:
+        metrics = list(_registry)
+    return "\n".join(line for m in metrics for line in m.render()) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ---- Triage hattı metrikleri ----
+STAGE_SECONDS = Histogram(
+    "triage_stage_seconds",
+    "Aşama süresi (rag_http, rag_local, encode, filter, score, llm_call, llm_first_question, llm_parse, db_commit)",
+    ["stage"],
+)
+STAGE_ERRORS = Counter("triage_stage_errors_total", "Hata ile biten aşamalar", ["stage"])
+LLM_CALLS = Counter("llm_calls_total", "LLM çağrı denemeleri (ok, rate_limited, error, cache_hit)", ["outcome"])
+LLM_RETRIES = Counter("llm_retries_total", "Tekrar denenen LLM çağrıları")
+LLM_TOKENS = Counter("llm_tokens_total", "OpenAI usage alanından token sayıları", ["kind"])
+POLICY_DECISIONS = Counter("triage_policy_decisions_total", "Soru politikası kararları (final, card, llm)",
+                           ["action", "reason"])
+QUESTION_REPEATS = Counter("triage_question_repeats_total", "Tekrar eden LLM soruları (exact, fuzzy, embedding) ve "
+                           "yerine verilen (card: kart sorusu, final)", ["method", "resolution"])
+STARTUP_SECONDS = Gauge("startup_seconds", "Açılış aşamalarının süresi (import, index, model, llm_client, warmup)",
+                        ["phase"])
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Bloğun süresini STAGE_SECONDS'a yazar; hata olursa STAGE_ERRORS da artar."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - t0, stage=stage)
+
+
+def record_usage(usage: Dict[str, int]):
+    if usage:
+        LLM_TOKENS.inc(usage.get("prompt_tokens", 0), kind="prompt")
+        LLM_TOKENS.inc(usage.get("completion_tokens", 0), kind="completion")
+
+
+# ---- Yapılandırılmış log ----
+def log_event(logger: logging.Logger, level: int, event: str, **fields):
+    """Seviye kapalıysa hiçbir alan biçimlendirilmez (sıcak yolda maliyet tek bir kontrol)."""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={v!r}" if isinstance(v, str) else f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out = {"ts": round(record.created, 3), "level": record.levelname, "logger": record.name,
+               "event": record.getMessage(), **(getattr(record, "fields", None) or {})}
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+def configure_logging(level: str = "INFO", fmt: str = "text"):
+    handler = logging.StreamHandler()
+    if fmt == "json":
+        handler.setFormatter(_JsonFormatter())
+    else:
+        handler.setFormatter(_TextFormatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper())
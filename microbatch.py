@@ -0,0 +1,96 @@
+# microbatch.py
+"""
+Eşzamanlı tekil encode isteklerini kısa bir pencere boyunca toplayıp tek bir
+forward pass'te işleyen mikro-batcher.
+
+window_ms büyüdükçe batch dolma ihtimali (throughput) artar, tekil isteğin
+bekleme süresi (latency) de o kadar uzar. window_ms=0 iken yalnızca o anda
+kuyrukta bekleyen istekler birleştirilir.
+"""
+import queue, threading, time
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+import numpy as np
+
+BatchFn = Callable[[List[str]], np.ndarray]
+
+
+class MicroBatcher:
+    def __init__(self, fn: BatchFn, window_ms: float = 5.0, max_batch: int = 32):
+        self.fn = fn
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # İstatistikler
+        self.batches = 0
+        self.items = 0
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                t = threading.Thread(target=self._run, name="encode-microbatch", daemon=True)
+                t.start()
+                self._thread = t
+
+    def submit(self, text: str) -> Future:
+        self._ensure_started()
+        fut: Future = Future()
+        self._queue.put((text, fut))
+        return fut
+
+    def encode(self, text: str, timeout: Optional[float] = None) -> np.ndarray:
+        return self.submit(text).result(timeout=timeout)
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": (self.items / self.batches) if self.batches else 0.0,
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+        }
+
+    def _collect(self, first: tuple) -> List[tuple]:
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Kapanış: elimizdekini işleyip çık
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            texts = [t for t, _ in batch]
+            try:
+                vecs = self.fn(texts)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, fut), v in zip(batch, vecs):
+                fut.set_result(v)
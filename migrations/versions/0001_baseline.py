@@ -0,0 +1,54 @@
+"""baseline: triages ve case_states tabloları
+
+reset_db.py / create_all ile oluşturulmuş mevcut veritabanlarında bu revizyon
+çalıştırılmaz, yalnızca işaretlenir:  alembic stamp 0001
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-01-15
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+JSONDoc = sa.JSON().with_variant(JSONB(), "postgresql")
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "triages",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("case_id", sa.String(20), nullable=False),
+        sa.Column("age", sa.Integer, nullable=False),
+        sa.Column("sex", sa.String(10), nullable=False),
+        sa.Column("complaint_text", sa.Text, nullable=False),
+        sa.Column("vitals", JSONDoc),
+        sa.Column("triage_level", sa.String(10), nullable=False),
+        sa.Column("rationale", sa.Text),
+        sa.Column("red_flags", JSONDoc),
+        sa.Column("immediate_actions", JSONDoc),
+        sa.Column("questions_to_ask_next", JSONDoc),
+        sa.Column("routing", JSONDoc),
+        sa.Column("evidence_ids", JSONDoc),
+        sa.Column("created_at", sa.TIMESTAMP, server_default=sa.func.now(), nullable=False),
+    )
+    op.create_index("ix_triages_id", "triages", ["id"])
+    op.create_index("ix_triages_case_id", "triages", ["case_id"])
+
+    op.create_table(
+        "case_states",
+        sa.Column("case_id", sa.String(20), primary_key=True),
+        sa.Column("data", sa.LargeBinary, nullable=False),
+        sa.Column("expires_at", sa.Float, nullable=False),
+    )
+    op.create_index("ix_case_states_expires_at", "case_states", ["expires_at"])
+
+
+def downgrade():
+    op.drop_table("case_states")
+    op.drop_table("triages")
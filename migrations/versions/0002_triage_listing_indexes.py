@@ -0,0 +1,34 @@
+"""triages: keyset sayfalama ve tarih/seviye taramaları için bileşik indeksler
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-01-20
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_triages_created_at_id", ["created_at", "id"]),
+    ("ix_triages_case_id_created_at", ["case_id", "created_at"]),
+    ("ix_triages_level_created_at", ["triage_level", "created_at"]),
+]
+
+
+def upgrade():
+    if op.get_context().dialect.name == "postgresql":
+        # Canlı tabloyu kilitlememek için CONCURRENTLY (transaction dışında çalışmalı)
+        with op.get_context().autocommit_block():
+            for name, cols in INDEXES:
+                op.create_index(name, "triages", cols, postgresql_concurrently=True, if_not_exists=True)
+    else:
+        for name, cols in INDEXES:
+            op.create_index(name, "triages", cols, if_not_exists=True)
+
+
+def downgrade():
+    for name, _ in INDEXES:
+        op.drop_index(name, table_name="triages")
@@ -0,0 +1,37 @@
+"""analytics: triage_rollups ve red_flag_rollups tabloları
+
+Mevcut triage'lar için rollup'lar doldurulur:  python analytics.py rebuild --since 2024-01-01
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-01-27
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "triage_rollups",
+        sa.Column("granularity", sa.String(4), primary_key=True),
+        sa.Column("bucket_start", sa.TIMESTAMP, primary_key=True),
+        sa.Column("triage_level", sa.String(10), primary_key=True),
+        sa.Column("specialty", sa.String(64), primary_key=True),
+        sa.Column("count", sa.Integer, nullable=False),
+    )
+    op.create_table(
+        "red_flag_rollups",
+        sa.Column("bucket_start", sa.TIMESTAMP, primary_key=True),
+        sa.Column("flag", sa.String(200), primary_key=True),
+        sa.Column("count", sa.Integer, nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("red_flag_rollups")
+    op.drop_table("triage_rollups")
@@ -0,0 +1,50 @@
+"""triages: red flag ve uzmanlık sorguları için dialect'e özel JSON indeksleri
+
+PostgreSQL: red_flags üzerinde GIN (jsonb_path_ops), routing->>'specialty' ifade indeksi.
+SQLite: trigger ile dolan triage_red_flags tablosu (mevcut satırlar doldurulur) ve
+json_extract(routing, '$.specialty') ifade indeksi.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2025-02-03
+"""
+from alembic import op
+
+from models import JSON_INDEX_DDL
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+SQLITE_BACKFILL = """
+INSERT OR IGNORE INTO triage_red_flags (flag, triage_id)
+SELECT j.value, t.id FROM triages t, json_each(t.red_flags) j
+WHERE json_valid(t.red_flags) AND j.type = 'text'
+"""
+
+
+def upgrade():
+    dialect = op.get_context().dialect.name
+    stmts = JSON_INDEX_DDL.get(dialect, [])
+    if dialect == "postgresql":
+        with op.get_context().autocommit_block():
+            for stmt in stmts:
+                op.execute(stmt.replace("CREATE INDEX IF NOT EXISTS", "CREATE INDEX CONCURRENTLY IF NOT EXISTS"))
+        return
+    for stmt in stmts:
+        op.execute(stmt)
+    if dialect == "sqlite":
+        op.execute(SQLITE_BACKFILL)
+
+
+def downgrade():
+    dialect = op.get_context().dialect.name
+    if dialect == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_triages_red_flags_gin")
+        op.execute("DROP INDEX IF EXISTS ix_triages_routing_specialty")
+    elif dialect == "sqlite":
+        op.execute("DROP TRIGGER IF EXISTS trg_triages_red_flags_ins")
+        op.execute("DROP TRIGGER IF EXISTS trg_triages_red_flags_upd")
+        op.execute("DROP TABLE IF EXISTS triage_red_flags")
+        op.execute("DROP INDEX IF EXISTS ix_triages_routing_specialty")
@@ -0,0 +1,43 @@
+"""triages: uzmanlık ifade indeksi büyük/küçük harf duyarsız (lower) sorgular için
+
+/triage/alltriages?specialty= filtresi lower() ile karşılaştırır; eski indeks
+kullanılamadığından lower(...) ifade indeksiyle değiştirilir.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2025-02-10
+"""
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    "postgresql": ("(routing ->> 'specialty')", "(lower(routing ->> 'specialty'))"),
+    "sqlite": ("json_extract(routing, '$.specialty')", "lower(json_extract(routing, '$.specialty'))"),
+}
+
+
+def _swap(drop: str, create: str, expr: str):
+    dialect = op.get_context().dialect.name
+    if dialect == "postgresql":
+        with op.get_context().autocommit_block():
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {create} ON triages ({expr})")
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {drop}")
+    else:
+        op.execute(f"CREATE INDEX IF NOT EXISTS {create} ON triages ({expr})")
+        op.execute(f"DROP INDEX IF EXISTS {drop}")
+
+
+def upgrade():
+    dialect = op.get_context().dialect.name
+    if dialect in INDEXES:
+        _swap("ix_triages_routing_specialty", "ix_triages_routing_specialty_lower", INDEXES[dialect][1])
+
+
+def downgrade():
+    dialect = op.get_context().dialect.name
+    if dialect in INDEXES:
+        _swap("ix_triages_routing_specialty_lower", "ix_triages_routing_specialty", INDEXES[dialect][0])
@@ -1,8 +1,11 @@
 # models.py
-from sqlalchemy import Column, Integer, String, Text, TIMESTAMP, func
+from sqlalchemy import DDL, JSON, Column, Float, Index, Integer, LargeBinary, String, Text, TIMESTAMP, event, func
 from sqlalchemy.dialects.postgresql import JSONB
 from database import Base
 
+# PostgreSQL'de JSONB (GIN indekslenebilir), SQLite'ta JSON1 üzerinde metin JSON
+JSONDoc = JSON().with_variant(JSONB(), "postgresql")
+
 class Triage(Base):
     __tablename__ = "triages"
 
@@ -15,15 +18,87 @@ class Triage(Base):
 
     # Başvuru
     complaint_text = Column(Text, nullable=False)
-    vitals = Column(JSONB)
+    vitals = Column(JSONDoc)
 
     # LLM çıktıları
     triage_level = Column(String(10), nullable=False)
     rationale = Column(Text)
-    red_flags = Column(JSONB)
-    immediate_actions = Column(JSONB)
-    questions_to_ask_next = Column(JSONB)
-    routing = Column(JSONB)
-    evidence_ids = Column(JSONB)
+    red_flags = Column(JSONDoc)
+    immediate_actions = Column(JSONDoc)
+    questions_to_ask_next = Column(JSONDoc)
+    routing = Column(JSONDoc)
+    evidence_ids = Column(JSONDoc)
 
     created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+
+    # Keyset sayfalama ve tarih/seviye taramaları için (migrations/versions/0002)
+    __table_args__ = (
+        Index("ix_triages_created_at_id", "created_at", "id"),
+        Index("ix_triages_case_id_created_at", "case_id", "created_at"),
+        Index("ix_triages_level_created_at", "triage_level", "created_at"),
+    )
+
+
+# JSON alanları için dialect'e özel indeksler (migrations/versions/0004).
+# "red flag X olan vakalar": PostgreSQL'de GIN (@>), SQLite'ta trigger ile dolan
+# triage_red_flags(flag, triage_id) tablosu. Uzmanlık: her iki tarafta lower() ifade indeksi (0005).
+JSON_INDEX_DDL = {
+    "postgresql": [
+        "CREATE INDEX IF NOT EXISTS ix_triages_red_flags_gin ON triages USING gin (red_flags jsonb_path_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_triages_routing_specialty_lower ON triages ((lower(routing ->> 'specialty')))",
+    ],
+    "sqlite": [
+        """CREATE TABLE IF NOT EXISTS triage_red_flags (
+            flag TEXT NOT NULL,
+            triage_id INTEGER NOT NULL REFERENCES triages(id) ON DELETE CASCADE,
+            PRIMARY KEY (flag, triage_id)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS ix_triage_red_flags_triage_id ON triage_red_flags (triage_id)",
+        """CREATE TRIGGER IF NOT EXISTS trg_triages_red_flags_ins AFTER INSERT ON triages
+        WHEN json_valid(NEW.red_flags) BEGIN
+            INSERT OR IGNORE INTO triage_red_flags (flag, triage_id)
+            SELECT value, NEW.id FROM json_each(NEW.red_flags) WHERE type = 'text';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_triages_red_flags_upd AFTER UPDATE OF red_flags ON triages BEGIN
+            DELETE FROM triage_red_flags WHERE triage_id = NEW.id;
+            INSERT OR IGNORE INTO triage_red_flags (flag, triage_id)
+            SELECT value, NEW.id FROM json_each(NEW.red_flags)
+            WHERE json_valid(NEW.red_flags) AND type = 'text';
+        END""",
+        "CREATE INDEX IF NOT EXISTS ix_triages_routing_specialty_lower ON triages (lower(json_extract(routing, '$.specialty')))",
+    ],
+}
+
+for _dialect, _stmts in JSON_INDEX_DDL.items():
+    for _stmt in _stmts:
+        event.listen(Triage.__table__, "after_create", DDL(_stmt).execute_if(dialect=_dialect))
+
+
+
+class CaseRecord(Base):
+    """Devam eden vakaların paylaşımlı durumu (case_store.SqlCaseStore)."""
+    __tablename__ = "case_states"
+
+    case_id = Column(String(20), primary_key=True)
+    data = Column(LargeBinary, nullable=False)       # sıkıştırılmış CaseState JSON
+    expires_at = Column(Float, index=True, nullable=False)  # unix epoch saniye
+
+
+class TriageRollup(Base):
+    """Saatlik/günlük × ESI seviyesi × uzmanlık bazında final triage sayıları (analytics.py)."""
+    __tablename__ = "triage_rollups"
+
+    granularity = Column(String(4), primary_key=True)        # "hour" | "day"
+    bucket_start = Column(TIMESTAMP, primary_key=True)
+    triage_level = Column(String(10), primary_key=True)
+    specialty = Column(String(64), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class RedFlagRollup(Base):
+    """Günlük red flag frekansları (analytics.py)."""
+    __tablename__ = "red_flag_rollups"
+
+    bucket_start = Column(TIMESTAMP, primary_key=True)
+    flag = Column(String(200), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
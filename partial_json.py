@@ -0,0 +1,87 @@
+# partial_json.py
+"""
+Akış halinde gelen (henüz tamamlanmamış) bir JSON nesnesinde, en üst seviyedeki
+bir string alanın değeri tamamlandığı anda onu yakalayan artımlı tarayıcı.
+
+    w = StringFieldWatcher("next_question")
+    for chunk in stream:
+        q = w.feed(chunk)
+        if q is not None: ...  # alan tamamlandı
+"""
+import json
+from typing import Optional
+
+
+class StringFieldWatcher:
+    def __init__(self, field: str):
+        self.field = field
+        self.value: Optional[str] = None
+        self._buf: list = []        # sadece yakalanan string'in ham karakterleri
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._expect = "key"        # depth 1'de: key | colon | value | comma
+        self._key_chars: list = []
+        self._last_key: Optional[str] = None
+        self._capturing = False
+        self._reading_key = False
+
+    @property
+    def done(self) -> bool:
+        return self.value is not None
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """Yeni parçayı işler; alan bu parçada tamamlandıysa değerini döndürür."""
+        if self.value is not None:
+            return None
+        for ch in chunk:
+            if self._in_str:
+                if self._capturing:
+                    self._buf.append(ch)
+                elif self._reading_key:
+                    self._key_chars.append(ch)
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+                    if self._capturing:
+                        raw = '"' + "".join(self._buf)
+                        try:
+                            self.value = json.loads(raw)
+                        except ValueError:
+                            self.value = raw[1:-1]
+                        return self.value
+                    if self._reading_key:
+                        self._reading_key = False
+                        try:
+                            self._last_key = json.loads('"' + "".join(self._key_chars))
+                        except ValueError:
+                            self._last_key = None
+                        self._key_chars = []
+                        self._expect = "colon"
+                    elif self._depth == 1 and self._expect == "value":
+                        self._expect = "comma"
+                continue
+
+            if ch == '"':
+                self._in_str = True
+                if self._depth == 1 and self._expect == "key":
+                    self._reading_key = True
+                elif self._depth == 1 and self._expect == "value" and self._last_key == self.field:
+                    self._capturing = True
+            elif ch in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._expect = "key"
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 1:
+                    self._expect = "comma"
+            elif self._depth == 1:
+                if ch == ":" and self._expect == "colon":
+                    self._expect = "value"
+                elif ch == ",":
+                    self._expect = "key"
+        return None
@@ -0,0 +1,94 @@
+# query_cache.py
+"""
+RetrievalService için iki seviyeli sorgu önbelleği.
+
+    vectors  normalize sorgu metni → sorgu embedding'i (korpustan bağımsız; reload'da korunur)
+             Normalizasyon yalnızca anahtardır; encoder'a sorgunun özgün metni gider.
+    results  (metin, chief, age_group, pregnancy, k, indeks sürümü) → top-k (kart indeksi, skor)
+
+Sonuç anahtarı indeks sürümünü içerdiğinden eski görüntünün sonuçları yeni görüntüde
+hiç isabet etmez; sürüm değişince sonuç önbelleği ayrıca boşaltılır (bellek). Kart
+indeksleri yalnızca aynı sürümün görüntüsünde geçerlidir, bu yüzden çağıran sorgu
+boyunca tek görüntü kullanmalıdır.
+"""
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ttl_cache import TTLCache
+
+_TR_LOWER = str.maketrans({"I": "ı", "İ": "i"})
+
+Hits = List[Tuple]  # (kart indeksi, skor) ya da hybrid'de (kart indeksi, kosinüs, rrf)
+
+
+def fold_case(text: Optional[str]) -> str:
+    """Türkçe küçük harf (I → ı, İ → i) ve tek boşluk; önbellek anahtarları, filtre ve BM25 eşleşmesi."""
+    return " ".join(str(text or "").translate(_TR_LOWER).lower().split())
+
+
+def normalize_query(text: str) -> str:
+    """Sorgu önbelleği anahtarı; encode edilen metin değildir."""
+    return fold_case(text)
+
+
+def _norm_filter(value: Optional[str]) -> str:
+    return fold_case(value) if value else ""
+
+
+class QueryCache:
+    def __init__(self, vector_maxsize: int = 4096, vector_ttl: Optional[float] = None,
+                 result_maxsize: int = 4096, result_ttl: Optional[float] = None, enabled: bool = True):
+        self.enabled = enabled
+        self.vectors = TTLCache(maxsize=vector_maxsize, ttl=vector_ttl)
+        self.results = TTLCache(maxsize=result_maxsize, ttl=result_ttl)
+        self.version: Optional[str] = None
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    # ---- 1. seviye: embedding ----
+    def get_vector(self, text: str) -> Optional[np.ndarray]:
+        return self.vectors.get(text) if self.enabled else None
+
+    def set_vector(self, text: str, vec: np.ndarray):
+        if self.enabled:
+            vec = np.array(vec, copy=True)
+            vec.setflags(write=False)  # paylaşılan kopya: çağıranlar değiştiremez
+            self.vectors.set(text, vec)
+
+    # ---- 2. seviye: top-k ----
+    @staticmethod
+    def result_key(text: str, k: int, chief: Optional[str], age_group: Optional[str],
+                   pregnancy: Optional[str], version: str) -> Tuple:
+        return (text, int(k), _norm_filter(chief), _norm_filter(age_group), _norm_filter(pregnancy), version)
+
+    def _check_version(self, version: str):
+        if version == self.version:
+            return
+        with self._lock:
+            if version != self.version:
+                if self.version is not None:
+                    self.results.clear()
+                    self.invalidations += 1
+                self.version = version
+
+    def get_hits(self, key: Tuple) -> Optional[Hits]:
+        if not self.enabled:
+            return None
+        self._check_version(key[-1])
+        hits = self.results.get(key)
+        return list(hits) if hits is not None else None
+
+    def set_hits(self, key: Tuple, hits: Hits):
+        # Arama sürerken indeks değiştiyse eski görüntünün sonucu saklanmaz
+        if self.enabled and key[-1] == self.version:
+            self.results.set(key, tuple((int(h[0]), *(float(x) for x in h[1:])) for h in hits))
+
+    def clear(self):
+        self.vectors.clear()
+        self.results.clear()
+
+    def stats(self) -> Dict:
+        return {"enabled": self.enabled, "version": self.version, "invalidations": self.invalidations,
+                "vectors": self.vectors.stats(), "results": self.results.stats()}
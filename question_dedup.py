@@ -0,0 +1,176 @@
+# question_dedup.py
+"""
+Sorulmuş bir sorunun tekrarını (yeniden ifade edilmiş hali dahil) yerel olarak yakalar.
+
+İki aşama:
+    fuzzy      Soru kalıpları ("var mı", "musunuz" ...) atılır, kelimeler 5 harflik köke
+               indirilir (Türkçe ekler: "ateşiniz" ~ "ateş", "bayıldınız" ~ "bayılma") ve
+               RapidFuzz token_sort_ratio ile karşılaştırılır. Kelime sırası farkı
+               ("bulanık görme" ~ "görme bulanıklığı") sorun olmaz. Skor yetmez: her iki
+               tarafın her kelimesi diğer tarafta karşılığını bulmalı, taraf/konum
+               ("sol" / "sağ", "alt" / "üst") ve olumsuzluk ("yok", "değil", "-mıyor")
+               aynı olmalıdır; "Sol kolunuzda ağrı" ile "Sağ kolunuzda ağrı" tekrar değildir.
+    embedding  (opsiyonel) fuzzy yakalayamazsa sorgu embedding'lerinin kosinüs
+               benzerliği; sorulmuş soruların vektörleri önbellekte tutulur, her adımda
+               yalnızca yeni soru encode edilir.
+
+Tekrar bulunduğunda çağıran taraf (triage_api) LLM'i ikinci kez çağırmak yerine seçilen
+kartın sıradaki sorulmamış sorusunu verir (question_policy.next_card_question).
+"""
+import re
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+from query_cache import normalize_query
+from ttl_cache import TTLCache
+
+# Anlam taşımayan soru kalıpları ve hitaplar ("yok" olumsuzluk olarak ayrıca karşılaştırılır)
+_STOPWORDS = {
+    "mı", "mi", "mu", "mü", "mısınız", "misiniz", "musunuz", "müsünüz", "mıydı", "miydi",
+    "var", "yok", "oldu", "peki", "acaba", "hiç", "şu", "bu", "ve", "veya", "ya", "da", "de",
+    "bir", "başka", "yere", "herhangi", "siz", "sizde", "sizin",
+}
+_STEM = 5
+# Kökü ayırt edici olmayan ama soruyu değiştiren kelimeler: taraf/konum ve olumsuzluk
+_SIDE = re.compile(r"^(sol|sağ|alt|üst)(a|e|da|de|ta|te|dan|den|tan|ten|daki|deki|taki|teki)?$")
+_NEGATION = re.compile(r"^(yok|değil|hayır)$|m[ıiuü]yor|m[ae]d[ıiuü]|m[ae]z\b|m[ae]m[ıi]ş")
+# Kelime eşleşmesi: aynı kök, biri diğerinin ön eki ("ateş" ~ "ateşi") ya da yakın yazım
+_TOKEN_RATIO = 80
+EmbedFn = Callable[[List[str]], Optional[np.ndarray]]
+
+
+def question_key(text: Optional[str]) -> str:
+    """Karşılaştırma anahtarı: küçük harf, kalıplar atılmış, kelime kökleri."""
+    words = re.findall(r"\w+", normalize_query(text or ""))
+    return " ".join(w[:_STEM] for w in words if w not in _STOPWORDS)
+
+
+def _markers(text: Optional[str]) -> tuple:
+    """(taraf/konum kelimeleri, olumsuz mu) — kökten bağımsız karşılaştırılır."""
+    words = re.findall(r"\w+", normalize_query(text or ""))
+    sides = frozenset(m.group(1) for m in map(_SIDE.match, words) if m)
+    return sides, any(_NEGATION.search(w) for w in words)
+
+
+def _token_match(a: str, b: str) -> bool:
+    if a == b or (min(len(a), len(b)) >= 4 and (a.startswith(b) or b.startswith(a))):
+        return True
+    return fuzz.ratio(a, b) >= _TOKEN_RATIO
+
+
+def _aligned(key_a: str, key_b: str) -> bool:
+    """Her iki anahtarın her kelimesi diğerinde bir karşılık buluyor mu (fazla/eksik kelime yok)."""
+    ta, tb = key_a.split(), key_b.split()
+    return all(any(_token_match(x, y) for y in tb) for x in ta) and \
+        all(any(_token_match(y, x) for x in ta) for y in tb)
+
+
+def same_question(a: Optional[str], b: Optional[str]) -> bool:
+    """Sözcüksel ön koşul: taraf, olumsuzluk ve kelimeler uyuşmalı (skordan bağımsız)."""
+    return _markers(a) == _markers(b) and _aligned(question_key(a), question_key(b))
+
+
+@dataclass
+class Match:
+    question: str   # sorulmuş olan soru
+    score: float    # fuzzy: 0-100, embedding: kosinüs
+    method: str     # exact | fuzzy | embedding
+
+
+class QuestionDeduper:
+    def __init__(
+        self,
+        fuzzy_threshold: float = 85.0,
+        embed_fn: Optional[EmbedFn] = None,
+        embed_threshold: float = 0.93,
+        cache_maxsize: int = 4096,
+        cache_ttl: Optional[float] = None,
+    ):
+        self.fuzzy_threshold = fuzzy_threshold
+        self.embed_fn = embed_fn
+        self.embed_threshold = embed_threshold
+        self._vectors = TTLCache(maxsize=cache_maxsize, ttl=cache_ttl)  # normalize soru → birim vektör
+        self._lock = threading.Lock()
+        self.counts = {"checked": 0, "exact": 0, "fuzzy": 0, "embedding": 0, "embed_errors": 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self.counts[key] += 1
+
+    def match(self, question: Optional[str], asked: Sequence[str], use_embeddings: bool = True) -> Optional[Match]:
+        """question sorulmuş sorulardan birinin tekrarıysa eşleşmeyi döndürür."""
+        if not question or not asked:
+            return None
+        self._count("checked")
+        hit = self._lexical(question, asked)
+        if hit is not None:
+            self._count(hit.method)
+            return hit
+        if use_embeddings and self.embed_fn is not None:
+            return self._embedding_match(question, asked)
+        return None
+
+    def _lexical(self, question: str, asked: Sequence[str]) -> Optional[Match]:
+        norm = normalize_query(question)
+        for q in asked:
+            if normalize_query(q) == norm:
+                return Match(q, 100.0, "exact")
+        key = question_key(question)
+        if not key:
+            return None
+        hits = process.extract(key, [question_key(q) for q in asked], scorer=fuzz.token_sort_ratio,
+                               processor=None, score_cutoff=self.fuzzy_threshold, limit=None)
+        for _, score, i in hits:  # skora göre azalan
+            if same_question(question, asked[i]):
+                return Match(asked[i], float(score), "fuzzy")
+        return None
+
+    def similar(self, question: Optional[str], asked: Sequence[str]) -> bool:
+        """Yalnızca sözcüksel (exact + fuzzy) kontrol; sayaçlara girmez (politika, kart soruları)."""
+        return bool(question and asked) and self._lexical(question, asked) is not None
+
+    def _embed(self, texts: List[str]) -> Optional[List[np.ndarray]]:
+        norm = [normalize_query(t) for t in texts]
+        vecs = [self._vectors.get(t) for t in norm]
+        missing = [i for i, v in enumerate(vecs) if v is None]
+        if missing:
+            try:
+                encoded = self.embed_fn([texts[i] for i in missing])  # anahtar normalize, model girdisi özgün
+            except Exception:
+                encoded = None
+            if encoded is None:
+                self._count("embed_errors")
+                return None
+            for i, v in zip(missing, np.asarray(encoded, dtype=np.float32)):
+                v = v / (np.linalg.norm(v) or 1.0)
+                v.setflags(write=False)
+                self._vectors.set(norm[i], v)
+                vecs[i] = v
+        return vecs
+
+    def _embedding_match(self, question: str, asked: Sequence[str]) -> Optional[Match]:
+        vecs = self._embed([question, *asked])
+        if vecs is None:
+            return None
+        sims = np.stack(vecs[1:]) @ vecs[0]
+        # Embedding'ler taraf/olumsuzluk farkını ayırt etmez ("sol" ~ "sağ"); bunlar uyuşmalı
+        marks = _markers(question)
+        sims = np.where([_markers(q) == marks for q in asked], sims, -np.inf)
+        best = int(np.argmax(sims))
+        if sims[best] >= self.embed_threshold:
+            self._count("embedding")
+            return Match(asked[best], float(sims[best]), "embedding")
+        return None
+
+    def stats(self) -> Dict:
+        return {
+            "fuzzy_threshold": self.fuzzy_threshold,
+            "embeddings": self.embed_fn is not None,
+            "embed_threshold": self.embed_threshold,
+            "cached_vectors": len(self._vectors),
+            **self.counts,
+        }
@@ -0,0 +1,254 @@
+# question_policy.py
+"""
+Vaka başına soru politikası: bir sonraki adım için LLM'e gitmeye değer mi?
+
+Her cevaptan sonra (ve /triage/start'ta) karar verilir:
+    final  → soru sorma, final triyaja geç
+    card   → sıradaki soruyu seçilen kartın questions_to_ask_next listesinden ver (LLM'siz)
+    llm    → soruyu LLM üretsin
+
+Sinyaller:
+- Aciliyet: vitallerden tespit edilen kart red flag'leri (rules_engine) varsa soru tavanı
+  POLICY_MAX_QA_ELEVATED'e iner; kesin ESI-1/ESI-2 zaten fast path'te sorusuz biter.
+- Red flag kapsaması: seçilen kartın (RAG top-1) vitalle karar verilemeyen red flag'leri,
+  kartın sorularıyla kelime kökü örtüşmesinden eşlenir. Yalnızca kapalı (evet/hayır)
+  sorular ve tek belirtili flag'ler eşlenir: "Ateş + hipotansiyon" tek "Ateş var mı?"
+  sorusuyla, "Senkop sırasında ne yapıyordunuz?" gibi açık sorular hiçbir cevapla
+  doğrulanamaz. Eşlenen sorulardan biri açıkça onaylandıysa ("Evet", "Var") vaka erken
+  biter; hepsi sorulduysa ve POLICY_MIN_QA dolduysa da biter.
+- Güven: kart sorusu yalnızca şikayet kartın şikayetlerinden biriyle örtüşüyorsa ve
+  (ayarlıysa) RAG skor farkı POLICY_CARD_MIN_MARGIN'i aşıyorsa kullanılır; aksi halde
+  ayırt edici soruyu LLM üretir.
+
+QUESTION_POLICY=fixed eski davranıştır: POLICY_MAX_QA soru, hepsi LLM'den. Varsayılan
+QUESTION_SOURCE=llm'dir: sorular LLM'den gelir, politika yalnızca erken bitişe karar verir;
+kart soruları QUESTION_SOURCE=auto|card ile açılır.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+from question_dedup import QuestionDeduper
+from rules_engine import compile_flag
+from schemas import CaseState
+from speculation import is_affirmative_answer
+
+# Kök eşlemesinde anlam taşımayan kelimeler (soru kalıpları, genel sıfatlar)
+_STOPWORDS = {
+    "var", "mı", "mi", "mu", "mü", "yok", "ne", "zaman", "daha", "önce", "nasıl", "hangi", "kadar",
+    "oldu", "olan", "olarak", "veya", "ile", "gibi", "yaşadınız", "şüphesi", "belirtileri",
+    "şiddetli", "ani", "başlayan", "akut", "yoksa", "sonra", "tablosu",
+}
+_STEM = 4
+# Hemen her şikayette geçen kökler (ağrı/ağrısı); flag eşlemesinde ayırt edici değil
+_GENERIC_STEMS = frozenset({"ağrı"})
+# Kapalı soru ekleri ve açık soru kelimeleri; "daha önce" soruları öykü sorar, flag'i doğrulamaz
+_YES_NO = {
+    "mı", "mi", "mu", "mü", "mısınız", "misiniz", "musunuz", "müsünüz", "mıydı", "miydi", "muydu", "müydü",
+}
+_OPEN = re.compile(r"\b(ne|neden|niye|nasıl|hangi|kaç|nerede|nereye|kim|daha önce)\b")
+# Flag bir işlevin yokluğuysa ("Çene açamama", "Fetal hareket azalması") soru onu sormuyorsa
+# ("Çenenizi açabiliyor musunuz?") "Evet" olumsuz bulgudur
+_DEFICIT = re.compile(r"\w+(amama|ememe|amıyor|emiyor|amaz|emez)\b|\bazal|\bkayb")
+# Flag'i ayıran nitelikler: soru da sormuyorsa ("Kanama var mı?" → "Şiddetli rektal kanama") evet doğrulamaz
+_QUALIFIERS = {"şiddetli", "yüksek", "hızla", "ani", "tek", "çoklu", "kanlı", "sistemik"}
+# Cevapta bilgi yoksa (bilmiyorum) soru sorulmuş ama kapsanmamış sayılır
+_UNKNOWN = re.compile(r"^(bilmiyorum|emin değilim|emin degilim|bilinmiyor|\?)\b")
+
+
+def _norm(text: Optional[str]) -> str:
+    return " ".join(str(text or "").split()).strip().lower()
+
+
+def _yes_no(question: str) -> bool:
+    q = _norm(question)
+    return bool(_YES_NO.intersection(re.findall(r"\w+", q))) and not _OPEN.search(q)
+
+
+def _stems(text: str, drop: frozenset = frozenset()) -> set:
+    out = set()
+    for w in re.findall(r"\w+", _norm(text)):
+        if len(w) < 4 or w in _STOPWORDS:
+            continue
+        s = w[:_STEM]
+        if s not in drop:
+            out.add(s)
+    return out
+
+
+@dataclass
+class CardPlan:
+    """Kartın politika görünümü (kart başına bir kez hesaplanır)."""
+    card_id: str
+    complaints: List[str]
+    questions: List[str]                                          # kart sırasıyla
+    flag_stems: Dict[str, set] = field(default_factory=dict)           # soruyla doğrulanacak flag → kökler
+    flag_questions: Dict[str, List[str]] = field(default_factory=dict)  # evet/hayır sorusu → doğruladığı flag'ler
+    generic: frozenset = frozenset()
+
+    def flags_of(self, question: str) -> List[str]:
+        """Sorunun (kart veya LLM sorusu) değindiği red flag'ler."""
+        qs = _stems(question, self.generic)
+        return [f for f, fs in self.flag_stems.items() if qs & fs]
+
+    def confirmed_by(self, question: str) -> List[str]:
+        """Soruya açık "evet" cevabının doğruladığı red flag'ler (açık sorularda boş)."""
+        if not _yes_no(question):
+            return []
+        q = _norm(question)
+        deficit = _DEFICIT.search(q)
+        words = re.findall(r"\w+", q)
+
+        def asked(w: str) -> bool:
+            return any(x.startswith(w[:4]) for x in words)
+
+        return [f for f in self.flags_of(question)
+                if "+" not in f and (deficit or not _DEFICIT.search(_norm(f)))
+                and all(asked(w) for w in re.findall(r"\w+", _norm(f)) if w in _QUALIFIERS)]
+
+
+@dataclass
+class Decision:
+    action: str                    # final | card | llm
+    reason: str
+    question: Optional[str] = None  # action == "card" ise dolu
+    last: bool = False              # bu soru cevaplanınca vaka her durumda biter (spekülasyon)
+
+
+class QuestionPolicy:
+    def __init__(
+        self,
+        cards: Sequence[Dict],
+        mode: str = "adaptive",
+        source: str = "llm",
+        min_qa: int = 1,
+        max_qa: int = 3,
+        max_qa_elevated: int = 1,
+        card_min_margin: float = 0.0,
+        dedup: Optional[QuestionDeduper] = None,
+    ):
+        self.mode = mode
+        self.source = source
+        self.min_qa = min_qa
+        self.max_qa = max_qa
+        self.max_qa_elevated = max_qa_elevated
+        self.card_min_margin = card_min_margin
+        self.dedup = dedup  # verilirse kart soruları sorulmuşların yeniden ifadesiyse de atlanır
+        self.plans: Dict[str, CardPlan] = {c["id"]: self._plan(c) for c in cards}
+
+    @staticmethod
+    def _plan(card: Dict) -> CardPlan:
+        meta = card["meta"]
+        complaints = [_norm(x) for x in (meta.get("complaints") or []) + [meta.get("title", "")] if x]
+        # Şikayetin kendi kelimeleri (örn. "ağrı", "karın") her soruda geçer; eşlemede sayılmaz
+        generic = _GENERIC_STEMS | frozenset(s for x in complaints for s in _stems(x))
+        # Vitalle karar verilebilen flag'ler rules_engine'de; soruyla doğrulanacaklar geri kalanlar
+        flags = {f: _stems(f, generic) for f in meta.get("red_flags") or [] if compile_flag(f) is None}
+        plan = CardPlan(card["id"], complaints, list(meta.get("questions_to_ask_next") or []),
+                        flag_stems={f: fs for f, fs in flags.items() if fs}, generic=generic)
+        for q in plan.questions:
+            hit = plan.confirmed_by(q)
+            if hit:
+                plan.flag_questions[q] = hit
+        return plan
+
+    # ---- sinyaller ----
+    def _selected(self, cs: CaseState) -> Optional[CardPlan]:
+        return self.plans.get(cs.rag_cards[0].get("id")) if cs.rag_cards else None
+
+    def _confident(self, cs: CaseState, plan: CardPlan) -> bool:
+        text = _norm(f"{cs.chief or ''} {cs.complaint_text}")
+        if not any(c and c in text for c in plan.complaints):
+            return False
+        if self.card_min_margin > 0 and len(cs.rag_cards) > 1:
+            s1 = float(cs.rag_cards[0].get("score") or 0.0)
+            s2 = float(cs.rag_cards[1].get("score") or 0.0)
+            if s1 <= 0 or (s1 - s2) / s1 < self.card_min_margin:
+                return False
+        return True
+
+    def _cap(self, cs: CaseState) -> int:
+        return min(self.max_qa, self.max_qa_elevated) if cs.detected_flags else self.max_qa
+
+    def _unasked(self, cs: CaseState, questions: Sequence[str]) -> List[str]:
+        asked = [x.get("q") or "" for x in cs.qa]
+        if self.dedup is not None:
+            return [q for q in questions if not self.dedup.similar(q, asked)]
+        norm = {_norm(q) for q in asked}
+        return [q for q in questions if _norm(q) not in norm]
+
+    @staticmethod
+    def _coverage(cs: CaseState, plan: CardPlan):
+        """(kapsanan flag'ler, açıkça onaylanan ilk flag); bilinmiyor cevapları kapsamaz."""
+        covered, positive = set(), None
+        for x in cs.qa:
+            q, a = x.get("q") or "", _norm(x.get("a"))
+            if not a or _UNKNOWN.match(a):
+                continue
+            confirmed = plan.flag_questions[q] if q in plan.flag_questions else plan.confirmed_by(q)
+            covered.update(confirmed or plan.flags_of(q))
+            if confirmed and positive is None and is_affirmative_answer(a):
+                positive = confirmed[0]
+        return covered, positive
+
+    def pending_flag_questions(self, cs: CaseState, plan: CardPlan, covered: Optional[set] = None) -> List[str]:
+        """Henüz kapsanmamış bir red flag'e değinen, sorulmamış kart soruları."""
+        if covered is None:
+            covered = self._coverage(cs, plan)[0]
+        return self._unasked(cs, [q for q, flags in plan.flag_questions.items() if not set(flags) <= covered])
+
+    # ---- karar ----
+    def decide(self, cs: CaseState) -> Decision:
+        n = len(cs.qa)
+        if cs.done:
+            return Decision("final", "user_done")
+        if self.mode == "fixed":
+            if n >= self.max_qa:
+                return Decision("final", "max_qa")
+            return Decision("llm", "fixed", last=n + 1 >= self.max_qa)
+
+        cap = self._cap(cs)
+        if n >= cap:
+            return Decision("final", "elevated_acuity" if cap < self.max_qa else "max_qa")
+        plan = self._selected(cs)
+        if plan is None:
+            return Decision("llm", "no_card", last=n + 1 >= cap)
+
+        covered, positive = self._coverage(cs, plan)
+        if positive:
+            return Decision("final", "red_flag_positive")
+        pending = self.pending_flag_questions(cs, plan, covered)
+        if not pending and n >= self.min_qa and plan.flag_questions:
+            return Decision("final", "flags_covered")
+
+        # Bu soru cevaplanınca vaka biter: tavan doluyor ya da sorulan soru son bekleyen red flag
+        # sorusu (evet → final, değilse → kapsandı). LLM sorusu o flag'e değinmeyebilir; yalnızca tavan.
+        at_cap = n + 1 >= cap
+        use_card = self.source == "card" or (self.source == "auto" and self._confident(cs, plan))
+        if use_card:
+            q = self.next_card_question(cs, plan, pending)
+            if q:
+                last = at_cap or (pending == [q] and n + 1 >= self.min_qa)
+                return Decision("card", "card_question", question=q, last=last)
+        return Decision("llm", "llm_question", last=at_cap)
+
+    def next_card_question(self, cs: CaseState, plan: Optional[CardPlan] = None,
+                           pending: Optional[List[str]] = None) -> Optional[str]:
+        """Seçilen kartın henüz sorulmamış sorusu: önce kapsanmamış red flag soruları, sonra kart sırası."""
+        plan = plan or self._selected(cs)
+        if plan is None:
+            return None
+        if pending is None:
+            pending = self.pending_flag_questions(cs, plan)
+        return next(iter(pending + self._unasked(cs, plan.questions)), None)
+
+    def stats(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "source": self.source,
+            "min_qa": self.min_qa,
+            "max_qa": self.max_qa,
+            "max_qa_elevated": self.max_qa_elevated,
+            "cards": len(self.plans),
+            "cards_with_flag_questions": sum(1 for p in self.plans.values() if p.flag_questions),
+        }
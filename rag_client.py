@@ -0,0 +1,193 @@
+# rag_client.py
+"""
+triage_api'nin kart getirme istemcisi.
+
+    remote  rag_memory servisine HTTP (keep-alive havuz, tekrar deneme, circuit breaker)
+    local   RetrievalService süreç içinde; HTTP/JSON/TCP adımı yok
+
+RAG_MODE=local iken gunicorn --preload ile indeks master süreçte bir kez kurulur ve
+worker'lar copy-on-write paylaşır (bkz. rag_service). Her iki istemci de aynı
+{"text", "chief", "age_group", "pregnancy", "k"} gövdesini alır ve /rag/topk ile aynı
+kart listesini döndürür.
+"""
+import asyncio, logging, threading, time
+from typing import Dict, List, Optional
+
+import httpx
+from fastapi.concurrency import run_in_threadpool
+
+from config import settings
+from llm_client_openai import backoff_delay
+from metrics import timed
+
+logger = logging.getLogger("rag_client")
+
+
+class RagUnavailable(Exception):
+    """Circuit açık: RAG servisi yakın zamanda art arda başarısız oldu."""
+
+
+class CircuitBreaker:
+    """
+    closed → art arda failure_threshold hata → open (istekler hemen reddedilir)
+    → reset_timeout_s sonra half-open (tek deneme) → başarı: closed, hata: tekrar open.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_s: float = 10.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout_s = reset_timeout_s
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_at: Optional[float] = None  # half-open deneme isteğinin başladığı an
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout_s:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            now = time.monotonic()
+            # Yalnızca bir deneme isteği geçer; sonuçsuz kalan (iptal edilen) deneme zamanla düşer
+            if state == "half-open" and (self._trial_at is None or now - self._trial_at >= self.reset_timeout_s):
+                self._trial_at = now
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning("RAG circuit açıldı (%d art arda hata)", self.failures)
+                self.opened_at = time.monotonic()
+                self._trial_at = None
+
+
+class RemoteRagClient:
+    mode = "remote"
+
+    def __init__(self, url: str, timeout_s: float, pool_size: int, max_retries: int,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.url = url
+        self.timeout_s = timeout_s
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self._http: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        # Keep-alive bağlantı havuzu; worker başına bir kez açılır
+        self._http = httpx.AsyncClient(
+            timeout=self.timeout_s,
+            limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+        )
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def topk(self, body: Dict) -> List[Dict]:
+        if not self.breaker.allow():
+            raise RagUnavailable("RAG circuit open")
+        try:
+            with timed("rag_http"):  # tekrar denemeler dahil
+                cards = await self._post(body)
+        except httpx.HTTPStatusError as e:
+            # 4xx isteğin hatası; servis sağlıklı
+            if e.response.status_code < 500:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return cards
+
+    async def _post(self, body: Dict) -> List[Dict]:
+        last_err: Optional[Exception] = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                r = await self._http.post(self.url, json=body)
+                r.raise_for_status()
+                cards = r.json()
+                if not isinstance(cards, list):
+                    raise ValueError("RAG response is not a list")
+                return cards
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                # Bağlantı hataları ve 5xx tekrar denenir; 4xx kalıcıdır
+                if isinstance(e, httpx.HTTPStatusError) and e.response.status_code < 500:
+                    raise
+                last_err = e
+                if attempt < self.max_retries:
+                    await asyncio.sleep(backoff_delay(attempt, 0.2))
+        raise last_err
+
+    def stats(self) -> Dict:
+        return {"client": self.mode, "url": self.url, "circuit": self.breaker.state,
+                "consecutive_failures": self.breaker.failures}
+
+    def readiness(self) -> Dict:
+        # Uzak servisin durumu bu worker'ın hazır olmasını engellemez (circuit breaker 503 döner)
+        return {"client": self.mode, "ready": True, "circuit": self.breaker.state}
+
+
+class LocalRagClient:
+    mode = "local"
+
+    def __init__(self, service):
+        self.service = service
+
+    async def start(self):
+        self.service.start()
+
+    async def close(self):
+        self.service.close()
+
+    def _topk(self, body: Dict) -> List[Dict]:
+        with timed("rag_local"):
+            snap, hits = self.service.topk(
+                body["text"], body.get("k", 4), chief=body.get("chief"),
+                age_group=body.get("age_group"), pregnancy=body.get("pregnancy"),
+            )
+            return snap.engine.render(hits)
+
+    async def topk(self, body: Dict) -> List[Dict]:
+        # Encode + arama CPU işi: event loop'u bloklamasın
+        return await run_in_threadpool(self._topk, body)
+
+    def stats(self) -> Dict:
+        return {"client": self.mode, **self.service.stats()}
+
+    def readiness(self) -> Dict:
+        return {"client": self.mode, "ready": self.service.ready, **self.service.readiness()}
+
+
+def make_rag_client(mode: Optional[str] = None):
+    mode = (mode or settings.RAG_MODE).lower()
+    if mode == "remote":
+        return RemoteRagClient(
+            settings.RAG_URL, settings.RAG_TIMEOUT_S, settings.RAG_POOL_SIZE, settings.RAG_MAX_RETRIES,
+            CircuitBreaker(settings.RAG_CIRCUIT_FAILURES, settings.RAG_CIRCUIT_RESET_S),
+        )
+    if mode == "local":
+        from rag_service import make_service  # model/indeks bağımlılıkları yalnızca local modda
+
+        return LocalRagClient(make_service())
+    raise ValueError(f"Bilinmeyen RAG_MODE: {mode}")
@@ -1,35 +1,37 @@
-from fastapi import FastAPI
+import time
+_IMPORT_T0 = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Response
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-import glob, json, numpy as np
-from sentence_transformers import SentenceTransformer
+from typing import List, Optional
 import logging
-from rapidfuzz import fuzz
-
-app = FastAPI()
-model = SentenceTransformer("intfloat/multilingual-e5-large")  # TR için iyi
-
-# Kartları yükle
-cards = []
-paths = sorted(glob.glob("corpus/triage/*.json"))
-for p in paths:
-    c = json.load(open(p, "r", encoding="utf-8"))
-    rf  = "\n- " + "\n- ".join(c.get("red_flags", [])) if c.get("red_flags") else ""
-    acts= "\n- " + "\n- ".join(c.get("immediate_actions", [])) if c.get("immediate_actions") else ""
-    nxt = "\n- " + "\n- ".join(c.get("questions_to_ask_next", [])) if c.get("questions_to_ask_next") else ""
-    content = f"""{c['title']}
-ESI ipucu: {c.get('esi_hint','-')}
-Red flags:{rf}
-İlk eylemler:{acts}
-Sorulacak ek sorular:{nxt}"""
-    cards.append({"id": c["id"], "meta": c, "content": content})
-
-# Embedding matrisi
-emb_matrix = np.stack([model.encode([c["content"]])[0] for c in cards], axis=0)
-
-def cosine_sim(q, M):
-    qn = q / (np.linalg.norm(q) + 1e-8)
-    Mn = M / (np.linalg.norm(M, axis=1, keepdims=True) + 1e-8)
-    return Mn @ qn
+
+import metrics
+from config import settings
+from metrics import log_event
+from rag_service import make_service
+
+metrics.configure_logging(settings.LOG_LEVEL, settings.LOG_FORMAT)
+
+# Encoder + kart indeksi + micro-batcher (triage_api RAG_MODE=local ile aynı yığın).
+# PRELOAD=true: indeks burada (gunicorn --preload ile master'da) kurulur; aksi halde
+# her worker lifespan'de arka planda ısınır.
+service = make_service()
+index = service.index
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    service.start()  # izleyici + ısınma iş parçacıkları worker başına
+    try:
+        yield
+    finally:
+        service.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 class Query(BaseModel):
     text: str
@@ -38,55 +40,75 @@ class Query(BaseModel):
     pregnancy: str | None = None
     k: int = 4
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
-logger = logging.getLogger(__name__)
+class BatchQuery(BaseModel):
+    queries: List[Query]
 
-def fuzzy_match(query: str, choices: list[str], threshold: int = 70) -> bool:
-    """RapidFuzz ile fuzzy eşleşme"""
-    if not query or not choices:
-        return False
-    return any(fuzz.partial_ratio(query.lower(), c.lower()) >= threshold for c in choices)
+logger = logging.getLogger("rag_memory")
 
 @app.post("/rag/topk")
-def topk(q: Query):
-    logger.info(
-        f"Yeni RAG sorgusu: text='{q.text}', chief={q.chief}, "
-        f"age_group={q.age_group}, pregnancy={q.pregnancy}, k={q.k}"
-    )
-
-    qvec = model.encode([q.text])[0]
-
-    candidates = []
-    for i, c in enumerate(cards):
-        score_chief = fuzzy_match(q.chief, c["meta"].get("complaints", [])) if q.chief else False
-        score_age   = fuzzy_match(q.age_group, c["meta"].get("age_groups", []), threshold=80) if q.age_group else False
-        score_preg  = fuzzy_match(q.pregnancy, c["meta"].get("pregnancy", []), threshold=80) if q.pregnancy else False
-
-        # En az bir filtre eşleşirse aday kabul et
-        if score_chief or score_age or score_preg:
-            candidates.append(i)
-
-    if not candidates:
-        logger.warning("Hiç aday kart bulunamadı (fuzzy filtre eşleşmedi).")
+def topk(q: Query, response: Response):
+    snap, hits = service.topk(q.text, q.k, chief=q.chief, age_group=q.age_group, pregnancy=q.pregnancy)
+    response.headers["X-Index-Version"] = snap.version
+
+    if not hits:
+        log_event(logger, logging.WARNING, "rag.topk.empty", chief=q.chief, age_group=q.age_group,
+                  pregnancy=q.pregnancy)
         return []
 
-    sims = cosine_sim(qvec, emb_matrix[candidates])
-    order = np.array(candidates)[np.argsort(-sims)[:q.k]]
-
-    logger.info(f"Toplam {len(candidates)} aday kart bulundu.")
-    for rank, i in enumerate(order, start=1):
-        logger.info(
-            f"[{rank}] id={cards[i]['id']} title='{cards[i]['meta']['title']}' "
-            f"score={sims[np.where(np.array(candidates)==i)[0][0]]:.4f}"
-        )
-
-    return [
-        {
-            "id": cards[i]["id"],
-            "title": cards[i]["meta"]["title"],
-            "content": cards[i]["content"],
-            "score": float(cosine_sim(qvec, emb_matrix[i:i+1])[0]),
-            "evidence": cards[i]["meta"].get("evidence", []),
-        }
-        for i in order
-    ]
+    # Sorgu başına ayrıntı yalnızca DEBUG'da; kapalıyken liste hiç kurulmaz
+    if logger.isEnabledFor(logging.DEBUG):
+        log_event(logger, logging.DEBUG, "rag.topk", text=q.text, chief=q.chief, age_group=q.age_group,
+                  pregnancy=q.pregnancy, k=q.k, version=snap.version,
+                  hits=[f"{snap.cards[i]['id']}:{score:.4f}" for i, score, *_ in hits])
+
+    return snap.engine.render(hits)
+
+
+@app.post("/rag/topk_batch")
+def topk_batch(body: BatchQuery, response: Response):
+    """Birden çok sorguyu tek encode + tek matris çarpımıyla yanıtlar; sonuçlar sorgu sırasıyla döner."""
+    if len(body.queries) > settings.RAG_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"En fazla {settings.RAG_BATCH_MAX_QUERIES} sorgu gönderilebilir")
+    log_event(logger, logging.DEBUG, "rag.topk_batch", queries=len(body.queries))
+    snap, results = service.topk_batch([q.model_dump() for q in body.queries])
+    response.headers["X-Index-Version"] = snap.version
+    return [snap.engine.render(hits) for hits in results]
+
+
+def _check_admin(token: Optional[str]):
+    if settings.RAG_ADMIN_TOKEN and token != settings.RAG_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Geçersiz admin token")
+
+
+@app.post("/rag/reload")
+def rag_reload(force: bool = False, x_admin_token: Optional[str] = Header(None)):
+    """Korpusu yeniden okur; yalnızca değişen kartlar encode edilir, istekler beklemez."""
+    _check_admin(x_admin_token)
+    return index.reload(force=force)
+
+
+@app.get("/rag/index")
+def rag_index():
+    return service.stats()
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Aşama süreleri (encode, filter, score) ve sayaçlar; Prometheus metin biçimi (süreç başına)."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/healthz")
+def healthz():
+    """Liveness: süreç yanıt veriyor (ısınma sürse de 200)."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: indeks yüklendi ve encoder ısındı (degraded: yalnızca BM25)."""
+    body = {"ready": service.ready, **service.readiness()}
+    return JSONResponse(body, status_code=200 if service.ready else 503)
+
+
+metrics.STARTUP_SECONDS.set(time.perf_counter() - _IMPORT_T0, phase="import")
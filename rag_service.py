@@ -0,0 +1,201 @@
+# rag_service.py
+"""
+Süreç içi retrieval yığını: encoder + embedding önbelleği + IndexManager + micro-batcher.
+
+rag_memory (HTTP servisi) ve triage_api'nin RAG_MODE=local modu aynı sınıfı kullanır.
+Kurulum (indeks yükleme) ile arka plan iş parçacıkları (korpus izleyici, micro-batch)
+ayrıdır: gunicorn --preload ile indeks master süreçte bir kez kurulur ve worker'lara
+copy-on-write paylaşılır; iş parçacıkları fork'tan sağ çıkmadığından start() her
+worker'da ayrıca çağrılır. Kart matrisi ve ANN indeksi zaten mmap'li dosyalardan
+okunduğundan preload olmadan da sayfa önbelleği süreçler arasında ortaktır.
+
+start() indeksi (preload edilmediyse) ve modeli arka planda ısıtır; state "cold" →
+"warming" → "ready" /readyz'de raporlanır. Model yüklenemezse "degraded": istekler
+BM25 ile yanıtlanır. Isınma bitmeden gelen istekler indeks kilidinde bekler, reddedilmez.
+"""
+import logging, threading, time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from corpus_index import IndexManager, IndexSnapshot
+from embedding_cache import EmbeddingCache
+from encoders import make_encoder
+from metrics import STARTUP_SECONDS, timed
+from microbatch import MicroBatcher
+from query_cache import QueryCache, normalize_query
+
+logger = logging.getLogger("rag_service")
+
+
+class RetrievalService:
+    def __init__(self, load: bool = True):
+        # EMBED_BACKEND=st|onnx; model ilk ihtiyaçta yüklenir, önbellek sıcaksa açılışta hiç yüklenmez
+        self.encoder = make_encoder()
+        self.sparse_only = settings.RAG_RETRIEVAL_MODE == "sparse"
+        # Eşzamanlı tekil sorguların encode'larını tek forward pass'te birleştirir
+        # (iş parçacığı ilk submit'te başlar: fork öncesi oluşturmak güvenli)
+        self.batcher = MicroBatcher(
+            self.encoder.encode_queries,
+            window_ms=settings.RAG_MICROBATCH_WINDOW_MS,
+            max_batch=settings.RAG_MICROBATCH_MAX_SIZE,
+        ) if settings.RAG_MICROBATCH_ENABLED else None
+        # Önbellek anahtarı encoder adını içerir: backend/model değişince kartlar yeniden encode edilir
+        self.emb_cache = EmbeddingCache(settings.EMBED_CACHE_DIR, self.encoder.name)
+        # Kart indeksi: değişmez anlık görüntü; korpus değişince yalnızca fark encode edilip
+        # yeni görüntü atomik olarak devreye alınır (yeniden başlatma gerekmez)
+        self.index = IndexManager(
+            settings.RAG_CORPORA, self.emb_cache, None if self.sparse_only else self.encoder.encode_passages,
+            engine_opts={"matrix_dtype": settings.RAG_MATRIX_DTYPE, "rescore_factor": settings.RAG_RESCORE_FACTOR,
+                         "mode": settings.RAG_RETRIEVAL_MODE, "rrf_k": settings.RAG_RRF_K,
+                         "rrf_depth": settings.RAG_RRF_DEPTH},
+            ann_opts={"kind": settings.RAG_ANN, "min_cards": settings.RAG_ANN_MIN_CARDS,
+                      "nprobe": settings.RAG_ANN_NPROBE, "dir": settings.RAG_ANN_DIR},
+            chunking=settings.RAG_CHUNKING,
+        )
+        # Sık tekrarlanan başvurular (aynı şikayet + filtreler) encode ve aramaya hiç gitmez
+        self.cache = QueryCache(
+            vector_maxsize=settings.RAG_VECTOR_CACHE_MAX_ITEMS, vector_ttl=settings.RAG_VECTOR_CACHE_TTL_S,
+            result_maxsize=settings.RAG_RESULT_CACHE_MAX_ITEMS, result_ttl=settings.RAG_RESULT_CACHE_TTL_S,
+            enabled=settings.RAG_QUERY_CACHE_ENABLED,
+        )
+        self.state = "cold"
+        self.error: Optional[str] = None
+        self.model_loaded = False
+        self._warmup_thread: Optional[threading.Thread] = None
+        if load:
+            self.load_index()
+
+    def load_index(self):
+        t0 = time.perf_counter()
+        self.index.reload()
+        STARTUP_SECONDS.set(time.perf_counter() - t0, phase="index")
+
+    def preload_model(self):
+        """Model ağırlıklarını çıkarım yapmadan yükler (fork öncesi paylaşım için)."""
+        if self.sparse_only:
+            return
+        t0 = time.perf_counter()
+        model = getattr(self.encoder, "model", None)  # yalnızca SentenceTransformer backend'i
+        if model is None:
+            logger.warning("Encoder %s fork öncesi yüklenemez; worker'da yüklenecek", self.encoder.name)
+            return
+        self.model_loaded = True
+        STARTUP_SECONDS.set(time.perf_counter() - t0, phase="model")
+
+    @property
+    def ready(self) -> bool:
+        return self.state in ("ready", "degraded")
+
+    def warmup(self):
+        """İndeksi yükler ve tek bir sorgu encode eder: ilk gerçek istek model yüklemesini beklemez."""
+        self.state = "warming"
+        t0 = time.perf_counter()
+        try:
+            if not self.index.loaded:
+                self.load_index()
+        except Exception as e:
+            self.state, self.error = "failed", f"{type(e).__name__}: {e}"
+            logger.exception("RAG indeksi yüklenemedi")
+            return
+        state = "ready"
+        if not self.sparse_only:
+            tm = time.perf_counter()
+            try:
+                self.encoder.encode_queries(["warmup"])
+            except Exception as e:
+                # Dense yol kullanılamıyor; istekler BM25 ile yanıtlanır
+                state, self.error = "degraded", f"{type(e).__name__}: {e}"
+                logger.exception("Encoder ısınması başarısız; BM25 ile devam ediliyor")
+            else:
+                if not self.model_loaded:
+                    STARTUP_SECONDS.set(time.perf_counter() - tm, phase="model")
+                self.model_loaded = True
+        STARTUP_SECONDS.set(time.perf_counter() - t0, phase="warmup")
+        self.state = state
+
+    def start(self):
+        """Süreç başına arka plan iş parçacıkları (fork sonrası çağrılmalı)."""
+        self.index.start_watcher(settings.RAG_WATCH_INTERVAL_S)
+        if self._warmup_thread is None:
+            t = threading.Thread(target=self.warmup, name="rag-warmup", daemon=True)
+            t.start()
+            self._warmup_thread = t
+
+    def readiness(self) -> Dict:
+        snap = self.index.current if self.index.loaded else None
+        return {"state": self.state, "error": self.error, "index_version": snap.version if snap else None,
+                "model_loaded": self.model_loaded or self.sparse_only}
+
+    def close(self):
+        self.index.stop_watcher()
+        if self.batcher:
+            self.batcher.close()
+
+    # ---- Sorgu ----
+    def query_vectors(self, texts: List[str], single: bool = False):
+        """
+        Sorgu embedding'leri; önbellek anahtarı normalize metin, encode edilen özgün metindir.
+        Encoder hata verirse None → arama yalnızca BM25 ile yapılır.
+        """
+        if self.sparse_only:
+            return None
+        keys = [normalize_query(t) for t in texts]
+        vecs = [self.cache.get_vector(key) for key in keys]
+        missing = [i for i, v in enumerate(vecs) if v is None]
+        if missing:
+            try:
+                with timed("encode"):
+                    if single and len(missing) == 1 and self.batcher:
+                        encoded = [self.batcher.encode(texts[missing[0]])]
+                    else:
+                        encoded = self.encoder.encode_queries([texts[i] for i in missing])
+            except Exception:
+                logger.exception("Sorgu encode edilemedi; BM25 ile yanıtlanıyor")
+                return None
+            for i, v in zip(missing, encoded):
+                self.cache.set_vector(keys[i], v)
+                vecs[i] = v
+        return vecs[0] if single else np.stack(vecs)
+
+    def topk(self, text: str, k: int = 4, chief: Optional[str] = None, age_group: Optional[str] = None,
+             pregnancy: Optional[str] = None) -> Tuple[IndexSnapshot, List[Tuple[int, float]]]:
+        snap = self.index.current  # istek boyunca tek görüntü
+        key = self.cache.result_key(normalize_query(text), k, chief, age_group, pregnancy, snap.version)
+        hits = self.cache.get_hits(key)
+        if hits is not None:
+            return snap, hits
+        qvec = self.query_vectors([text], single=True)
+        hits = snap.engine.search(qvec, k, chief=chief, age_group=age_group, pregnancy=pregnancy, text=text)
+        if qvec is not None or self.sparse_only:  # encoder hatasındaki BM25 yedeği önbelleğe girmez
+            self.cache.set_hits(key, hits)
+        return snap, hits
+
+    def topk_batch(self, queries: List[Dict]) -> Tuple[IndexSnapshot, List[List[Tuple[int, float]]]]:
+        snap = self.index.current
+        if not queries:
+            return snap, []
+        keys = [self.cache.result_key(normalize_query(q["text"]), q.get("k", 4), q.get("chief"), q.get("age_group"),
+                                      q.get("pregnancy"), snap.version) for q in queries]
+        results = [self.cache.get_hits(key) for key in keys]
+        missing = [i for i, hits in enumerate(results) if hits is None]
+        if missing:
+            todo = [queries[i] for i in missing]
+            qmat = self.query_vectors([q["text"] for q in todo])
+            for i, hits in zip(missing, snap.engine.search_many(qmat, todo)):
+                results[i] = hits
+                if qmat is not None or self.sparse_only:
+                    self.cache.set_hits(keys[i], hits)
+        return snap, results
+
+    def stats(self) -> Dict:
+        return {**self.index.stats(), "embedding_cache": self.emb_cache.stats(), "query_cache": self.cache.stats()}
+
+
+def make_service() -> RetrievalService:
+    """PRELOAD ayarına göre kurulum şimdi (master) veya start()'ta (worker, arka plan)."""
+    service = RetrievalService(load=settings.PRELOAD)
+    if settings.PRELOAD and settings.PRELOAD_MODEL:
+        service.preload_model()
+    return service
@@ -0,0 +1,352 @@
+# retrieval.py
+"""
+Kart arama motoru: normalize edilmiş embedding matrisi + BM25 + ön hesaplanmış filtre indeksi.
+
+Sorgu başına maliyet: bir matris-vektör çarpımı ve argpartition. Chief/age_group/pregnancy
+filtreleri, meta alanlarının küçük harfe çevrilmiş (query_cache.fold_case) sözlüğü üzerindeki ters indeksten
+boolean maske olarak gelir; RapidFuzz yalnızca daha önce görülmemiş sorgu değerleri için
+(tüm sözlük üzerinde tek bir cdist çağrısıyla) çalışır.
+"""
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+from bm25 import BM25Index
+from metrics import observe_stage
+from query_cache import fold_case
+
+# Sorgu değeri → maske önbelleği için üst sınır
+MAX_MEMO = 4096
+# Quantize matris skorlanırken bir seferde float32'ye açılan satır sayısı
+SCORE_BLOCK = 8192
+
+
+def normalize_rows(M: np.ndarray) -> np.ndarray:
+    M = np.asarray(M, dtype=np.float32)
+    return M / (np.linalg.norm(M, axis=1, keepdims=True) + 1e-8)
+
+
+class FilterIndex:
+    """Tek bir meta alanı (örn. complaints) için değer → kart maskesi ters indeksi."""
+
+    def __init__(self, values_per_card: Sequence[Sequence[str]], threshold: int):
+        self.threshold = threshold
+        self.n_cards = len(values_per_card)
+        vocab: Dict[str, int] = {}
+        postings: List[List[int]] = []
+        for i, values in enumerate(values_per_card):
+            for v in values or []:
+                key = fold_case(v)
+                j = vocab.setdefault(key, len(vocab))
+                if j == len(postings):
+                    postings.append([])
+                postings[j].append(i)
+        self.vocab = list(vocab)
+        self.masks = np.zeros((len(self.vocab), self.n_cards), dtype=bool)
+        for j, rows in enumerate(postings):
+            self.masks[j, rows] = True
+        self._memo: Dict[str, np.ndarray] = {}
+
+    def match(self, query: Optional[str]) -> np.ndarray:
+        """partial_ratio(query, değer) >= threshold olan en az bir değere sahip kartlar."""
+        if not query or not self.vocab:
+            return np.zeros(self.n_cards, dtype=bool)
+        q = fold_case(query)
+        mask = self._memo.get(q)
+        if mask is not None:
+            return mask
+
+        scores = process.cdist([q], self.vocab, scorer=fuzz.partial_ratio,
+                               score_cutoff=self.threshold)[0]
+        hits = np.flatnonzero(scores >= self.threshold)
+        mask = self.masks[hits].any(axis=0) if hits.size else np.zeros(self.n_cards, dtype=bool)
+        mask.setflags(write=False)
+
+        if len(self._memo) >= MAX_MEMO:
+            self._memo.clear()
+        self._memo[q] = mask
+        return mask
+
+
+def row_texts(card: Dict) -> List[str]:
+    """Kartın indekslenen satırları: parçalara bölünmüşse parçalar, değilse tüm içerik."""
+    chunks = card.get("chunks")
+    return [text for _, text in chunks] if chunks else [card["content"]]
+
+
+class RetrievalEngine:
+    """
+    Matris satırları kart parçalarıdır (card["chunks"]; yoksa kart başına tek satır).
+    Parça skorları kart bazında max ile toplanır; filtreler ve sonuçlar kart düzeyindedir.
+
+    mode:
+        dense   yalnızca embedding kosinüsü
+        sparse  yalnızca BM25 (encoder gerekmez)
+        hybrid  dense ve BM25 kart sıralamaları reciprocal rank fusion ile birleşir;
+                sıralama rrf = Σ 1 / (rrf_k + sıra) ile yapılır, skor yine kartın dense
+                kosinüsüdür (sonuç (kart, kosinüs, rrf) üçlüsü; render'da rrf_score)
+    BM25 her zaman kurulur: sorgu vektörü yoksa (encoder hatası) arama BM25'e düşer.
+
+    matrix_dtype float32 dışındaysa normalize matris float16 veya int8 (satır başı ölçek)
+    olarak tutulur; skorlama blok blok float32'ye açılarak yapılır. İlk
+    k*rescore_factor aday, verilen fp32 matrisin (genelde EmbeddingCache mmap'i)
+    yalnızca ilgili satırlarıyla yeniden skorlanır; dönen skorlar fp32 kosinüstür.
+
+    ann verilirse (ann.IVFIndex / HnswIndex, satır kimliği = matris satırı) yoğun matris
+    tutulmaz; filtre maskesi indekse geçirilir ve arama yaklaşık yapılır.
+    """
+
+    def __init__(self, cards: List[Dict], matrix: Optional[np.ndarray],
+                 matrix_dtype: str = "float32", rescore_factor: int = 4, ann=None,
+                 mode: str = "dense", rrf_k: int = 60, rrf_depth: int = 50):
+        if mode not in ("dense", "sparse", "hybrid"):
+            raise ValueError(f"Bilinmeyen retrieval mode: {mode}")
+        self.cards = cards
+        self.ann = ann
+        self.rescore_factor = max(1, rescore_factor)
+        self.rrf_k = rrf_k
+        self.rrf_depth = rrf_depth
+        self.scales: Optional[np.ndarray] = None
+        self._exact: Optional[np.ndarray] = None
+        self._build_filters(cards)
+
+        texts = [t for c in cards for t in row_texts(c)]
+        self.row_counts = np.array([len(row_texts(c)) for c in cards], dtype=np.int64)
+        self.row_card = np.repeat(np.arange(len(cards)), self.row_counts)
+        self.card_offsets = np.cumsum(self.row_counts) - self.row_counts
+        self.chunked = len(texts) != len(cards)
+        self.max_rows = int(self.row_counts.max()) if len(cards) else 1
+        self.sparse = BM25Index(texts)
+
+        self.has_dense = matrix is not None or ann is not None
+        self.mode = mode if self.has_dense else "sparse"
+        self.matrix_dtype = "ann" if ann is not None else (matrix_dtype if matrix is not None else None)
+        self.matrix = None
+        if ann is not None or matrix is None:
+            return
+        M = np.asarray(matrix, dtype=np.float32)
+        # L2 normalizasyonu yüklemede bir kez yapılır
+        norms = np.linalg.norm(M, axis=1, keepdims=True) + 1e-8
+        N = M / norms
+        if matrix_dtype == "float32":
+            self.matrix = N
+        elif matrix_dtype in ("float16", "int8"):
+            if matrix_dtype == "float16":
+                self.matrix = N.astype(np.float16)
+            else:
+                # Simetrik satır başı quantize: x ≈ q * scale, q ∈ [-127, 127]
+                scale = np.abs(N).max(axis=1) / 127.0 + 1e-12
+                self.matrix = np.round(N / scale[:, None]).astype(np.int8)
+                self.scales = scale.astype(np.float32)
+            # Rescore için fp32 kaynak: mmap ise bellekte yalnızca dokunulan satırlar durur
+            self._exact = matrix
+            self._inv_norms = (1.0 / norms[:, 0]).astype(np.float32)
+        else:
+            raise ValueError(f"Bilinmeyen matrix_dtype: {matrix_dtype}")
+
+    def _build_filters(self, cards: List[Dict]):
+        self.chief_index = FilterIndex([c["meta"].get("complaints", []) for c in cards], threshold=70)
+        self.age_index = FilterIndex([c["meta"].get("age_groups", []) for c in cards], threshold=80)
+        self.preg_index = FilterIndex([c["meta"].get("pregnancy", []) for c in cards], threshold=80)
+
+    @property
+    def nbytes(self) -> int:
+        """Skorlama matrisinin bellekteki boyutu (rescore kaynağı hariç)."""
+        if self.ann is not None:
+            return self.ann.nbytes
+        if self.matrix is None:
+            return 0
+        return int(self.matrix.nbytes + (self.scales.nbytes if self.scales is not None else 0))
+
+    def __len__(self) -> int:
+        return len(self.cards)
+
+    def candidate_mask(
+        self,
+        chief: Optional[str] = None,
+        age_group: Optional[str] = None,
+        pregnancy: Optional[str] = None,
+    ) -> np.ndarray:
+        # En az bir filtre eşleşirse aday kabul et
+        return (
+            self.chief_index.match(chief)
+            | self.age_index.match(age_group)
+            | self.preg_index.match(pregnancy)
+        )
+
+    def search(
+        self,
+        qvec: Optional[np.ndarray],
+        k: int,
+        chief: Optional[str] = None,
+        age_group: Optional[str] = None,
+        pregnancy: Optional[str] = None,
+        text: Optional[str] = None,
+    ) -> List[Tuple[int, float]]:
+        """(kart indeksi, skor) çiftlerini sıralı döndürür; hybrid'de (kart indeksi, kosinüs, rrf) üçlüleri."""
+        t0 = time.perf_counter()
+        mask = self.candidate_mask(chief, age_group, pregnancy)
+        t1 = time.perf_counter()
+        observe_stage("filter", t1 - t0)
+        if k <= 0 or not mask.any():
+            return []
+        q = None
+        if qvec is not None:
+            q = np.asarray(qvec, dtype=np.float32)
+            q = q / (np.linalg.norm(q) + 1e-8)
+        hits = self._search_one(q, text, mask, k)
+        observe_stage("score", time.perf_counter() - t1)
+        return hits
+
+    def search_many(self, qmat: Optional[np.ndarray], params: Sequence[Dict]) -> List[List[Tuple[int, float]]]:
+        """
+        Birden çok sorguyu tek matris çarpımıyla skorlar.
+        params[i]: {"k", "chief", "age_group", "pregnancy", "text"}
+        """
+        t0 = time.perf_counter()
+        filter_s = 0.0
+        Q = S = None
+        if qmat is not None:
+            Q = np.asarray(qmat, dtype=np.float32)
+            Q = Q / (np.linalg.norm(Q, axis=1, keepdims=True) + 1e-8)
+            if self.matrix is not None and self.mode != "sparse":
+                S = Q @ self.matrix.T if self._exact is None else self._scores(Q)
+        out = []
+        for i, p in enumerate(params):
+            tf = time.perf_counter()
+            mask = self.candidate_mask(p.get("chief"), p.get("age_group"), p.get("pregnancy"))
+            filter_s += time.perf_counter() - tf
+            k = p.get("k", 4)
+            if k <= 0 or not mask.any():
+                out.append([])
+                continue
+            out.append(self._search_one(None if Q is None else Q[i], p.get("text"), mask, k,
+                                        None if S is None else S[i]))
+        # Batch için tek gözlem: filtreler toplamı ve geri kalan skorlama
+        observe_stage("filter", filter_s)
+        observe_stage("score", time.perf_counter() - t0 - filter_s)
+        return out
+
+    def _search_one(self, q: Optional[np.ndarray], text: Optional[str], mask: np.ndarray, k: int,
+                    row_scores: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        use_dense = q is not None and self.has_dense and self.mode != "sparse"
+        use_sparse = bool(text) and (self.mode != "dense" or not use_dense)
+        if use_dense and use_sparse:
+            depth = max(k, self.rrf_depth)
+            fused = self._fuse([self._dense(q, mask, depth, row_scores), self._sparse(text, mask, depth)], k)
+            if not fused:
+                return []
+            cards = np.fromiter((i for i, _ in fused), dtype=np.int64, count=len(fused))
+            return [(i, float(c), rrf) for (i, rrf), c in zip(fused, self._cosines(q, cards))]
+        if use_dense:
+            return self._dense(q, mask, k, row_scores)
+        if use_sparse:
+            return self._sparse(text, mask, k)
+        return []
+
+    # ---- Dense ----
+    def _card_max(self, row_scores: np.ndarray) -> np.ndarray:
+        if not self.chunked:
+            return row_scores
+        return np.maximum.reduceat(row_scores, self.card_offsets, axis=-1)
+
+    def _dense(self, q: np.ndarray, mask: np.ndarray, k: int,
+               row_scores: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        if self.ann is not None:
+            return self._ann_search(q, k, mask)
+        if self._exact is None:
+            s = row_scores if row_scores is not None else self.matrix @ q
+            return self._top(self._card_max(s), mask, k)
+        s = row_scores if row_scores is not None else self._scores(q[None, :])[0]
+        coarse = self._top(self._card_max(s), mask, k * self.rescore_factor)
+        return self._rescore(q, coarse, k)
+
+    def _ann_search(self, q: np.ndarray, k: int, mask: np.ndarray) -> List[Tuple[int, float]]:
+        row_mask = mask[self.row_card] if self.chunked else mask
+        ids, scores = self.ann.search(q, k * self.max_rows, row_mask)
+        cards = self.row_card[ids]
+        # Sonuçlar skora göre azalan: kartın ilk görüldüğü satır en iyi parçasıdır
+        _, first = np.unique(cards, return_index=True)
+        first = np.sort(first)[:k]
+        return [(int(cards[j]), float(scores[j])) for j in first]
+
+    def _scores(self, Q: np.ndarray) -> np.ndarray:
+        """Quantize matris için (B, n) yaklaşık skorlar; bloklar float32'ye açılarak BLAS ile."""
+        n = self.matrix.shape[0]
+        S = np.empty((Q.shape[0], n), dtype=np.float32)
+        for s in range(0, n, SCORE_BLOCK):
+            S[:, s:s + SCORE_BLOCK] = Q @ self.matrix[s:s + SCORE_BLOCK].astype(np.float32).T
+        if self.scales is not None:
+            S *= self.scales
+        return S
+
+    def _cosines(self, q: np.ndarray, cards: np.ndarray) -> np.ndarray:
+        """Verilen kartların fp32 kosinüsü (parçalarının en iyisi)."""
+        counts = self.row_counts[cards]
+        owner = np.repeat(np.arange(len(cards)), counts)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        rows = np.repeat(self.card_offsets[cards], counts) + within
+        order = np.argsort(rows)  # mmap'te sıralı erişim
+        rows, owner = rows[order], owner[order]
+        if self.ann is not None:
+            exact = self.ann.vectors(rows) @ q
+        elif self._exact is not None:
+            exact = (np.asarray(self._exact[rows], dtype=np.float32) @ q) * self._inv_norms[rows]
+        else:
+            exact = self.matrix[rows] @ q
+        best = np.full(len(cards), -np.inf, dtype=np.float32)
+        np.maximum.at(best, owner, exact)
+        return best
+
+    def _rescore(self, q: np.ndarray, coarse: List[Tuple[int, float]], k: int) -> List[Tuple[int, float]]:
+        if not coarse:
+            return []
+        cards = np.fromiter((i for i, _ in coarse), dtype=np.int64, count=len(coarse))
+        best = self._cosines(q, cards)
+        top = np.argsort(-best, kind="stable")[:k]
+        return [(int(cards[j]), float(best[j])) for j in top]
+
+    # ---- Sparse / füzyon ----
+    def _sparse(self, text: str, mask: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        scores = self._card_max(self.sparse.scores(text))
+        hit = mask & (scores > 0)
+        if not hit.any():
+            return []
+        return self._top(scores, hit, k)
+
+    def _fuse(self, rankings: List[List[Tuple[int, float]]], k: int) -> List[Tuple[int, float]]:
+        rankings = [r for r in rankings if r]
+        if not rankings:
+            return []
+        ids = np.concatenate([np.fromiter((i for i, _ in r), dtype=np.int64, count=len(r)) for r in rankings])
+        w = np.concatenate([1.0 / (self.rrf_k + np.arange(1, len(r) + 1)) for r in rankings])
+        uniq, inv = np.unique(ids, return_inverse=True)
+        fused = np.bincount(inv, weights=w)
+        top = np.argsort(-fused, kind="stable")[:k]
+        return [(int(uniq[j]), float(fused[j])) for j in top]
+
+    @staticmethod
+    def _top(scores: np.ndarray, mask: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        k = min(k, int(np.count_nonzero(mask)))
+        scores = np.where(mask, scores, -np.inf)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def render(self, hits: List[Tuple]) -> List[Dict]:
+        out = []
+        for i, score, *rrf in hits:
+            item = {
+                "id": self.cards[i]["id"],
+                "title": self.cards[i]["meta"]["title"],
+                "content": self.cards[i]["content"],
+                "score": score,
+                "evidence": self.cards[i]["meta"].get("evidence", []),
+                "corpus": self.cards[i].get("corpus"),
+            }
+            if rrf:
+                item["rrf_score"] = rrf[0]  # hybrid: sıralamayı belirleyen füzyon skoru
+            out.append(item)
+        return out
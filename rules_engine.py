@@ -0,0 +1,270 @@
+# rules_engine.py
+"""
+Vital bulgulara dayalı deterministik hızlı yol.
+
+Kartlardaki red_flags metinlerinden ("SpO2 < 92 veya sistolik TA < 90",
+"Taşipne > 30/dk", "Taşikardi + hipotansiyon" ...) vital eşikleri çıkarılır ve
+tüm korpus tek bir vektörize predikat tablosuna derlenir:
+
+    flag  = AND( grup_1, grup_2, ... )      ("+" ile ayrılan parçalar)
+    grup  = OR( predikat_1, predikat_2 ...) ("veya" / "ya da" ile ayrılan parçalar)
+    predikat = vital[i] (< | >) eşik
+
+Değerlendirme tek bir numpy karşılaştırması ve iki reduceat çağrısıdır.
+Vital içermeyen flag'ler (örn. "Göçük Hissiyatı") derlenmez; onlar LLM'e kalır.
+
+Eşikler erişkin eşikleridir. 18 yaş altında global kurallar, adlandırılmış terimler
+(taşikardi, taşipne ...) ve yaşa bağlı vitallere (nabız, solunum, tansiyon) dayanan
+flag'ler değerlendirilmez; yaş bantlı eşikler gelene kadar karar LLM'e kalır.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+VITALS = ("spo2", "sbp", "dbp", "hr", "rr", "temp")
+_VIDX = {v: i for i, v in enumerate(VITALS)}
+
+# Giriş anahtarları (frontend: pulse/temperature/oxygen/blood_pressure/respiratory_rate)
+VITAL_KEYS = {
+    "spo2": ("spo2", "oxygen", "o2", "sat", "saturation", "sao2"),
+    "hr": ("hr", "pulse", "nabiz", "nabız", "heart_rate"),
+    "rr": ("rr", "respiratory_rate", "solunum", "resp"),
+    "temp": ("temp", "temperature", "ates", "ateş", "fever"),
+    "bp": ("bp", "blood_pressure", "ta", "tansiyon"),
+    "sbp": ("sbp", "systolic", "sistolik"),
+    "dbp": ("dbp", "diastolic", "diyastolik"),
+}
+
+_NUM = r"(\d+(?:[.,]\d+)?)"
+
+# Sayısal eşik içeren ifadeler: (regex, vital); operatör ve eşik metinden okunur
+_THRESHOLD_PATTERNS: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"spo2\s*\(?\s*([<>])\s*" + _NUM), "spo2"),
+    (re.compile(r"sistolik\s*(?:ta)?\s*\(?\s*([<>])\s*" + _NUM), "sbp"),
+    (re.compile(r"diyastolik\s*(?:ta)?\s*\(?\s*([<>])\s*" + _NUM), "dbp"),
+    (re.compile(r"(?:nabız|taşikardi|bradikardi)\s*\(?\s*([<>])\s*" + _NUM), "hr"),
+    (re.compile(r"(?:taşipne|solunum sayısı|solunum)\s*\(?\s*([<>])\s*" + _NUM), "rr"),
+    (re.compile(r"ateş\s*\(?\s*([<>])\s*" + _NUM), "temp"),
+]
+
+# Sayı içermeyen ama vitalden karar verilebilen terimler (erişkin eşikleri)
+_NAMED_TERMS: List[Tuple[re.Pattern, str, str, float]] = [
+    (re.compile(r"^(?:şiddetli\s+)?hipotansiyon$"), "sbp", "<", 90),
+    (re.compile(r"^şiddetli\s+bradikardi$"), "hr", "<", 40),
+    (re.compile(r"^bradikardi$"), "hr", "<", 50),
+    (re.compile(r"^şiddetli\s+taşikardi$"), "hr", ">", 150),
+    (re.compile(r"^taşikardi$"), "hr", ">", 100),
+    (re.compile(r"^taşipne$"), "rr", ">", 24),
+    (re.compile(r"^hipoksi$"), "spo2", "<", 92),
+]
+
+# Karttan bağımsız, tek başına ESI belirleyen eşikler (aynı sözdizimiyle)
+GLOBAL_RULES: List[Tuple[str, str]] = [
+    ("SpO2 < 85", "ESI-1"),
+    ("sistolik TA < 80", "ESI-1"),
+    ("Nabız < 40 veya Nabız > 150", "ESI-2"),
+    ("SpO2 < 90", "ESI-2"),
+    ("sistolik TA < 90", "ESI-2"),
+    ("Solunum > 30", "ESI-2"),
+]
+
+# Çocukta normal aralığı erişkinden farklı vitaller
+AGE_DEPENDENT_VITALS = ("hr", "rr", "sbp", "dbp")
+ADULT_AGE = 18
+
+Predicate = Tuple[int, bool, float]  # (vital index, küçük mü?, eşik)
+
+
+def _to_float(raw) -> float:
+    m = re.search(r"-?\d+(?:[.,]\d+)?", str(raw))
+    return float(m.group(0).replace(",", ".")) if m else float("nan")
+
+
+def parse_vitals(vitals: Optional[Dict]) -> np.ndarray:
+    """Serbest formatlı vital sözlüğünü sabit sıralı float vektörüne çevirir (eksikler NaN)."""
+    out = np.full(len(VITALS), np.nan, dtype=np.float64)
+    if not vitals:
+        return out
+    lowered = {str(k).strip().lower(): v for k, v in vitals.items()}
+    for name, keys in VITAL_KEYS.items():
+        raw = next((lowered[k] for k in keys if k in lowered and lowered[k] not in (None, "")), None)
+        if raw is None:
+            continue
+        if name == "bp":
+            nums = re.findall(r"\d+(?:[.,]\d+)?", str(raw))
+            if nums:
+                out[_VIDX["sbp"]] = float(nums[0].replace(",", "."))
+            if len(nums) > 1:
+                out[_VIDX["dbp"]] = float(nums[1].replace(",", "."))
+        else:
+            out[_VIDX[name]] = _to_float(raw)
+    return out
+
+
+def _parse_clause(text: str) -> Optional[Predicate]:
+    t = " ".join(text.lower().split()).strip(" .;")
+    for rx, vital in _THRESHOLD_PATTERNS:
+        m = rx.search(t)
+        if m:
+            return (_VIDX[vital], m.group(1) == "<", float(m.group(2).replace(",", ".")))
+    for rx, vital, op, th in _NAMED_TERMS:
+        if rx.match(t):
+            return (_VIDX[vital], op == "<", float(th))
+    return None
+
+
+def is_adult(age: Optional[int]) -> bool:
+    """Yaş bilinmiyorsa erişkin kabul edilir (eski davranış)."""
+    return age is None or age >= ADULT_AGE
+
+
+def adult_only(text: str) -> bool:
+    """Flag erişkin eşiğine mi dayanıyor: adlandırılmış terim veya yaşa bağlı vital."""
+    groups = compile_flag(text)
+    if groups is None:
+        return False
+    clauses = [" ".join(c.lower().split()).strip(" .;")
+               for part in re.split(r"\s*\+\s*", text) for c in re.split(r"\s+(?:veya|ya da)\s+", part)]
+    if any(rx.match(c) for c in clauses for rx, *_ in _NAMED_TERMS):
+        return True
+    dependent = {_VIDX[v] for v in AGE_DEPENDENT_VITALS}
+    return any(vi in dependent for preds in groups for vi, _, _ in preds)
+
+
+def compile_flag(text: str) -> Optional[List[List[Predicate]]]:
+    """Flag metnini AND-of-OR predikat yapısına çevirir; vitalle karar verilemiyorsa None."""
+    groups: List[List[Predicate]] = []
+    for part in re.split(r"\s*\+\s*", text):
+        clauses = re.split(r"\s+(?:veya|ya da)\s+", part)
+        preds = [_parse_clause(c) for c in clauses]
+        if not preds or any(p is None for p in preds):
+            return None
+        groups.append(preds)
+    return groups or None
+
+
+@dataclass
+class RuleResult:
+    level: Optional[str] = None                                  # kesin ESI-1/ESI-2 ise dolu
+    flags: List[str] = field(default_factory=list)               # tetiklenen red flag metinleri
+    card_flags: Dict[str, List[str]] = field(default_factory=dict)  # kart id → tetiklenen flag'ler
+    global_hits: List[str] = field(default_factory=list)
+
+
+class RuleEngine:
+    def __init__(self, cards: Sequence[Dict], global_rules: Sequence[Tuple[str, str]] = GLOBAL_RULES):
+        self.cards = {c["id"]: c for c in cards}
+        # (sahip, flag metni) sırasıyla derlenmiş flag listesi; sahip "" → global kural
+        self.flag_owner: List[str] = []
+        self.flag_text: List[str] = []
+        self.flag_level: List[Optional[str]] = []
+        adult: List[bool] = []  # yalnızca erişkinde değerlendirilir
+        var_idx, is_lt, thresh, group_starts, flag_starts = [], [], [], [], []
+
+        def add(owner: str, text: str, level: Optional[str]):
+            groups = compile_flag(text)
+            if groups is None:
+                return
+            flag_starts.append(len(group_starts))
+            for preds in groups:
+                group_starts.append(len(var_idx))
+                for vi, lt, th in preds:
+                    var_idx.append(vi)
+                    is_lt.append(lt)
+                    thresh.append(th)
+            self.flag_owner.append(owner)
+            self.flag_text.append(text)
+            self.flag_level.append(level)
+            adult.append(owner == "" or adult_only(text))
+
+        for text, level in global_rules:
+            add("", text, level)
+        for c in cards:
+            for rf in c["meta"].get("red_flags", []) or []:
+                add(c["id"], rf, None)
+
+        self._var_idx = np.asarray(var_idx, dtype=np.intp)
+        self._is_lt = np.asarray(is_lt, dtype=bool)
+        self._thresh = np.asarray(thresh, dtype=np.float64)
+        self._group_starts = np.asarray(group_starts, dtype=np.intp)
+        self._flag_starts = np.asarray(flag_starts, dtype=np.intp)
+        self._adult_only = np.asarray(adult, dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.flag_text)
+
+    def fired(self, vitals: Optional[Dict], age: Optional[int] = None) -> np.ndarray:
+        """Her derlenmiş flag için tetiklendi mi (bool vektör); çocukta erişkin eşikleri False."""
+        if not len(self._var_idx):
+            return np.zeros(0, dtype=bool)
+        v = parse_vitals(vitals)[self._var_idx]
+        with np.errstate(invalid="ignore"):
+            res = np.where(self._is_lt, v < self._thresh, v > self._thresh)  # NaN → False
+        group_hit = np.logical_or.reduceat(res, self._group_starts)
+        hit = np.logical_and.reduceat(group_hit, self._flag_starts)
+        return hit if is_adult(age) else hit & ~self._adult_only
+
+    def evaluate(self, vitals: Optional[Dict], card_ids: Sequence[str] = (), age: Optional[int] = None) -> RuleResult:
+        """
+        card_ids: vakanın RAG kartları; yalnızca bunların flag'leri raporlanır.
+        age: 18 altında erişkin eşikli flag'ler atlanır ve level hep None'dır.
+        level: global kurallardan en yüksek aciliyet; yoksa yüksek öncelikli bir RAG kartı
+        vital flag'i tetiklediyse ESI-2; aksi halde None (karar LLM'de).
+        """
+        hits = np.flatnonzero(self.fired(vitals, age))
+        out = RuleResult()
+        wanted = set(card_ids)
+        for i in hits:
+            owner, text = self.flag_owner[i], self.flag_text[i]
+            if owner == "":
+                out.global_hits.append(text)
+                lvl = self.flag_level[i]
+                if out.level is None or (lvl and lvl < out.level):
+                    out.level = lvl
+            elif owner in wanted:
+                out.card_flags.setdefault(owner, []).append(text)
+        # Kart flag'i tek başına ancak yüksek öncelikli kartlarda (göğüs ağrısı, dispne...)
+        # kesin kabul edilir; ateş gibi orta/düşük öncelikli kart flag'leri LLM'e bırakılır
+        if out.level is None and any(self._high_priority(cid) for cid in out.card_flags):
+            out.level = "ESI-2"
+        if not is_adult(age):
+            out.level = None  # hızlı yol yalnızca erişkinde
+        seen = set()
+        for cid in card_ids:
+            for t in out.card_flags.get(cid, []):
+                if t not in seen:
+                    seen.add(t)
+                    out.flags.append(t)
+        for t in out.global_hits:
+            if t not in seen:
+                seen.add(t)
+                out.flags.append(t)
+        return out
+
+    def _high_priority(self, card_id: str) -> bool:
+        hint = self.cards.get(card_id, {}).get("meta", {}).get("routing_hint") or {}
+        return hint.get("priority") in ("high", "critical")
+
+    def triage_output(self, result: RuleResult, card_ids: Sequence[str]) -> Dict:
+        """Kesin yüksek aciliyetli vaka için TriageOutput sözlüğü (LLM'siz)."""
+        # Kanıt: flag'i tetiklenen ilk RAG kartı, yoksa en üstteki RAG kartı
+        evidence = next((cid for cid in card_ids if cid in result.card_flags), None)
+        if evidence is None:
+            evidence = next((cid for cid in card_ids if cid in self.cards), None)
+        meta = self.cards[evidence]["meta"] if evidence else {}
+        hint = meta.get("routing_hint") or {}
+        priority = hint.get("priority", "high")
+        if priority not in ("low", "medium", "high"):
+            priority = "high"
+        return {
+            "triage_level": result.level,
+            "red_flags": result.flags,
+            "immediate_actions": list(meta.get("immediate_actions", [])),
+            "questions_to_ask_next": [],
+            "routing": {"specialty": hint.get("specialty", "acil"), "priority": "high" if result.level == "ESI-1" else priority},
+            "rationale_brief": "Vital bulgular kırmızı bayrak eşiklerini aşıyor: " + "; ".join(result.flags) + ".",
+            "evidence_ids": [evidence] if evidence else [],
+            "model_meta": {"source": "rules"},
+        }
@@ -33,4 +33,19 @@ class TriageRead(BaseModel):
     created_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class CaseState(BaseModel):
+    case_id: str
+    age: int
+    sex: str
+    complaint_text: str
+    vitals: dict
+    pregnancy: Optional[str]
+    chief: Optional[str]
+    rag_cards: List[Dict] = []
+    qa: List[Dict[str, str]] = []  # {"q": "...", "a": "..."}
+    detected_flags: List[str] = []  # rules_engine ile vitallerden tespit edilen red flag'ler
+    done: bool = False
+    finished: bool = False  # final triage verildi mi?
@@ -0,0 +1,120 @@
+# speculation.py
+"""
+Son soru sorulduğu anda final triyajı arka planda önceden hesaplayan (opsiyonel) mekanizma.
+
+Spekülasyon, son soruya varsayılan bir cevap (SPECULATIVE_ASSUMED_ANSWER, örn. "Hayır")
+verilmiş gibi done=True adımını başlatır. Hasta cevabı geldiğinde ucuz bir delta kontrolü
+yapılır: aynı soru cevaplanmışsa ve cevap olumsuz/bilgi taşımayan bir cevapsa spekülatif
+sonuç kullanılır; aksi halde normal LLM çağrısı yapılır ve spekülasyon boşa sayılır.
+
+Görevler süreç içinde tutulur; cevap başka bir worker'a düşerse spekülasyon kullanılamaz.
+"""
+import asyncio, re
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from schemas import CaseState
+from ttl_cache import TTLCache
+
+# Bu kelimelerden oluşan cevaplar tabloyu değiştirmez kabul edilir
+NEGATIVE_TOKENS = {
+    "hayır", "hayir", "yok", "yoktur", "hiç", "hic", "değil", "degil",
+    "olmadı", "olmadi", "olmuyor", "no", "none",
+}
+# Açık onay: cevap bunlardan biriyle başlar ve olumsuz kelime içermez ("Evet, dün akşam")
+AFFIRMATIVE_TOKENS = {
+    "evet", "var", "vardı", "vardi", "oldu", "oluyor", "tabii", "tabi", "aynen", "yes",
+}
+
+StepFn = Callable[..., Awaitable[Dict]]
+
+
+def _norm(text: Optional[str]) -> str:
+    return " ".join(str(text or "").split()).strip().lower()
+
+
+def is_negative_answer(answer: Optional[str]) -> bool:
+    tokens = re.findall(r"\w+", _norm(answer))
+    return bool(tokens) and all(t in NEGATIVE_TOKENS for t in tokens)
+
+
+def is_affirmative_answer(answer: Optional[str]) -> bool:
+    tokens = re.findall(r"\w+", _norm(answer))
+    return bool(tokens) and tokens[0] in AFFIRMATIVE_TOKENS and not any(t in NEGATIVE_TOKENS for t in tokens)
+
+
+class SpeculativeFinalizer:
+    def __init__(self, enabled: bool, assumed_answer: str = "Hayır", ttl: float = 600, max_items: int = 10000):
+        self.enabled = enabled
+        self.assumed_answer = assumed_answer
+        self._pending = TTLCache(maxsize=max_items, ttl=ttl)  # case_id → (soru, qa uzunluğu, task)
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.used_tokens = 0
+        self.wasted_tokens = 0
+
+    def start(self, cs: CaseState, question: str, step_fn: StepFn, llm_args: dict):
+        """Son soru için spekülatif final adımını arka planda başlatır."""
+        if not self.enabled or not question:
+            return
+        qa: List[Dict[str, str]] = list(cs.qa) + [{"q": question, "a": self.assumed_answer}]
+        args = {**llm_args, "qa_list": qa}
+        task = asyncio.create_task(step_fn(**args, done=True))
+        # Sonuç alınmazsa da hatayı yut (yalnızca sayaç için)
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        old = self._pending.pop(cs.case_id)
+        if old is not None:
+            self._discard(old[2])
+        self._pending.set(cs.case_id, (question, len(qa), task))
+        self.started += 1
+
+    async def take(self, cs: CaseState) -> Optional[Dict]:
+        """Delta kontrolü geçerse spekülatif final adımını döndürür, yoksa None."""
+        entry = self._pending.pop(cs.case_id)
+        if entry is None:
+            return None
+        question, qa_len, task = entry
+
+        last = cs.qa[-1] if cs.qa else {}
+        if (
+            len(cs.qa) == qa_len
+            and _norm(last.get("q")) == _norm(question)
+            and is_negative_answer(last.get("a"))
+        ):
+            try:
+                step = await task
+            except Exception:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.used_tokens += _tokens(step)
+            return step
+
+        self.misses += 1
+        self._discard(task)
+        return None
+
+    def _discard(self, task: "asyncio.Task"):
+        # Harcanan token'lar görev bitince boşa sayılır
+        def _count(t: "asyncio.Task"):
+            if not t.cancelled() and t.exception() is None:
+                self.wasted_tokens += _tokens(t.result())
+        task.add_done_callback(_count)
+
+    def stats(self) -> Dict:
+        decided = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "started": self.started,
+            "hits": self.hits,
+            "misses": self.misses,
+            "pending": len(self._pending),
+            "hit_rate": (self.hits / decided) if decided else 0.0,
+            "used_tokens": self.used_tokens,
+            "wasted_tokens": self.wasted_tokens,
+        }
+
+
+def _tokens(step: Optional[Dict]) -> int:
+    usage = (step or {}).get("usage") or {}
+    return int(usage.get("total_tokens") or 0)
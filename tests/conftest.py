@@ -0,0 +1,9 @@
+# tests/conftest.py
+import os, sys
+
+# Testler depo kökünden modül import eder; triage_api import anında DB ve LLM ayarlarını okur
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("OPENAI_API_KEY", "fake")
+os.environ.setdefault("PRELOAD", "false")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
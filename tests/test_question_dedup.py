@@ -0,0 +1,70 @@
+# tests/test_question_dedup.py
+import numpy as np
+import pytest
+
+from question_dedup import QuestionDeduper, question_key, same_question
+
+PARAPHRASES = [
+    ("Ateşiniz var mı?", "Ateş var mı?"),
+    ("Bulanık görme var mı?", "Görme bulanıklığı var mı?"),
+    ("Hiç bayıldınız mı?", "Bayılma oldu mu?"),
+    ("Göğüs ağrınız var mı?", "Göğsünüzde ağrı var mı?"),
+    ("Nefes darlığınız var mı?", "Nefes darlığı var mı?"),
+    ("Ağrı ne zaman başladı?", "Ağrınız ne zaman başladı?"),
+    ("Kusmanız oldu mu?", "Kusma var mı?"),
+    ("Sol kolunuzda ağrı var mı?", "Sol kolunuzda ağrı oldu mu?"),
+]
+
+DIFFERENT = [
+    ("Sol kolunuzda ağrı var mı?", "Sağ kolunuzda ağrı var mı?"),
+    ("Alt karında ağrı var mı?", "Üst karında ağrı var mı?"),
+    ("Ateşiniz var mı?", "Ateşiniz yok mu?"),
+    ("Ağrı geçti mi?", "Ağrı geçmedi mi?"),
+    ("Ağrı ne zaman başladı?", "Ağrı nasıl başladı?"),
+    ("Göğüs ağrısı var mı?", "Göğüs ağrısı kola yayılıyor mu?"),
+    ("İdrar yaparken yanma var mı?", "İdrar yapamıyor musunuz?"),
+    ("Baş ağrınız var mı?", "Karın ağrınız var mı?"),
+]
+
+
+@pytest.fixture
+def dedup():
+    return QuestionDeduper(fuzzy_threshold=85.0)
+
+
+def test_question_key():
+    assert question_key("Bulanık görme var mı?") == "bulan görme"
+    assert question_key("Ağrı ne zaman başladı?") == "ağrı ne zaman başla"
+
+
+@pytest.mark.parametrize("a, b", PARAPHRASES)
+def test_paraphrase_is_repeat(dedup, a, b):
+    m = dedup.match(a, [b], use_embeddings=False)
+    assert m is not None and m.question == b
+
+
+@pytest.mark.parametrize("a, b", DIFFERENT)
+def test_different_question_is_not_repeat(dedup, a, b):
+    assert not same_question(a, b)
+    assert dedup.match(a, [b], use_embeddings=False) is None
+    assert not dedup.similar(a, [b])
+
+
+def test_exact_match_ignores_case_and_spaces(dedup):
+    m = dedup.match("ATEŞİNİZ  var mı?", ["Ateşiniz var mı?"])
+    assert m is not None and m.method == "exact"
+
+
+def test_best_valid_candidate_wins(dedup):
+    # Skoru en yüksek aday tarafı tutmuyorsa sıradaki geçerli aday döner
+    asked = ["Sağ kolunuzda ağrı var mı?", "Sol kolunuzda ağrı oldu mu?"]
+    m = dedup.match("Sol kolunuzda ağrı var mı?", asked, use_embeddings=False)
+    assert m is not None and m.question == asked[1]
+
+
+def test_embedding_respects_side():
+    # Sabit embedding: her metin aynı vektör → yalnızca taraf kontrolü ayırır
+    d = QuestionDeduper(embed_fn=lambda texts: np.ones((len(texts), 4), dtype=np.float32))
+    assert d.match("Sol bacağınızda şişlik var mı?", ["Sağ bacakta ödem oldu mu?"]) is None
+    m = d.match("Sol bacağınızda şişlik var mı?", ["Sol bacakta ödem oldu mu?"])
+    assert m is not None and m.method == "embedding"
@@ -0,0 +1,63 @@
+# tests/test_question_policy.py
+from question_policy import QuestionPolicy
+from schemas import CaseState
+
+CARD = {
+    "id": "syncope_test",
+    "meta": {
+        "title": "Bayılma",
+        "complaints": ["bayılma"],
+        "red_flags": ["Efor sırasında senkop", "Göğüs ağrısı + senkop", "Aile öyküsü (ani ölüm)", "Sistolik TA < 90"],
+        "questions_to_ask_next": ["Senkop sırasında ne yapıyordunuz?", "Göğüs ağrısı oldu mu?",
+                                  "Ailede ani ölüm öyküsü var mı?"],
+    },
+    "content": "",
+}
+
+
+def _case(qa=(), chief="bayılma"):
+    return CaseState(case_id="t", age=40, sex="kadın", complaint_text=chief, vitals={}, pregnancy=None,
+                     chief=chief, rag_cards=[{"id": CARD["id"], "score": 0.8}],
+                     qa=[{"q": q, "a": a} for q, a in qa])
+
+
+def _policy(source="auto", **kw):
+    return QuestionPolicy([CARD], source=source, **kw)
+
+
+def test_only_closed_single_flag_questions_confirm():
+    plan = _policy().plans[CARD["id"]]
+    assert plan.flag_questions == {"Ailede ani ölüm öyküsü var mı?": ["Aile öyküsü (ani ölüm)"]}
+
+
+def test_open_question_answer_does_not_finish():
+    d = _policy().decide(_case([("Senkop sırasında ne yapıyordunuz?", "Oturuyordum")]))
+    assert d.action == "card" and d.question == "Ailede ani ölüm öyküsü var mı?"
+
+
+def test_compound_flag_yes_does_not_finish():
+    d = _policy().decide(_case([("Göğüs ağrısı oldu mu?", "Evet")]))
+    assert d.action != "final"
+
+
+def test_explicit_yes_finishes():
+    d = _policy().decide(_case([("Ailede ani ölüm öyküsü var mı?", "Evet, babam")]))
+    assert (d.action, d.reason) == ("final", "red_flag_positive")
+
+
+def test_no_covers_flag():
+    d = _policy().decide(_case([("Ailede ani ölüm öyküsü var mı?", "Hayır")]))
+    assert (d.action, d.reason) == ("final", "flags_covered")
+
+
+def test_last_card_question_for_pending_flag():
+    d = _policy().decide(_case())
+    assert d.action == "card" and d.question == "Ailede ani ölüm öyküsü var mı?" and d.last
+
+
+def test_llm_question_not_last_when_flag_pending():
+    # LLM sorusu bekleyen kart flag'ine değinmeyebilir; spekülatif final yalnızca tavanda
+    d = _policy(source="llm").decide(_case())
+    assert d.action == "llm" and not d.last
+    d = _policy(source="llm", max_qa=2).decide(_case([("Ne zamandır?", "Dün")]))
+    assert d.action == "llm" and d.last
@@ -0,0 +1,114 @@
+# tests/test_rules_engine.py
+import pytest
+
+from rules_engine import RuleEngine, adult_only, compile_flag, parse_vitals, VITALS
+from schemas import CaseState
+
+HR, RR, SBP, SPO2 = (VITALS.index(v) for v in ("hr", "rr", "sbp", "spo2"))
+
+CARD = {
+    "id": "chest_pain_test",
+    "meta": {
+        "title": "Göğüs ağrısı",
+        "red_flags": ["SpO2 < 92 veya sistolik TA < 90", "Taşikardi + hipotansiyon", "Göçük Hissiyatı",
+                      "Yüksek ateş (>39°C)"],
+        "routing_hint": {"specialty": "kardiyoloji", "priority": "high"},
+        "immediate_actions": ["EKG"],
+    },
+    "content": "",
+}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("SpO2 < 92", [[(SPO2, True, 92.0)]]),
+    ("SpO2 < 92 veya sistolik TA < 90", [[(SPO2, True, 92.0), (SBP, True, 90.0)]]),
+    ("Taşikardi + hipotansiyon", [[(HR, False, 100.0)], [(SBP, True, 90.0)]]),
+    ("Taşipne > 30/dk", [[(RR, False, 30.0)]]),
+    ("Nabız < 40 ya da Nabız > 150", [[(HR, True, 40.0), (HR, False, 150.0)]]),
+])
+def test_compile_flag(text, expected):
+    assert compile_flag(text) == expected
+
+
+@pytest.mark.parametrize("text", ["Göçük Hissiyatı", "Ateş + hipotansiyon", "Efor sırasında senkop"])
+def test_compile_flag_without_vitals(text):
+    assert compile_flag(text) is None
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("SpO2 < 92", False),
+    ("Yüksek ateş (>39°C)", False),
+    ("Taşikardi", True),
+    ("Solunum > 30", True),
+    ("SpO2 < 92 veya sistolik TA < 90", True),
+    ("Göçük Hissiyatı", False),
+])
+def test_adult_only(text, expected):
+    assert adult_only(text) is expected
+
+
+def test_parse_vitals_keys():
+    v = parse_vitals({"Pulse": "160/dk", "blood_pressure": "85/50", "oxygen": "%94"})
+    assert v[HR] == 160 and v[SBP] == 85 and v[SPO2] == 94
+    assert all(x != x for x in parse_vitals(None))  # hepsi NaN
+
+
+def test_global_rule_level():
+    engine = RuleEngine([])
+    assert engine.evaluate({"spo2": 80}).level == "ESI-1"
+    assert engine.evaluate({"hr": 160}).level == "ESI-2"
+    assert engine.evaluate({"hr": 90, "spo2": 98}).level is None
+
+
+def test_card_flag_sets_level_only_for_reported_cards():
+    engine = RuleEngine([CARD])
+    vitals = {"hr": 120, "bp": "85/50"}
+    assert engine.evaluate(vitals, []).level == "ESI-2"  # global: sistolik TA < 90
+    res = engine.evaluate({"spo2": 91}, [CARD["id"]])
+    assert res.level == "ESI-2" and res.flags == ["SpO2 < 92 veya sistolik TA < 90"]
+    assert engine.evaluate({"spo2": 91}, []).level is None
+
+
+@pytest.mark.parametrize("age, vitals", [(1, {"hr": 160}), (3, {"rr": 35}), (10, {"bp": "85/50"})])
+def test_pediatric_skips_adult_thresholds(age, vitals):
+    res = RuleEngine([CARD]).evaluate(vitals, [CARD["id"]], age=age)
+    assert res.level is None and res.flags == []
+
+
+def test_pediatric_keeps_age_independent_flags():
+    res = RuleEngine([CARD]).evaluate({"spo2": 80, "temp": 39.6}, [CARD["id"]], age=5)
+    assert res.level is None
+    assert res.flags == ["Yüksek ateş (>39°C)"]  # SpO2/TA flag'inin tansiyon kolu erişkin eşiği
+
+
+# ---- triage_api hızlı yolu ----
+@pytest.fixture
+def api():
+    import triage_api
+    return triage_api
+
+
+def _case(age, vitals, cards=()):
+    return CaseState(case_id="t", age=age, sex="erkek", complaint_text="göğüs ağrısı", vitals=vitals,
+                     pregnancy=None, chief="göğüs ağrısı", rag_cards=[{"id": c} for c in cards])
+
+
+def test_fast_path_adult_finalizes_without_llm(api):
+    step = api._fast_path_step(_case(40, {"hr": 160}))
+    assert step["finished"] is True and step["next_question"] is None
+    assert step["triage"]["triage_level"] == "ESI-2"
+    assert step["triage"]["model_meta"] == {"source": "rules"}
+
+
+@pytest.mark.parametrize("age, vitals", [(0, {"hr": 160}), (2, {"rr": 35}), (17, {"spo2": 80})])
+def test_fast_path_skipped_for_children(api, age, vitals):
+    assert api._fast_path_step(_case(age, vitals)) is None
+
+
+def test_fast_path_normal_vitals(api):
+    assert api._fast_path_step(_case(40, {"hr": 80, "spo2": 98, "bp": "120/80"})) is None
+
+
+def test_fast_path_disabled(api, monkeypatch):
+    monkeypatch.setattr(api.settings, "RULES_FAST_PATH", False)
+    assert api._fast_path_step(_case(40, {"spo2": 80})) is None
@@ -24,6 +24,44 @@ class TriageApiService {
     return response.json();
   }
 
+  // SSE akışını okur; next_question alanı tamamlanır tamamlanmaz onQuestion çağrılır,
+  // bitmiş StepResp ile resolve olur.
+  private async streamRequest(
+    endpoint: string,
+    options: RequestInit,
+    onQuestion?: (question: string, caseId: string) => void,
+  ): Promise<StepResp> {
+    const response = await fetch(`${BASE_URL}${endpoint}`, {
+      ...options,
+      headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    });
+    if (!response.ok || !response.body) {
+      const errorText = await response.text();
+      throw new Error(`HTTP ${response.status}: ${errorText}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let sep: number;
+      while ((sep = buffer.indexOf('\n\n')) !== -1) {
+        const raw = buffer.slice(0, sep);
+        buffer = buffer.slice(sep + 2);
+        const event = /^event: (.*)$/m.exec(raw)?.[1];
+        const data = JSON.parse(/^data: (.*)$/m.exec(raw)?.[1] ?? '{}');
+        if (event === 'next_question' && onQuestion) onQuestion(data.next_question, data.case_id);
+        if (event === 'error') throw new Error(data.detail);
+        if (event === 'step') return data as StepResp;
+      }
+    }
+    throw new Error('Akış step olayı olmadan kapandı');
+  }
+
   async startTriage(input: TriageInput): Promise<StepResp> {
     console.log('Frontend gönderilen veri:', JSON.stringify(input, null, 2));
     return this.makeRequest<StepResp>('/triage/start', {
@@ -38,6 +76,27 @@ class TriageApiService {
       body: JSON.stringify(body),
     });
   }
+
+  async startTriageStream(
+    input: TriageInput,
+    onQuestion?: (question: string, caseId: string) => void,
+  ): Promise<StepResp> {
+    return this.streamRequest('/triage/start/stream', {
+      method: 'POST',
+      body: JSON.stringify(input),
+    }, onQuestion);
+  }
+
+  async sendAnswerStream(
+    caseId: string,
+    body: AnswerBody,
+    onQuestion?: (question: string, caseId: string) => void,
+  ): Promise<StepResp> {
+    return this.streamRequest(`/triage/${caseId}/answer/stream`, {
+      method: 'PATCH',
+      body: JSON.stringify(body),
+    }, onQuestion);
+  }
 }
 
 export const triageApi = new TriageApiService();
@@ -1,29 +1,77 @@
 # triage_api.py
+import time
+_IMPORT_T0 = time.perf_counter()
+
 from fastapi import FastAPI, HTTPException, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from contextlib import asynccontextmanager
 from pydantic import BaseModel, Field
-import requests, uuid
-from typing import Dict, List, Optional
+import asyncio, json, logging, uuid
+from typing import AsyncIterator, Dict, List, Optional
 try:
     from typing import Literal
 except ImportError:
     from typing_extensions import Literal
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from schemas import TriageRead, TriageOutput
-from database import SessionLocal, get_db
+from schemas import TriageRead, TriageOutput, CaseState
+from case_store import CaseStore, make_case_store
+from database import SessionLocal, engine, get_db
 from models import Triage
-from llm_client_openai import call_llm_step  # <-- yeni step tabanlı LLM çağrısı
+import llm_client_openai
+from llm_client_openai import acall_llm_step, astream_llm_step  # <-- step tabanlı async LLM çağrısı
 from config import settings
-
-# Kaç soru sonra final triage verileceği
-MAX_QA = 3
+from llm_cache import response_cache
+from speculation import SpeculativeFinalizer
+from rules_engine import RuleEngine, is_adult
+from question_dedup import Match, QuestionDeduper
+from question_policy import Decision, QuestionPolicy
+from corpus_index import read_corpora
+from triage_writer import TriageWriter
+import analytics
+from utils_output import ArchiveWriter, save_triage_to_output
+from triage_query import after_cursor, iter_export, next_cursor, ordered, with_red_flag, with_specialty
+from rag_client import RagUnavailable, make_rag_client
+import metrics
+from metrics import POLICY_DECISIONS, QUESTION_REPEATS, log_event
+
+metrics.configure_logging(settings.LOG_LEVEL, settings.LOG_FORMAT)
+logger = logging.getLogger("triage_api")
+
+# RAG_MODE=remote: rag_memory'ye HTTP; local: indeks bu süreçte. PRELOAD=true ise indeks
+# import anında kurulur (gunicorn --preload ile worker'lara copy-on-write paylaşılır),
+# aksi halde her worker lifespan'de arka planda ısınır; /readyz o zamana kadar 503 döner.
+rag_client = make_rag_client()
+if settings.PRELOAD:
+    llm_client_openai.warmup(create_client=False)  # SDK import'u master'da; httpx havuzu fork sonrası
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Master'da (preload) açılmış olabilecek bağlantılar fork sonrası paylaşılmaz
+    engine.dispose(close=False)
+    if settings.ANALYTICS_ROLLUPS:
+        await run_in_threadpool(analytics.ensure_tables, engine)
+    # Bağlantı havuzu / izleyici / ısınma iş parçacıkları worker başına (fork sonrası) başlar
+    await run_in_threadpool(llm_client_openai.warmup)
+    await rag_client.start()
+    try:
+        yield
+    finally:
+        await rag_client.close()
+        # Kuyrukta bekleyen final triage satırlarını kapanmadan önce yaz
+        await run_in_threadpool(triage_writer.close)
+        if archive_writer is not None:
+            await run_in_threadpool(archive_writer.close)
 
 app = FastAPI(
     title="AI Triage API",
     description="AI-powered medical triage system (step-wise Q&A)",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -34,21 +82,68 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# ---- In-memory case state ----
-class CaseState(BaseModel):
-    case_id: str
-    age: int
-    sex: str
-    complaint_text: str
-    vitals: dict
-    pregnancy: Optional[str]
-    chief: Optional[str]
-    rag_cards: List[Dict] = []
-    qa: List[Dict[str, str]] = []  # {"q": "...", "a": "..."}
-    done: bool = False
-    finished: bool = False  # final triage verildi mi?
+# ---- Final triage satırları için write-behind yazıcı ----
+triage_writer = TriageWriter(
+    engine,
+    batch_size=settings.TRIAGE_WRITE_BATCH_SIZE,
+    window_ms=settings.TRIAGE_WRITE_WINDOW_MS,
+    max_queue=settings.TRIAGE_WRITE_QUEUE_MAX,
+    spill_path=settings.TRIAGE_WRITE_SPILL_PATH or None,
+    after_commit=(lambda rows, now: _update_rollups(rows, now)) if settings.ANALYTICS_ROLLUPS else None,
+)
+
+# ---- Dosya arşivi (opsiyonel, bloklamayan) ----
+archive_writer: Optional[ArchiveWriter] = ArchiveWriter(
+    base_dir=settings.ARCHIVE_DIR,
+    max_bytes=settings.ARCHIVE_SEGMENT_MB * 1024 * 1024,
+    max_age_s=settings.ARCHIVE_ROTATE_S,
+    compress=None if settings.ARCHIVE_COMPRESS == "none" else settings.ARCHIVE_COMPRESS,
+) if settings.ARCHIVE_ENABLED else None
+
+# ---- Vaka durumu deposu (worker'lar arası paylaşımlı) ----
+cases: CaseStore = make_case_store()
+
+# ---- Son adım için spekülatif final (opsiyonel) ----
+speculator = SpeculativeFinalizer(
+    enabled=settings.SPECULATIVE_FINAL,
+    assumed_answer=settings.SPECULATIVE_ASSUMED_ANSWER,
+    ttl=settings.CASE_TTL_SECONDS,
+)
+
+# ---- Vital tabanlı red flag kuralları (korpus kartlarından derlenir) ----
+# RAG ile aynı korpuslar ve gölgeleme: RAG'in döndürdüğü her kartın kuralı ve soru planı olur
+corpus_cards = read_corpora(settings.RAG_CORPORA, chunking=False)[0]
+rules = RuleEngine(corpus_cards)
+
+# ---- Tekrar eden soru tespiti (yeniden ifade dahil) ----
+def _dedup_embed_fn():
+    if not settings.DEDUP_EMBEDDINGS:
+        return None
+    service = getattr(rag_client, "service", None)
+    if service is not None:
+        return service.query_vectors  # local RAG: aynı encoder ve sorgu vektör önbelleği
+    from encoders import make_encoder  # opsiyonel bağımlılık: remote modda model yalnızca bunun için
+    return make_encoder().encode_queries
+
+dedup = QuestionDeduper(
+    fuzzy_threshold=settings.DEDUP_FUZZY_THRESHOLD,
+    embed_fn=_dedup_embed_fn(),
+    embed_threshold=settings.DEDUP_EMBED_THRESHOLD,
+    cache_maxsize=settings.DEDUP_CACHE_MAX_ITEMS,
+    cache_ttl=settings.CASE_TTL_SECONDS,
+)
 
-CASES: Dict[str, CaseState] = {}
+# ---- Soru politikası: sıradaki adım final mi, kart sorusu mu, LLM sorusu mu ----
+policy = QuestionPolicy(
+    corpus_cards,
+    mode=settings.QUESTION_POLICY,
+    source=settings.QUESTION_SOURCE,
+    min_qa=settings.POLICY_MIN_QA,
+    max_qa=settings.POLICY_MAX_QA,
+    max_qa_elevated=settings.POLICY_MAX_QA_ELEVATED,
+    card_min_margin=settings.POLICY_CARD_MIN_MARGIN,
+    dedup=dedup,
+)
 
 # ---- Input / Output şemaları ----
 class TriageInput(BaseModel):
@@ -82,14 +177,54 @@ def _serialize_routing(routing_obj_or_dict):
 def _db() -> Session:
     return SessionLocal()
 
-# ---- Rotalar ----
-@app.post("/triage/start", response_model=StepResp)
-def triage_start(inp: TriageInput):
+def _triage_row(cs: CaseState, triage_obj: TriageOutput) -> Dict:
+    return dict(
+        case_id=cs.case_id,
+        age=cs.age,
+        sex=cs.sex,
+        complaint_text=cs.complaint_text,
+        vitals=cs.vitals,
+        triage_level=triage_obj.triage_level,
+        rationale=triage_obj.rationale_brief,
+        red_flags=triage_obj.red_flags,
+        immediate_actions=triage_obj.immediate_actions,
+        questions_to_ask_next=[],  # finalde soru yok
+        routing=_serialize_routing(triage_obj.routing),
+        evidence_ids=triage_obj.evidence_ids,
+    )
+
+def _update_rollups(rows: List[Dict], now: datetime):
+    with engine.begin() as conn:
+        analytics.apply_rollups(conn, rows, now)
+
+async def _save_final_triage(cs: CaseState, triage_obj: TriageOutput):
+    # Kuyruk doluysa put bekler; event loop'u bloklamamak için threadpool'da
+    fut = await run_in_threadpool(triage_writer.submit, _triage_row(cs, triage_obj))
+    if settings.TRIAGE_WRITE_WAIT_COMMIT:
+        await asyncio.wrap_future(fut)
+
+async def _find_repeat(cs: CaseState, question: Optional[str]) -> Optional[Match]:
+    asked = [x.get("q") or "" for x in cs.qa]
+    if dedup.embed_fn is None:
+        return dedup.match(question, asked)
+    # Embedding encode'u CPU işi: event loop'u bloklamasın
+    return await run_in_threadpool(dedup.match, question, asked)
+
+def _card_fallback(cs: CaseState, question: Optional[str], repeat: Match) -> Optional[str]:
+    """Tekrar eden LLM sorusu yerine kartın sıradaki sorulmamış sorusu; kalmadıysa None (final)."""
+    card_q = policy.next_card_question(cs)
+    QUESTION_REPEATS.inc(method=repeat.method, resolution="card" if card_q else "final")
+    log_event(logger, logging.DEBUG, "triage.repeat", case_id=cs.case_id, question=question,
+              matched=repeat.question, method=repeat.method, score=round(repeat.score, 3), card_question=card_q)
+    return card_q
+
+async def _create_case(inp: TriageInput) -> CaseState:
     # Yaş grubunu belirle (RAG için)
     age_group = "adult" if 18 <= inp.age < 65 else ("pediatric" if inp.age < 18 else "geriatric")
 
+    # Tam yaş yerine yaş grubu: aynı başvurular aynı sorgu metnini üretir (RAG sorgu önbelleği)
     rag_body = {
-        "text": f"{inp.complaint_text}\nYaş:{inp.age} Cins:{inp.sex} Preg:{inp.pregnancy}",
+        "text": f"{inp.complaint_text}\nYaş grubu:{age_group} Cins:{inp.sex} Preg:{inp.pregnancy}",
         "chief": inp.chief,
         "age_group": age_group,
         "pregnancy": inp.pregnancy,
@@ -97,11 +232,10 @@ def triage_start(inp: TriageInput):
     }
 
     try:
-        r = requests.post(settings.RAG_URL, json=rag_body, timeout=15)
-        r.raise_for_status()
-        cards = r.json()
-        if not isinstance(cards, list):
-            raise ValueError("RAG response is not a list")
+        cards = await rag_client.topk(rag_body)
+    except RagUnavailable as e:
+        raise HTTPException(status_code=503, detail=f"RAG unavailable: {e}",
+                            headers={"Retry-After": str(int(settings.RAG_CIRCUIT_RESET_S))})
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"RAG upstream error: {e}")
 
@@ -117,48 +251,22 @@ def triage_start(inp: TriageInput):
         chief=inp.chief,
         rag_cards=cards,
     )
-    CASES[case_id] = cs
-
-    # İlk step → done=False
-    step = call_llm_step(
-        age=cs.age,
-        sex=cs.sex,
-        complaint_text=cs.complaint_text,
-        vitals=cs.vitals,
-        cards=cs.rag_cards,
-        qa_list=cs.qa,
-        done=False,
-    )
-
-    next_q = step.get("next_question")
-    # Backend guard: tekrar eden soru geldiyse finala zorla
-    if next_q and any((q.get("q") or "").strip().lower() == next_q.strip().lower() for q in cs.qa):
-        step = call_llm_step(
-            age=cs.age,
-            sex=cs.sex,
-            complaint_text=cs.complaint_text,
-            vitals=cs.vitals,
-            cards=cs.rag_cards,
-            qa_list=cs.qa,
-            done=True,
-        )
-        finished = True
-        return StepResp(case_id=case_id, finished=finished, next_question=None, triage=TriageOutput(**(step.get("triage") or {})))
-    finished = bool(step.get("finished", False))
-
-    resp = StepResp(
-        case_id=case_id,
-        finished=finished,
-        next_question=next_q,
-        triage=None
-    )
-    print("DEBUG RESPONSE /triage/start:", resp.model_dump())  # 🔍 LOG
-
-    return resp
-
-@app.patch("/triage/{case_id}/answer", response_model=StepResp)
-def triage_answer(case_id: str, body: AnswerBody):
-    cs = CASES.get(case_id)
+    cs.detected_flags = rules.evaluate(cs.vitals, [c.get("id") for c in cards], age=cs.age).flags
+    await run_in_threadpool(cases.put, cs)
+    return cs
+
+def _fast_path_step(cs: CaseState) -> Optional[Dict]:
+    """Vitaller tek başına ESI-1/ESI-2'yi belirliyorsa LLM'siz final adımı döndürür."""
+    if not settings.RULES_FAST_PATH or not is_adult(cs.age):
+        return None  # eşikler erişkin eşikleri; çocukta karar LLM'de
+    card_ids = [c.get("id") for c in cs.rag_cards]
+    result = rules.evaluate(cs.vitals, card_ids, age=cs.age)
+    if result.level not in ("ESI-1", "ESI-2"):
+        return None
+    return {"triage": rules.triage_output(result, card_ids), "finished": True, "next_question": None}
+
+async def _load_and_record(case_id: str, body: AnswerBody) -> CaseState:
+    cs = await run_in_threadpool(cases.get, case_id)
     if not cs:
         raise HTTPException(404, "case_id not found")
 
@@ -170,143 +278,387 @@ def triage_answer(case_id: str, body: AnswerBody):
     if body.answers:
         for q, a in body.answers.items():
             cs.qa.append({"q": q, "a": a})
+    await run_in_threadpool(cases.put, cs)
+    return cs
 
-    # Final triage zamanı mı?
-    finished_flag = cs.done or (len(cs.qa) >= MAX_QA)
-
-    # LLM çağrısı
-    step = call_llm_step(
+def _llm_args(cs: CaseState) -> dict:
+    return dict(
         age=cs.age,
         sex=cs.sex,
         complaint_text=cs.complaint_text,
         vitals=cs.vitals,
         cards=cs.rag_cards,
         qa_list=cs.qa,          # 🔑 geçmiş tüm Q/A gönderiliyor
-        done=finished_flag,
+        detected_flags=cs.detected_flags,
     )
 
-    # Backend guard: tekrar eden soru geldiyse finala zorla
-    if not finished_flag:
+async def _final_step(cs: CaseState) -> Dict:
+    # Spekülatif sonuç delta kontrolünden geçerse LLM'i beklemeye gerek yok
+    step = await speculator.take(cs)
+    if step is not None:
+        return step
+    return await acall_llm_step(**_llm_args(cs), done=True)
+
+def _decide(cs: CaseState) -> Decision:
+    decision = policy.decide(cs)
+    POLICY_DECISIONS.inc(action=decision.action, reason=decision.reason)
+    log_event(logger, logging.DEBUG, "triage.policy", case_id=cs.case_id, qa=len(cs.qa),
+              action=decision.action, reason=decision.reason)
+    return decision
+
+def _maybe_speculate(cs: CaseState, next_q: Optional[str], decision: Decision):
+    # Politika bu sorunun cevabından sonra finale geçileceğini söylüyorsa finali şimdiden başlat
+    if next_q and decision.last:
+        speculator.start(cs, next_q, acall_llm_step, _llm_args(cs))
+
+async def _question_step(cs: CaseState, decision: Decision) -> StepResp:
+    """Politika kararına göre sıradaki soru (kart: LLM'siz) veya final."""
+    if decision.action == "final":
+        return await _finish_case(cs, await _final_step(cs))
+    if decision.action == "card":
+        next_q, finished = decision.question, False
+    else:
+        step = await acall_llm_step(**_llm_args(cs), done=False)
         next_q = step.get("next_question")
-        if next_q and any((q.get("q") or "").strip().lower() == next_q.strip().lower() for q in cs.qa):
-            step = call_llm_step(
-                age=cs.age,
-                sex=cs.sex,
-                complaint_text=cs.complaint_text,
-                vitals=cs.vitals,
-                cards=cs.rag_cards,
-                qa_list=cs.qa,
-                done=True,
-            )
-            finished_flag = True
-
-    # Eğer final aşamadaysak
-    if finished_flag:
-        triage_data = step.get("triage") or {}
-        try:
-            triage_obj = TriageOutput(**triage_data)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"LLM triage parse error: {e}")
-
-        cs.finished = True
-
-        # Final triage’ı DB’ye yaz
-        db = _db()
-        try:
-            tri = Triage(
-                case_id=cs.case_id,
-                age=cs.age,
-                sex=cs.sex,
-                complaint_text=cs.complaint_text,
-                vitals=cs.vitals,
-                triage_level=triage_obj.triage_level,
-                rationale=triage_obj.rationale_brief,
-                red_flags=triage_obj.red_flags,
-                immediate_actions=triage_obj.immediate_actions,
-                questions_to_ask_next=[],  # finalde soru yok
-                routing=_serialize_routing(triage_obj.routing),
-                evidence_ids=triage_obj.evidence_ids,
-            )
-            db.add(tri)
-            db.commit()
-        finally:
-            db.close()
-
-        return StepResp(
-            case_id=case_id,
-            finished=True,
-            next_question=None,
-            triage=triage_obj
+        finished = bool(step.get("finished", False))
+        # Tekrar eden soru: ikinci LLM çağrısı yerine kartın sıradaki sorusu
+        repeat = await _find_repeat(cs, next_q)
+        if repeat is not None:
+            next_q, finished = _card_fallback(cs, next_q, repeat), False
+            if next_q is None:
+                return await _finish_case(cs, await _final_step(cs))
+    _maybe_speculate(cs, next_q, decision)
+    return StepResp(case_id=cs.case_id, finished=finished, next_question=next_q, triage=None)
+
+async def _finish_case(cs: CaseState, step: Dict) -> StepResp:
+    triage_data = step.get("triage") or {}
+    try:
+        triage_obj = TriageOutput(**triage_data)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"LLM triage parse error: {e}")
+
+    cs.finished = True
+    await run_in_threadpool(cases.put, cs)
+
+    # Final triage’ı write-behind kuyruğuna bırak (opsiyonel: group commit'i bekle)
+    await _save_final_triage(cs, triage_obj)
+    if archive_writer is not None:
+        save_triage_to_output(
+            triage=triage_obj.model_dump(),
+            input_ctx={"case_id": cs.case_id, "age": cs.age, "sex": cs.sex,
+                       "complaint_text": cs.complaint_text, "vitals": cs.vitals, "qa": cs.qa},
+            rag_cards=cs.rag_cards,
+            writer=archive_writer,
         )
 
-    # Eğer hala devam ediyorsa → sıradaki soruyu döndür
-    next_q = step.get("next_question")
-    finished = bool(step.get("finished", False))
-
     return StepResp(
-        case_id=case_id,
-        finished=finished,
-        next_question=next_q,
-        triage=None
+        case_id=cs.case_id,
+        finished=True,
+        next_question=None,
+        triage=triage_obj
     )
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def _stream_step(cs: CaseState, decision: Decision) -> AsyncIterator[str]:
+    """
+    SSE olayları:
+      next_question → soru alanı tamamlanır tamamlanmaz {"case_id", "next_question"}
+      step          → bitmiş StepResp (sıkı şema doğrulamasından geçmiş)
+      error         → {"detail"}; akış başladıktan sonra HTTP durum kodu değiştirilemez
+    """
+    try:
+        if decision.action != "llm":
+            # Final veya kart sorusu: akışlı LLM çağrısı yok, soru hemen gönderilir
+            resp = await _question_step(cs, decision)
+            if resp.next_question:
+                yield _sse("next_question", {"case_id": cs.case_id, "next_question": resp.next_question})
+            yield _sse("step", resp.model_dump())
+            return
+
+        step: Dict = {}
+        repeats: Dict[str, Optional[Match]] = {}
+        async for kind, payload in astream_llm_step(**_llm_args(cs), done=False):
+            if kind == "next_question":
+                # Tekrar eden soru ön yüze hiç gönderilmez; yerine aşağıda kart sorusu verilir
+                repeats[payload] = await _find_repeat(cs, payload)
+                if repeats[payload] is None:
+                    yield _sse("next_question", {"case_id": cs.case_id, "next_question": payload})
+            else:
+                step = payload
+
+        next_q = step.get("next_question")
+        finished = bool(step.get("finished", False))
+        repeat = repeats[next_q] if next_q in repeats else await _find_repeat(cs, next_q)
+        if repeat is not None:
+            next_q, finished = _card_fallback(cs, next_q, repeat), False
+            if next_q is None:
+                resp = await _finish_case(cs, await _final_step(cs))
+                yield _sse("step", resp.model_dump())
+                return
+            yield _sse("next_question", {"case_id": cs.case_id, "next_question": next_q})
+        resp = StepResp(case_id=cs.case_id, finished=finished, next_question=next_q, triage=None)
+        _maybe_speculate(cs, next_q, decision)
+        yield _sse("step", resp.model_dump())
+    except HTTPException as e:
+        yield _sse("error", {"detail": e.detail})
+    except Exception as e:
+        yield _sse("error", {"detail": f"LLM error: {e}"})
+
+def _sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ---- Rotalar ----
+@app.post("/triage/start", response_model=StepResp)
+async def triage_start(inp: TriageInput):
+    cs = await _create_case(inp)
+    case_id = cs.case_id
+
+    # Kesin yüksek aciliyet → soru sormadan final
+    fast = _fast_path_step(cs)
+    if fast is not None:
+        return await _finish_case(cs, fast)
+
+    # İlk soru: kart güvenliyse kartın listesinden (LLM'siz), değilse LLM
+    resp = await _question_step(cs, _decide(cs))
+    log_event(logger, logging.DEBUG, "triage.start", case_id=case_id, finished=resp.finished,
+              cards=[c.get("id") for c in cs.rag_cards])
+    return resp
+
+@app.patch("/triage/{case_id}/answer", response_model=StepResp)
+async def triage_answer(case_id: str, body: AnswerBody):
+    cs = await _load_and_record(case_id, body)
+    # Final mi (tavan, red flag cevabı, kapsama), kart sorusu mu, LLM sorusu mu?
+    return await _question_step(cs, _decide(cs))
+
+# ---- Akışlı (SSE) step uçları ----
+@app.post("/triage/start/stream")
+async def triage_start_stream(inp: TriageInput):
+    cs = await _create_case(inp)
+
+    async def events():
+        yield _sse("case", {"case_id": cs.case_id})
+        fast = _fast_path_step(cs)
+        if fast is not None:
+            try:
+                resp = await _finish_case(cs, fast)
+                yield _sse("step", resp.model_dump())
+            except HTTPException as e:
+                yield _sse("error", {"detail": e.detail})
+            return
+        async for ev in _stream_step(cs, _decide(cs)):
+            yield ev
+
+    return _sse_response(events())
+
+@app.patch("/triage/{case_id}/answer/stream")
+async def triage_answer_stream(case_id: str, body: AnswerBody):
+    cs = await _load_and_record(case_id, body)
+    return _sse_response(_stream_step(cs, _decide(cs)))
+
+
+@app.get("/llm/cache/stats")
+def llm_cache_stats():
+    """LLM yanıt önbelleği isabet/ıskalama sayaçları (bu worker için)."""
+    return response_cache.stats()
+
+
+@app.get("/triage/policy")
+def triage_policy():
+    """Soru politikası ve tekrar tespiti ayarları/sayaçları; karar dağılımı /metrics'te."""
+    return {**policy.stats(), "dedup": dedup.stats()}
+
+
+@app.get("/db/writer/stats")
+def db_writer_stats():
+    """Write-behind kuyruk derinliği ve flush istatistikleri (worker başına)."""
+    return triage_writer.stats()
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Aşama süreleri (rag, llm, db), LLM token/deneme sayaçları; Prometheus metin biçimi (worker başına)."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/healthz")
+def healthz():
+    """Liveness: süreç yanıt veriyor (RAG ısınması sürse de 200)."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: RAG istemcisi hazır (local: indeks + encoder ısındı) ve veritabanı erişilebilir."""
+    rag = rag_client.readiness()
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        db = {"ok": True}
+    except Exception as e:
+        db = {"ok": False, "error": type(e).__name__}
+    ready = bool(rag.get("ready")) and db["ok"]
+    return JSONResponse({"ready": ready, "rag": rag, "db": db}, status_code=200 if ready else 503)
+
+@app.get("/rag/client/stats")
+def rag_client_stats():
+    """RAG istemci modu; remote'ta circuit durumu, local'de indeks bilgisi (worker başına)."""
+    return rag_client.stats()
+
+@app.get("/archive/stats")
+def archive_stats():
+    """Arşiv yazıcısının kuyruk ve segment durumu (worker başına)."""
+    return archive_writer.stats() if archive_writer is not None else {"enabled": False}
+
+@app.get("/llm/speculation/stats")
+def speculation_stats():
+    """Spekülatif final isabet oranı ve boşa harcanan token sayısı (bu worker için)."""
+    return speculator.stats()
+
+
+# ---- Listeleme uçları ----
+# cursor verilirse keyset sayfalama yapılır, offset yok sayılır. Sayfa doluysa bir
+# sonraki sayfanın cursor'ı X-Next-Cursor başlığında döner. offset geriye uyumluluk
+# için duruyor; derin sayfalarda cursor kullanılmalı.
+def _page(q, response: Response, limit: int, offset: int, sort: str, cursor: Optional[str]):
+    try:
+        q = after_cursor(q, cursor, sort, dialect=engine.dialect.name)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Geçersiz cursor")
+    q = ordered(q, sort)
+    if not cursor and offset:
+        q = q.offset(offset)
+    rows = q.limit(limit).all()
+    nxt = next_cursor(rows, limit)
+    if nxt:
+        response.headers["X-Next-Cursor"] = nxt
+    return rows
 
-# ---- Listeleme uçları (değiştirmeden koruyoruz) ----
 @app.get("/triage/alltriages", response_model=List[TriageRead])
 def get_all_triages(
+    response: Response,
     db: Session = Depends(get_db),
-    limit: int = Query(1000, ge=1, le=10000),
+    limit: int = Query(100, ge=1, le=10000),
     offset: int = Query(0, ge=0),
     sort: Literal["asc", "desc"] = "desc",
     case_id: Optional[str] = None,
+    specialty: Optional[str] = None,
+    red_flag: Optional[str] = None,
+    cursor: Optional[str] = None,
 ):
     q = db.query(Triage)
     if case_id:
         q = q.filter(Triage.case_id == case_id)
-    q = q.order_by(Triage.created_at.desc() if sort == "desc" else Triage.created_at.asc())
-    rows = q.offset(offset).limit(limit).all()
-    return rows
+    if specialty:
+        q = with_specialty(q, specialty, engine.dialect.name)
+    if red_flag:
+        q = with_red_flag(q, red_flag, engine.dialect.name)
+    return _page(q, response, limit, offset, sort, cursor)
 
 @app.get("/triage/alltriages/byCase/{case_id}", response_model=List[TriageRead])
 def get_triages_by_case_id(
     case_id: str,
+    response: Response,
     db: Session = Depends(get_db),
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
     sort: Literal["asc", "desc"] = "desc",
+    cursor: Optional[str] = None,
 ):
     q = db.query(Triage).filter(Triage.case_id == case_id)
-    q = q.order_by(Triage.created_at.desc() if sort == "desc" else Triage.created_at.asc())
-    rows = q.offset(offset).limit(limit).all()
+    rows = _page(q, response, limit, offset, sort, cursor)
     if not rows:
         raise HTTPException(status_code=404, detail=f"Case ID '{case_id}' için kayıt bulunamadı")
     return rows
 
+def _day_range(date: str):
+    try:
+        target_date = datetime.strptime(date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="Geçersiz tarih formatı. YYYY-MM-DD olmalı (örn: 2025-01-15)"
+        )
+    start = datetime.combine(target_date, datetime.min.time())
+    return start, start + timedelta(days=1)
+
 @app.get("/triage/alltriages/byDate/{date}", response_model=List[TriageRead])
 def get_triages_by_date(
     date: str,
+    response: Response,
     db: Session = Depends(get_db),
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
     sort: Literal["asc", "desc"] = "desc",
+    cursor: Optional[str] = None,
 ):
     """Belirli bir tarihteki tüm triage kayıtlarını getirir (YYYY-MM-DD)."""
-    try:
-        target_date = datetime.strptime(date, "%Y-%m-%d").date()
-        start_datetime = datetime.combine(target_date, datetime.min.time())
-        end_datetime = datetime.combine(target_date, datetime.max.time())
+    start_datetime, end_datetime = _day_range(date)
+    # Yarı açık aralık: (created_at, id) indeksinde tek aralık taraması
+    q = db.query(Triage).filter(
+        Triage.created_at >= start_datetime,
+        Triage.created_at < end_datetime
+    )
+    rows = _page(q, response, limit, offset, sort, cursor)
+    if not rows:
+        raise HTTPException(status_code=404, detail=f"'{date}' tarihinde kayıt bulunamadı")
+    return rows
 
-        q = db.query(Triage).filter(
-            Triage.created_at >= start_datetime,
-            Triage.created_at <= end_datetime
-        )
-        q = q.order_by(Triage.created_at.desc() if sort == "desc" else Triage.created_at.asc())
-        rows = q.offset(offset).limit(limit).all()
-        if not rows:
-            raise HTTPException(status_code=404, detail=f"'{date}' tarihinde kayıt bulunamadı")
-        return rows
-    except ValueError:
-        raise HTTPException(
-            status_code=400,
-            detail="Geçersiz tarih formatı. YYYY-MM-DD olmalı (örn: 2025-01-15)"
-        )
+@app.get("/triage/export")
+def export_triages(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    start: Optional[str] = Query(None, description="YYYY-MM-DD (dahil)"),
+    end: Optional[str] = Query(None, description="YYYY-MM-DD (dahil)"),
+    triage_level: Optional[str] = None,
+    sort: Literal["asc", "desc"] = "asc",
+):
+    """Tarih aralığındaki triage kayıtlarını sabit bellekle akış halinde dışa aktarır."""
+    start_dt = _day_range(start)[0] if start else None
+    end_dt = _day_range(end)[1] if end else None
+    body = iter_export(engine, fmt=format, start=start_dt, end=end_dt,
+                       triage_level=triage_level, sort=sort)
+    if format == "csv":
+        return StreamingResponse(body, media_type="text/csv; charset=utf-8",
+                                 headers={"Content-Disposition": "attachment; filename=triages.csv"})
+    return StreamingResponse(body, media_type="application/x-ndjson")
+
+# ---- Analitik (rollup tablolarından; geçmişin boyutundan bağımsız) ----
+def _analytics_range(start: Optional[str], end: Optional[str]):
+    return (_day_range(start)[0] if start else None, _day_range(end)[1] if end else None)
+
+@app.get("/analytics/esi")
+def analytics_esi(
+    granularity: Literal["hour", "day"] = "day",
+    start: Optional[str] = Query(None, description="YYYY-MM-DD (dahil)"),
+    end: Optional[str] = Query(None, description="YYYY-MM-DD (dahil)"),
+    specialty: Optional[str] = None,
+):
+    """Zaman dilimi × ESI seviyesi sayıları (throughput grafikleri için)."""
+    start_dt, end_dt = _analytics_range(start, end)
+    with engine.connect() as conn:
+        return analytics.esi_series(conn, granularity, start_dt, end_dt, specialty)
+
+@app.get("/analytics/summary")
+def analytics_summary(
+    start: Optional[str] = Query(None, description="YYYY-MM-DD (dahil)"),
+    end: Optional[str] = Query(None, description="YYYY-MM-DD (dahil)"),
+):
+    """Toplam, kritik (ESI 1–2), seviye ve uzmanlık dağılımı."""
+    start_dt, end_dt = _analytics_range(start, end)
+    with engine.connect() as conn:
+        return analytics.summary(conn, start_dt, end_dt)
+
+@app.get("/analytics/red_flags")
+def analytics_red_flags(
+    start: Optional[str] = Query(None, description="YYYY-MM-DD (dahil)"),
+    end: Optional[str] = Query(None, description="YYYY-MM-DD (dahil)"),
+    limit: int = Query(20, ge=1, le=200),
+):
+    """En sık görülen red flag'ler."""
+    start_dt, end_dt = _analytics_range(start, end)
+    with engine.connect() as conn:
+        return analytics.top_red_flags(conn, start_dt, end_dt, limit)
+
+metrics.STARTUP_SECONDS.set(time.perf_counter() - _IMPORT_T0, phase="import")
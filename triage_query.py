@@ -0,0 +1,165 @@
+# triage_query.py
+"""
+Triage listeleme yardımcıları: (created_at, id) üzerinde keyset (cursor) sayfalama
+ve sabit bellekle akan NDJSON/CSV dışa aktarım.
+
+Cursor opaktır (base64url JSON: [created_at ISO, id]); istemci bir sonraki sayfa
+için yanıttaki X-Next-Cursor başlığını aynen geri gönderir. Offset'ten farkı,
+derin sayfalarda da yalnızca (created_at, id) indeksinde bir aralık taraması
+yapılmasıdır.
+"""
+import base64, csv, io, json
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import String, and_, column, func, literal, literal_column, or_, select, table, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import Engine
+
+from models import Triage
+
+EXPORT_COLUMNS = [
+    "id", "case_id", "age", "sex", "complaint_text", "vitals", "triage_level",
+    "rationale", "red_flags", "immediate_actions", "questions_to_ask_next",
+    "routing", "evidence_ids", "created_at",
+]
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Geçersiz cursor'da ValueError fırlatır."""
+    try:
+        pad = "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor + pad))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {e}") from e
+
+
+def ordered(q, sort: str):
+    """(created_at, id) üzerinde deterministik sıralama; indeksle aynı kolon sırası."""
+    if sort == "desc":
+        return q.order_by(Triage.created_at.desc(), Triage.id.desc())
+    return q.order_by(Triage.created_at.asc(), Triage.id.asc())
+
+
+def _created_at_cmp(created_at: datetime, dialect: str):
+    # SQLite TIMESTAMP'i metin olarak saklar; CURRENT_TIMESTAMP mikro saniyesiz yazar,
+    # SQLAlchemy'nin bind'ı ise ".000000" ekler. Karşılaştırma saklanan biçimde yapılır.
+    if dialect == "sqlite":
+        fmt = "%Y-%m-%d %H:%M:%S.%f" if created_at.microsecond else "%Y-%m-%d %H:%M:%S"
+        return type_coerce(Triage.created_at, String), created_at.strftime(fmt)
+    return Triage.created_at, created_at
+
+
+def after_cursor(q, cursor: Optional[str], sort: str, dialect: str = "postgresql"):
+    """Cursor'dan sonraki satırlar (tuple karşılaştırmasının taşınabilir açılımı)."""
+    if not cursor:
+        return q
+    created_at, row_id = decode_cursor(cursor)
+    col, created_at = _created_at_cmp(created_at, dialect)
+    if sort == "desc":
+        cond = or_(col < created_at, and_(col == created_at, Triage.id < row_id))
+    else:
+        cond = or_(col > created_at, and_(col == created_at, Triage.id > row_id))
+    return q.where(cond)
+
+
+# SQLite'ta trigger ile dolan red flag tablosu (models.JSON_INDEX_DDL)
+_triage_red_flags = table("triage_red_flags", column("flag"), column("triage_id"))
+
+
+def with_red_flag(q, flag: str, dialect: str = "postgresql"):
+    """Red flag'i flag olan vakalar; her iki backend'de indeks üzerinden."""
+    if dialect == "postgresql":
+        # GIN (jsonb_path_ops) yalnızca @> ile kullanılır
+        return q.where(Triage.red_flags.op("@>")(literal([flag], type_=JSONB)))
+    rf = _triage_red_flags
+    return q.where(Triage.id.in_(select(rf.c.triage_id).where(rf.c.flag == flag)))
+
+
+def specialty_expr(dialect: str = "postgresql"):
+    # İfade indeksleriyle birebir aynı ifade (yol literal olmalı, bind parametresi değil)
+    if dialect == "postgresql":
+        return func.lower(Triage.routing.op("->>")(literal_column("'specialty'")))
+    return func.lower(func.json_extract(Triage.routing, literal_column("'$.specialty'")))
+
+
+def with_specialty(q, specialty: str, dialect: str = "postgresql"):
+    """
+    Uzmanlığı specialty olan vakalar; büyük/küçük harf duyarsız (analytics rollup'ları da
+    küçük harfli tutar). İki taraf da veritabanının lower()'ı ile katlanır; SQLite'ın lower()'ı
+    yalnızca ASCII harfleri katlar.
+    """
+    return q.where(specialty_expr(dialect) == func.lower(" ".join(specialty.split())))
+
+
+def next_cursor(rows: List[Triage], limit: int) -> Optional[str]:
+    """Sayfa doluysa son satırdan sonraki sayfanın cursor'ı."""
+    if len(rows) < limit:
+        return None
+    last = rows[-1]
+    return encode_cursor(last.created_at, last.id)
+
+
+def _json_default(o):
+    if isinstance(o, datetime):
+        return o.isoformat()
+    return str(o)
+
+
+def _export_stmt(start: Optional[datetime], end: Optional[datetime],
+                 triage_level: Optional[str], sort: str):
+    t = Triage.__table__
+    stmt = select(*[t.c[name] for name in EXPORT_COLUMNS])
+    if start is not None:
+        stmt = stmt.where(t.c.created_at >= start)
+    if end is not None:
+        stmt = stmt.where(t.c.created_at < end)
+    if triage_level:
+        stmt = stmt.where(t.c.triage_level == triage_level)
+    return ordered(stmt, sort)
+
+
+def iter_export(
+    engine: Engine,
+    fmt: str = "ndjson",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    triage_level: Optional[str] = None,
+    sort: str = "asc",
+    chunk_rows: int = 1000,
+) -> Iterator[str]:
+    """
+    Satırları server-side cursor (yield_per) ile chunk_rows'luk parçalar halinde okur;
+    ORM nesnesi oluşturmaz. Bellek kullanımı toplam satır sayısından bağımsızdır.
+    """
+    stmt = _export_stmt(start, end, triage_level, sort)
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=chunk_rows).execute(stmt)
+        if fmt == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(EXPORT_COLUMNS)
+            for part in result.partitions():
+                for row in part:
+                    writer.writerow([
+                        json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else
+                        (v.isoformat() if isinstance(v, datetime) else v)
+                        for v in row
+                    ])
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate(0)
+            if buf.tell():
+                yield buf.getvalue()
+        else:
+            for part in result.partitions():
+                yield "".join(
+                    json.dumps(dict(row._mapping), ensure_ascii=False, default=_json_default) + "\n"
+                    for row in part
+                )
@@ -0,0 +1,195 @@
+# triage_writer.py
+"""
+Final triage satırları için write-behind kalıcılık katmanı.
+
+İstek yolu satırı sınırlı bir kuyruğa bırakır ve hemen döner; arka plandaki
+flusher satırları batch_size dolana ya da window_ms geçene kadar toplayıp tek
+transaction'da executemany (insert(Triage)) ile yazar. submit() bir Future
+döndürür; group commit'i beklemek isteyen çağıran bu Future'ı bekler.
+
+Kuyruk doluysa submit() yer açılana kadar bekler (backpressure). close()
+kuyruktaki her şeyi yazıp döner; yazılamayan satırlar kaybolmasın diye
+spill_path'e JSONL olarak eklenir.
+
+after_commit(rows, now) verilirse her başarılı commit'ten sonra, ayrı bir adımda
+çağrılır (analytics rollup'ları); now, satırların created_at'i ile aynı DB saatidir.
+"""
+import json, logging, queue, threading, time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.engine import Engine
+
+from metrics import timed
+from models import Triage
+
+logger = logging.getLogger("triage_writer")
+
+
+class TriageWriter:
+    def __init__(
+        self,
+        engine: Engine,
+        batch_size: int = 100,
+        window_ms: float = 50.0,
+        max_queue: int = 10000,
+        spill_path: Optional[str] = None,
+        after_commit: Optional[Callable[[List[Dict], datetime], None]] = None,
+    ):
+        self.engine = engine
+        self.batch_size = max(1, batch_size)
+        self.window = max(0.0, window_ms) / 1000.0
+        self.spill_path = spill_path
+        self.after_commit = after_commit
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=max(1, max_queue))
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # İstatistikler
+        self.batches = 0
+        self.rows = 0
+        self.failed = 0
+        self.spilled = 0
+        self.last_flush_ms = 0.0
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                t = threading.Thread(target=self._run, name="triage-writer", daemon=True)
+                t.start()
+                self._thread = t
+
+    def submit(self, row: Dict, timeout: Optional[float] = None) -> Future:
+        """Satırı kuyruğa bırakır; Future satır commit edilince tamamlanır."""
+        self._ensure_started()
+        fut: Future = Future()
+        self._queue.put((row, fut), timeout=timeout)
+        return fut
+
+    def write(self, row: Dict, timeout: Optional[float] = None):
+        """Satırı kuyruğa bırakıp group commit'i bekler."""
+        self.submit(row).result(timeout=timeout)
+
+    def close(self, timeout: float = 30):
+        """Kuyruktaki tüm satırları yazar ve flusher'ı durdurur."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.depth(),
+            "queue_max": self._queue.maxsize,
+            "batches": self.batches,
+            "rows": self.rows,
+            "avg_batch": (self.rows / self.batches) if self.batches else 0.0,
+            "failed": self.failed,
+            "spilled": self.spilled,
+            "last_flush_ms": self.last_flush_ms,
+            "batch_size": self.batch_size,
+            "window_ms": self.window * 1000,
+        }
+
+    def _collect(self, first: tuple) -> Tuple[List[tuple], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Kapanış: kalanları beklemeden boşalt
+                return batch + self._drain(), True
+            batch.append(item)
+        return batch, False
+
+    def _drain(self) -> List[tuple]:
+        items = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return items
+            if item is not None:
+                items.append(item)
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                rest = self._drain()
+                if rest:
+                    self._flush_all(rest)
+                return
+            batch, closing = self._collect(first)
+            self._flush_all(batch)
+            if closing:
+                return
+
+    def _flush_all(self, batch: List[tuple]):
+        for i in range(0, len(batch), self.batch_size):
+            self._flush(batch[i:i + self.batch_size])
+
+    def _insert(self, rows: List[Dict]) -> datetime:
+        with timed("db_commit"), self.engine.begin() as conn:
+            conn.execute(insert(Triage), rows)
+            # created_at server default'u ile aynı saat (Postgres'te transaction zamanı)
+            return conn.execute(select(func.now())).scalar()
+
+    def _flush(self, batch: List[tuple]):
+        rows = [r for r, _ in batch]
+        t0 = time.perf_counter()
+        try:
+            now = self._insert(rows)
+        except Exception:
+            logger.exception("Triage batch insert başarısız (%d satır); tek tek deneniyor", len(rows))
+            self._flush_one_by_one(batch)
+            return
+        self.last_flush_ms = (time.perf_counter() - t0) * 1000
+        self.batches += 1
+        self.rows += len(rows)
+        for _, fut in batch:
+            fut.set_result(None)
+        self._after_commit(rows, now)
+
+    def _flush_one_by_one(self, batch: List[tuple]):
+        # Hatalı satırı izole et; diğerleri yine yazılsın
+        for row, fut in batch:
+            try:
+                now = self._insert([row])
+            except Exception as e:
+                self.failed += 1
+                self._spill(row)
+                fut.set_exception(e)
+                continue
+            self.rows += 1
+            fut.set_result(None)
+            self._after_commit([row], now)
+
+    def _after_commit(self, rows: List[Dict], now: datetime):
+        if self.after_commit is None:
+            return
+        try:
+            self.after_commit(rows, now)
+        except Exception:
+            # Triage satırları yazıldı; rollup sapması compactor ile düzeltilir
+            logger.exception("after_commit başarısız (%d satır)", len(rows))
+
+    def _spill(self, row: Dict):
+        if not self.spill_path:
+            return
+        try:
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+            self.spilled += 1
+        except OSError:
+            logger.exception("Triage satırı spill dosyasına yazılamadı: %s", self.spill_path)
@@ -0,0 +1,92 @@
+# ttl_cache.py
+import threading, time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """Thread-safe LRU önbellek; her kayıt için ayrı TTL verilebilir."""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[Optional[float], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            expires_at, value = item
+            if expires_at is not None and expires_at <= now:
+                del self._data[key]
+                self.evictions += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = (time.monotonic() + ttl) if ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            self._evict_locked()
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at is not None and expires_at <= now:
+                self.evictions += 1
+                return default
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        # Süresi dolmuş kayıtlar sayılmaz (kayıt başına TTL farklı olabilir; tümü taranır)
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, (exp, _) in self._data.items() if exp is not None and exp <= now]
+            for k in expired:
+                del self._data[k]
+            self.evictions += len(expired)
+            return len(self._data)
+
+    def _evict_locked(self):
+        # Süresi dolmuş en eski kayıtları at, sonra kapasiteyi LRU ile koru
+        now = time.monotonic()
+        while self._data:
+            key, (expires_at, _) = next(iter(self._data.items()))
+            if expires_at is None or expires_at > now:
+                break
+            del self._data[key]
+            self.evictions += 1
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
@@ -1,9 +1,28 @@
 # utils_output.py
-import json, os, tempfile, shutil
+"""
+Triage arşivi.
+
+Yeni düzen: output/archive/YYYY-MM-DD/seg-<HHMMSS>-<pid>-<n>.ndjson segmentleri.
+Kayıtlar arka plan thread'inde toplu halde segmente eklenir. Her segmentin
+yanında case_id → (offset, uzunluk) satırlarından oluşan bir .idx dosyası durur.
+Segment boyut/süre sınırını aşınca kapatılır ve (opsiyonel) gzip/zstd ile
+sıkıştırılır. Her process kendi segmentine yazar (dosya adında pid var); bu yüzden
+gunicorn worker'larının satırları hiçbir zaman iç içe geçmez.
+
+Eski düzen (output/triage/YYYY-MM-DD/<ts>__ESI-x__<id>.json) ArchiveReader
+tarafından hâlâ okunur.
+"""
+import fcntl, glob, gzip, io, itertools, json, logging, os, queue, tempfile, shutil, threading, time
 from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
 from uuid import uuid4
 import re
 
+logger = logging.getLogger("utils_output")
+
+# Process içindeki tüm yazıcılar için ortak segment sayacı (aynı saniyede çakışmasın)
+_segment_seq = itertools.count(1)
+
 def _slug(s: str) -> str:
     s = s.strip().lower()
     s = re.sub(r"[^a-z0-9\-_.]+", "-", s)
@@ -30,35 +49,309 @@ def atomic_write_json(path: str, data: dict):
         try: os.remove(tmp)
         except OSError: pass
 
+class ArchiveWriter:
+    def __init__(
+        self,
+        base_dir: str = "output",
+        max_bytes: int = 64 * 1024 * 1024,
+        max_age_s: float = 3600,
+        compress: Optional[str] = "gzip",   # "gzip" | "zstd" | None
+        window_ms: float = 200,
+        max_queue: int = 10000,
+        fsync: bool = True,
+    ):
+        self.root = os.path.join(base_dir, "archive")
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.compress = compress or None
+        self.window = max(0.0, window_ms) / 1000.0
+        self.fsync = fsync
+        self._queue: "queue.Queue[Optional[Tuple[str, dict]]]" = queue.Queue(maxsize=max(1, max_queue))
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._seg_path: Optional[str] = None
+        self._seg = None
+        self._idx = None
+        self._seg_opened = 0.0
+        self._seg_size = 0
+        # İstatistikler
+        self.records = 0
+        self.batches = 0
+        self.segments = 0
+        self.dropped = 0
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                t = threading.Thread(target=self._run, name="archive-writer", daemon=True)
+                t.start()
+                self._thread = t
+
+    def submit(self, key: str, record: dict) -> bool:
+        """Kaydı kuyruğa bırakır, beklemez. Kuyruk doluysa kayıt düşürülür (False)."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((key, record))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("Arşiv kuyruğu dolu, kayıt düşürüldü: %s", key)
+            return False
+
+    def close(self, timeout: float = 30):
+        """Kuyruğu boşaltır, aktif segmenti kapatıp sıkıştırır."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "records": self.records,
+            "batches": self.batches,
+            "segments": self.segments,
+            "dropped": self.dropped,
+            "active_segment": self._seg_path,
+            "active_bytes": self._seg_size,
+        }
+
+    # ---- arka plan ----
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                self._finish_segment()
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.window
+            closing = False
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            if self._seg is not None and self._should_rotate():
+                self._finish_segment()
+            try:
+                self._write(batch)
+            except Exception:
+                logger.exception("Arşiv batch'i yazılamadı (%d kayıt)", len(batch))
+            if closing:
+                self._finish_segment()
+                return
+
+    def _open_segment(self):
+        now = datetime.now()
+        day_dir = os.path.join(self.root, now.strftime("%Y-%m-%d"))
+        ensure_dir(day_dir)
+        while True:
+            base = os.path.join(day_dir, f"seg-{now.strftime('%H%M%S')}-{os.getpid()}-{next(_segment_seq):06d}")
+            if not glob.glob(base + ".*"):
+                break
+        self._seg_path = base + ".ndjson"
+        self._seg = open(self._seg_path, "ab")
+        self._idx = open(base + ".idx", "a", encoding="utf-8")
+        self._seg_size = self._seg.tell()
+        self._seg_opened = time.monotonic()
+
+    def _write(self, batch: List[Tuple[str, dict]]):
+        buf = io.BytesIO()
+        idx_lines: List[str] = []
+        for key, rec in batch:
+            if self._seg is None:
+                self._open_segment()
+            line = (json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8")
+            idx_lines.append(f"{key}\t{self._seg_size + buf.tell()}\t{len(line)}\n")
+            buf.write(line)
+            if self._should_rotate(buf.tell()):
+                self._append(buf, idx_lines)
+                self._finish_segment()
+                buf, idx_lines = io.BytesIO(), []
+        if idx_lines:
+            self._append(buf, idx_lines)
+        self.records += len(batch)
+        self.batches += 1
+
+    def _append(self, buf: io.BytesIO, idx_lines: List[str]):
+        self._seg.write(buf.getvalue())
+        self._seg.flush()
+        if self.fsync:
+            os.fsync(self._seg.fileno())
+        # İndeks veriden sonra yazılır; çökmede indeks hiçbir zaman olmayan satırı göstermez
+        self._idx.write("".join(idx_lines))
+        self._idx.flush()
+        self._seg_size += buf.tell()
+
+    def _should_rotate(self, pending: int = 0) -> bool:
+        return (self._seg_size + pending >= self.max_bytes
+                or (time.monotonic() - self._seg_opened) >= self.max_age_s)
+
+    def _finish_segment(self):
+        if self._seg is None:
+            return
+        for f in (self._seg, self._idx):
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+        path, self._seg, self._idx, self._seg_path = self._seg_path, None, None, None
+        self._seg_size = 0
+        self.segments += 1
+        if self.compress:
+            try:
+                compress_segment(path, self.compress)
+            except Exception:
+                logger.exception("Segment sıkıştırılamadı: %s", path)
+
+
+def compress_segment(path: str, method: str = "gzip") -> str:
+    """Kapalı segmenti sıkıştırır; .idx offset'leri sıkıştırılmamış akışa göredir."""
+    if method == "zstd":
+        import zstandard  # opsiyonel bağımlılık
+        out = path + ".zst"
+        with open(path, "rb") as src, open(out + ".tmp", "wb") as dst:
+            zstandard.ZstdCompressor(level=3).copy_stream(src, dst)
+    else:
+        out = path + ".gz"
+        with open(path, "rb") as src, gzip.open(out + ".tmp", "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst)
+    os.replace(out + ".tmp", out)
+    os.remove(path)
+    return out
+
+
+def _open_segment_for_read(path: str):
+    if path.endswith(".zst"):
+        import zstandard  # opsiyonel bağımlılık
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+class ArchiveReader:
+    """Segmentli arşivi ve eski dosya-başına-vaka ağacını birlikte okur."""
+
+    SEGMENT_GLOB = ("*.ndjson", "*.ndjson.gz", "*.ndjson.zst")
+
+    def __init__(self, base_dir: str = "output"):
+        self.base_dir = base_dir
+        self.root = os.path.join(base_dir, "archive")
+        self.legacy_root = os.path.join(base_dir, "triage")
+
+    def segments(self) -> List[str]:
+        paths = []
+        for pattern in self.SEGMENT_GLOB:
+            paths.extend(glob.glob(os.path.join(self.root, "*", pattern)))
+        return sorted(paths)
+
+    @staticmethod
+    def _idx_path(segment: str) -> str:
+        return re.sub(r"\.ndjson(\.gz|\.zst)?$", ".idx", segment)
+
+    def legacy_files(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.legacy_root, "*", "*.json")))
+
+    def iter_records(self, include_legacy: bool = True) -> Iterator[dict]:
+        """Önce eski ağaç, sonra segmentler (zaman sırasıyla)."""
+        if include_legacy:
+            for path in self.legacy_files():
+                with open(path, encoding="utf-8") as f:
+                    yield json.load(f)
+        for seg in self.segments():
+            with _open_segment_for_read(seg) as f:
+                for line in io.TextIOWrapper(f, encoding="utf-8"):
+                    # Çökme anında yarım kalmış son satır atlanır
+                    if line.endswith("\n"):
+                        yield json.loads(line)
+
+    def find(self, case_id: str) -> Optional[dict]:
+        """case_id'nin en son arşiv kaydı; önce segment indeksleri, sonra eski ağaç."""
+        for seg in reversed(self.segments()):
+            hit = self._lookup(seg, case_id)
+            if hit is not None:
+                return hit
+        for path in reversed(self.legacy_files()):
+            with open(path, encoding="utf-8") as f:
+                payload = json.load(f)
+            if (payload.get("input_context") or {}).get("case_id") == case_id:
+                return payload
+        return None
+
+    def _lookup(self, segment: str, case_id: str) -> Optional[dict]:
+        idx = self._idx_path(segment)
+        if not os.path.exists(idx):
+            return None
+        found = None
+        with open(idx, encoding="utf-8") as f:
+            for line in f:
+                key, off, length = line.rstrip("\n").split("\t")
+                if key == case_id:
+                    found = (int(off), int(length))
+        if found is None:
+            return None
+        off, length = found
+        with _open_segment_for_read(segment) as f:
+            # gzip/zstd okuyucularında seek ileri doğru açarak ilerler (segment boyutuyla sınırlı)
+            f.seek(off)
+            return json.loads(f.read(length).decode("utf-8"))
+
+
+_default_writer: Optional[ArchiveWriter] = None
+_default_lock = threading.Lock()
+
+
+def get_archive_writer(base_dir: str = "output") -> ArchiveWriter:
+    global _default_writer
+    with _default_lock:
+        if _default_writer is None:
+            _default_writer = ArchiveWriter(base_dir=base_dir)
+        return _default_writer
+
+
 def save_triage_to_output(
     *,
     triage: dict,
     input_ctx: dict,
     rag_cards: list,
-    base_dir: str = "output"
+    base_dir: str = "output",
+    writer: Optional[ArchiveWriter] = None,
 ) -> str:
     """
-    output/triage/YYYY-MM-DD/<ts>__ESI-4__<patient or uuid>.json
+    Kaydı arşiv segmentine eklenmek üzere kuyruğa bırakır ve indeks anahtarını
+    (case_id, yoksa patient_id ya da rastgele id) döndürür.
     """
-    day = datetime.now().strftime("%Y-%m-%d")
-    triage_level = triage.get("triage_level", "ESI-?")
+    case_id = str((input_ctx or {}).get("case_id") or "")
     patient_id = _slug(str(input_ctx.get("patient_id") or "")) if input_ctx else ""
-    suffix = patient_id or str(uuid4())[:8]
-
-    fname = f"{timestamp()}__{triage_level}__{suffix}.json"
-    out_dir = os.path.join(base_dir, "triage", day)
-    out_path = os.path.join(out_dir, fname)
+    key = case_id or patient_id or str(uuid4())[:8]
 
     payload = {
         "saved_at": datetime.now().isoformat(timespec="seconds"),
+        "case_id": key,
         "triage": triage,          # LLM doğrulanmış çıktısı (TriageOutput)
         "input_context": input_ctx, # age, sex, complaint_text, vitals...
         "rag_cards": rag_cards,     # /rag/topk cevabı (kanıt)
     }
-    atomic_write_json(out_path, payload)
-    return out_path
+    (writer or get_archive_writer(base_dir)).submit(key, payload)
+    return key
 
 def append_ndjson(record: dict, path: str = "output/triage_log.ndjson"):
+    """Tek write() + flock: birden çok process aynı dosyaya yazsa da satırlar bölünmez."""
     ensure_dir(os.path.dirname(path) or ".")
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            os.write(fd, line)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)